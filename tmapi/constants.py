@@ -15,11 +15,26 @@
 # Datatype URIs.
 XSD = 'http://www.w3.org/2001/XMLSchema#'
 XSD_ANY_URI = XSD + 'anyURI'
+XSD_DATE = XSD + 'date'
+XSD_DATE_TIME = XSD + 'dateTime'
+XSD_DECIMAL = XSD + 'decimal'
+XSD_DOUBLE = XSD + 'double'
 XSD_FLOAT = XSD + 'float'
 XSD_INT = XSD + 'int'
+XSD_INTEGER = XSD + 'integer'
 XSD_LONG = XSD + 'long'
 XSD_STRING = XSD + 'string'
 
+# Topic Maps - Data Model PSIs.
+TMDM = 'http://psi.topicmaps.org/iso13250/model/'
+SUBTYPE = TMDM + 'subtype'
+SUPERTYPE = TMDM + 'supertype'
+SUPERTYPE_SUBTYPE = TMDM + 'supertype-subtype'
+TOPIC_NAME_TYPE = TMDM + 'topic-name'
+
+# XTM namespace.
+XTM_NAMESPACE = 'http://www.topicmaps.org/xtm/'
+
 # TMAPI feature strings.
 TMAPI_FEATURE_STRING_BASE = 'http://tmapi.org/features/'
 AUTOMERGE_FEATURE_STRING = TMAPI_FEATURE_STRING_BASE + 'automerge'
@@ -28,3 +43,12 @@ MERGE_BY_TOPIC_NAME_FEATURE_STRING = TMAPI_FEATURE_STRING_BASE + \
 READ_ONLY_FEATURE_STRING = TMAPI_FEATURE_STRING_BASE + 'readOnly'
 TYPE_INSTANCE_ASSOCIATIONS_FEATURE_STRING = TMAPI_FEATURE_STRING_BASE + \
     'type-instance-associations'
+
+# Maximum number of rows handled by a single statement in bulk
+# operations. This keeps the number of query parameters within the
+# limits of all supported database backends.
+BULK_BATCH_SIZE = 500
+
+# Maximum number of references whose normalised forms are cached by
+# `Locator`s.
+LOCATOR_CACHE_SIZE = 10000
@@ -36,6 +36,13 @@ class TMAPIException (Exception):
     pass
 
 
+class DeserializationException (TMAPIException):
+
+    """Exception raised when a serialized topic map cannot be read."""
+
+    pass
+
+
 class FactoryConfigurationException (TMAPIException):
 
     """Exception raised when a `TopicMapSystemFactory` instance cannot
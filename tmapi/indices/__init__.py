@@ -12,6 +12,19 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from tmapi.models.index_registry import register_index, unregister_index
+
+from association_index import AssociationIndex
 from literal_index import LiteralIndex
+from materialized_association_index import MaterializedAssociationIndex
+from materialized_scoped_index import MaterializedScopedIndex
+from materialized_type_instance_index import MaterializedTypeInstanceIndex
 from scoped_index import ScopedIndex
 from type_instance_index import TypeInstanceIndex
+
+# The TMAPI index interfaces, and so their implementations, are
+# always available from TopicMap.get_index().
+register_index(AssociationIndex)
+register_index(LiteralIndex)
+register_index(ScopedIndex)
+register_index(TypeInstanceIndex)
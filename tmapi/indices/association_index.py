@@ -0,0 +1,325 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from django.db import connection
+
+from tmapi.exceptions import IllegalArgumentException
+from tmapi.indices.index import ConstructSet, Index
+from tmapi.models import Role, Topic
+
+
+class AssociationIndex (Index):
+
+    """Index for navigating between `Topic`s through the
+    `Association`s in which they play roles.
+
+    A counterpart of a topic is a role in an association in which the
+    topic plays a role, other than that played role itself; a
+    neighbour is the player of a counterpart. Each method
+    optionally constrains the type of the association, of the role
+    played by the topic (`role_type`) and of the counterpart role
+    (`other_role_type`).
+
+    Each step from a set of topics to their neighbours takes a single
+    query, so that traversals expand a whole frontier of topics at a
+    time.
+
+    """
+
+    def get_counterparts (self, topic, association_type=None, role_type=None,
+                          other_role_type=None):
+        """Returns the counterpart roles of `topic`.
+
+        The return value may be empty but must never be None.
+
+        :param topic: the topic whose counterparts are returned
+        :type topic: `Topic`
+        :param association_type: the type of the associations, or
+          None for any type
+        :type association_type: `Topic`
+        :param role_type: the type of the roles played by `topic`, or
+          None for any type
+        :type role_type: `Topic`
+        :param other_role_type: the type of the counterpart roles, or
+          None for any type
+        :type other_role_type: `Topic`
+        :rtype: `QuerySet` of `Role`s
+
+        """
+        return self._get_counterparts([topic.id], association_type, role_type,
+                                      other_role_type)
+
+    def get_neighbours (self, topic, association_type=None, role_type=None,
+                        other_role_type=None):
+        """Returns the topics that play the counterpart roles of
+        `topic`.
+
+        The return value may be empty but must never be None.
+
+        :param topic: the topic whose neighbours are returned
+        :type topic: `Topic`
+        :param association_type: the type of the associations, or
+          None for any type
+        :type association_type: `Topic`
+        :param role_type: the type of the roles played by `topic`, or
+          None for any type
+        :type role_type: `Topic`
+        :param other_role_type: the type of the roles played by the
+          neighbours, or None for any type
+        :type other_role_type: `Topic`
+        :rtype: `QuerySet` of `Topic`s
+
+        """
+        return self._get_neighbours([topic.id], association_type, role_type,
+                                    other_role_type)
+
+    def get_path_topics (self, topic, path):
+        """Returns the topics reached from `topic` by following
+        `path`.
+
+        Each step of `path` is an (association type, role type,
+        other role type) tuple, any member of which may be None, and
+        leads from a set of topics to their neighbours as returned by
+        `get_neighbours()`.
+
+        The return value may be empty but must never be None.
+
+        :param topic: the topic at the start of the path
+        :type topic: `Topic`
+        :param path: the steps of the path
+        :type path: list of tuples of `Topic`s or None
+        :rtype: `QuerySet` of `Topic`s
+
+        """
+        _check_path(path)
+        topics = [topic.id]
+        for association_type, role_type, other_role_type in path[:-1]:
+            topics = list(self._get_neighbours(
+                    topics, association_type, role_type,
+                    other_role_type).values_list('id', flat=True))
+        association_type, role_type, other_role_type = path[-1]
+        return self._get_neighbours(topics, association_type, role_type,
+                                    other_role_type)
+
+    def get_shortest_path (self, source, target, max_depth=None,
+                           association_type=None, role_type=None,
+                           other_role_type=None):
+        """Returns a shortest path from `source` to `target` through
+        neighbouring topics, or None if there is no such path of at
+        most `max_depth` steps.
+
+        The type arguments constrain each step of the path, as for
+        `get_neighbours()`.
+
+        :param source: the topic at the start of the path
+        :type source: `Topic`
+        :param target: the topic at the end of the path
+        :type target: `Topic`
+        :param max_depth: the maximum number of steps, or None for no
+          limit
+        :type max_depth: integer
+        :rtype: list of `Topic`s, starting with `source` and ending
+          with `target`, or None
+
+        """
+        predecessors = {source.id: None}
+        if source.id != target.id:
+            for depth, level in self._expand(source, max_depth,
+                                             association_type, role_type,
+                                             other_role_type):
+                predecessors.update(level)
+                if target.id in level:
+                    break
+            if target.id not in predecessors:
+                return None
+        topic_ids = []
+        topic_id = target.id
+        while topic_id is not None:
+            topic_ids.insert(0, topic_id)
+            topic_id = predecessors[topic_id]
+        topics = source.__class__.objects.in_bulk(topic_ids)
+        return [topics[topic_id] for topic_id in topic_ids]
+
+    def traverse (self, topic, max_depth=None, association_type=None,
+                  role_type=None, other_role_type=None):
+        """Yields the topics reachable from `topic` through
+        neighbouring topics, in breadth-first order, with their
+        distance from `topic`.
+
+        Each topic is yielded once, at its shortest distance. The
+        type arguments constrain each step, as for
+        `get_neighbours()`. The topics at each distance are found
+        with a single query, and are fetched in batches as they are
+        yielded.
+
+        :param topic: the topic at which to start
+        :type topic: `Topic`
+        :param max_depth: the maximum distance of the yielded topics,
+          or None for no limit
+        :type max_depth: integer
+        :rtype: generator of (`Topic`, integer) tuples
+
+        """
+        for depth, level in self._expand(topic, max_depth, association_type,
+                                         role_type, other_role_type):
+            for neighbour in ConstructSet(topic.__class__, level):
+                yield neighbour, depth
+
+    def _expand (self, topic, max_depth, association_type, role_type,
+                 other_role_type):
+        """Yields each level of a breadth-first traversal from
+        `topic`.
+
+        :rtype: generator of (integer, dictionary) tuples, of the
+          depth of the level and a map from the ID of each topic in
+          the level to the ID of its predecessor
+
+        """
+        visited = set([topic.id])
+        frontier = [topic.id]
+        depth = 0
+        while frontier and (max_depth is None or depth < max_depth):
+            depth += 1
+            level = {}
+            # The pairs are sorted so that the predecessor of each
+            # topic does not depend on the order of the query results.
+            for topic_id, neighbour_id in sorted(self._get_adjacent(
+                    frontier, association_type, role_type, other_role_type)):
+                if neighbour_id not in visited:
+                    visited.add(neighbour_id)
+                    level[neighbour_id] = topic_id
+            if level:
+                yield depth, level
+            frontier = sorted(level)
+
+    def _get_adjacent (self, topic_ids, association_type, role_type,
+                       other_role_type):
+        """Returns the pairs of the IDs of each of the topics with
+        `topic_ids` and of its neighbours.
+
+        :rtype: list of (integer, integer) tuples
+
+        """
+        # All conditions on the roles played by the topics are given
+        # in a single call to filter, so that they, and the values
+        # selected, apply to the same role.
+        played = {'association__roles__player__in': topic_ids}
+        if role_type is not None:
+            played['association__roles__type'] = role_type
+        if association_type is not None:
+            played['association__type'] = association_type
+        if other_role_type is not None:
+            played['type'] = other_role_type
+        pairs = []
+        for role_id, topic_id, other_id, neighbour_id in Role.objects.filter(
+            topic_map=self.topic_map, **played).values_list(
+            'association__roles__id', 'association__roles__player', 'id',
+            'player').iterator():
+            if role_id != other_id:
+                pairs.append((topic_id, neighbour_id))
+        return pairs
+
+    def _get_counterparts (self, topic_ids, association_type, role_type,
+                           other_role_type):
+        """Returns the counterpart roles of the topics with
+        `topic_ids`.
+
+        A role played by one of the topics is a counterpart of another
+        of them that plays a role in the same association.
+
+        :param topic_ids: the database IDs of the topics
+        :type topic_ids: list of integers
+        :rtype: `QuerySet` of `Role`s
+
+        """
+        if not topic_ids:
+            return Role.objects.none()
+        where, params = self._get_played_where(topic_ids, role_type)
+        roles = Role.objects.filter(topic_map=self.topic_map).extra(
+            where=[where], params=params)
+        if association_type is not None:
+            roles = roles.filter(association__type=association_type)
+        if other_role_type is not None:
+            roles = roles.filter(type=other_role_type)
+        return roles
+
+    def _get_neighbours (self, topic_ids, association_type, role_type,
+                         other_role_type):
+        """Returns the topics that play the counterpart roles of the
+        topics with `topic_ids`.
+
+        :param topic_ids: the database IDs of the topics
+        :type topic_ids: list of integers
+        :rtype: `QuerySet` of `Topic`s
+
+        """
+        if not topic_ids:
+            return Topic.objects.none()
+        where, params = self._get_played_where(topic_ids, role_type)
+        # All conditions on the counterpart roles are given in a
+        # single call to filter, so that they apply to the same role.
+        counterpart = {'roles__topic_map': self.topic_map}
+        if association_type is not None:
+            counterpart['roles__association__type'] = association_type
+        if other_role_type is not None:
+            counterpart['roles__type'] = other_role_type
+        return Topic.objects.filter(**counterpart).extra(
+            where=[where], params=params).distinct()
+
+    def _get_played_where (self, topic_ids, role_type):
+        """Returns the SQL condition, and its parameters, that a role
+        is in an association in which one of the topics with
+        `topic_ids` plays another role, of `role_type` if it is not
+        None.
+
+        The condition refers to the role table by its name, and so
+        must be used in a query that selects or joins it without an
+        alias. A played role is tested by a subquery so that it is not
+        matched against itself.
+
+        :rtype: tuple of string and list
+
+        """
+        quote_name = connection.ops.quote_name
+        role = Role._meta
+        conditions = [
+            'played.%s = %s.%s' % (
+                quote_name(role.get_field('association').column),
+                quote_name(role.db_table),
+                quote_name(role.get_field('association').column)),
+            'played.%s <> %s.%s' % (quote_name(role.pk.column),
+                                    quote_name(role.db_table),
+                                    quote_name(role.pk.column)),
+            'played.%s IN (%s)' % (
+                quote_name(role.get_field('player').column),
+                ', '.join(['%s'] * len(topic_ids)))]
+        params = list(topic_ids)
+        if role_type is not None:
+            conditions.append('played.%s = %%s' % quote_name(
+                    role.get_field('type').column))
+            params.append(role_type.id)
+        where = 'EXISTS (SELECT 1 FROM %s played WHERE %s)' % (
+            quote_name(role.db_table), ' AND '.join(conditions))
+        return where, params
+
+
+def _check_path (path):
+    """Raises an `IllegalArgumentException` if `path` is not a
+    non-empty list of three member steps."""
+    if not path:
+        raise IllegalArgumentException('path must not be empty')
+    for step in path:
+        if len(step) != 3:
+            raise IllegalArgumentException(
+                'Each step of path must have three members')
@@ -12,6 +12,79 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from tmapi.constants import BULK_BATCH_SIZE
+
+
+class ConstructSet (object):
+
+    """A set of constructs of a single model, held as their database
+    IDs.
+
+    Counting and testing membership need no queries; the constructs
+    themselves are fetched, in ID order, only when iterated over or
+    indexed.
+
+    """
+
+    def __init__ (self, model, ids):
+        """Creates a set of the constructs of `model` with `ids`.
+
+        :param model: the model class of the constructs
+        :type model: class
+        :param ids: the database IDs of the constructs
+        :type ids: iterable of integers
+
+        """
+        self.model = model
+        self._ids = frozenset(ids)
+        self._sorted_ids = None
+
+    def count (self):
+        """Returns the number of constructs in the set.
+
+        :rtype: integer
+
+        """
+        return len(self._ids)
+
+    def get_ids (self):
+        """Returns the database IDs of the constructs in the set.
+
+        :rtype: frozenset of integers
+
+        """
+        return self._ids
+
+    def __contains__ (self, construct):
+        return isinstance(construct, self.model) and construct.id in self._ids
+
+    def __getitem__ (self, key):
+        ids = self._get_sorted_ids()[key]
+        if isinstance(key, slice):
+            return list(self._fetch(ids))
+        return self.model.objects.get(pk=ids)
+
+    def __iter__ (self):
+        return self._fetch(self._get_sorted_ids())
+
+    def __len__ (self):
+        return len(self._ids)
+
+    def _fetch (self, ids):
+        """Yields the constructs with `ids`, in order, fetching them
+        in batches."""
+        for start in range(0, len(ids), BULK_BATCH_SIZE):
+            batch = ids[start:start+BULK_BATCH_SIZE]
+            constructs = self.model.objects.in_bulk(batch)
+            for construct_id in batch:
+                yield constructs[construct_id]
+
+    def _get_sorted_ids (self):
+        if self._sorted_ids is None:
+            self._sorted_ids = sorted(self._ids)
+        return self._sorted_ids
+
+
 class Index (object):
 
     """Base class for all indices."""
@@ -46,6 +119,18 @@ class Index (object):
         """
         return self._open
 
+    def notify (self, event):
+        """Receives a change to the topic map.
+
+        Indices that hold state derived from the topic map may use
+        `event` to update it. The default implementation does nothing.
+
+        :param event: the change to the topic map
+        :type event: `tmapi.models.events.Event`
+
+        """
+        pass
+
     def open (self):
         """Opens the index.
 
@@ -58,4 +143,13 @@ class Index (object):
     def reindex (self):
         """Synchronizes the index with data in the topic map."""
         pass
-            
+
+
+def _discard (mapping, key, value):
+    """Removes `value` from the set `mapping[key]`, removing the key
+    if the set becomes empty."""
+    values = mapping.get(key)
+    if values is not None:
+        values.discard(value)
+        if not values:
+            del mapping[key]
@@ -12,10 +12,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import datetime
+import decimal
+
+from django.db.models import Min
+
 from tmapi.constants import XSD_ANY_URI, XSD_STRING
 from tmapi.exceptions import IllegalArgumentException
 from tmapi.indices.index import Index
 from tmapi.models import Locator, Name, Occurrence
+from tmapi.models.datatype_aware import normalize_date_time
+from tmapi.models.tokenized import generate_value_hash, tokenize
 from tmapi.models.variant import Variant
 
 
@@ -34,8 +41,8 @@ class LiteralIndex (Index):
         """
         if value is None:
             raise IllegalArgumentException('value must not be None')
-        return Name.objects.filter(topic__topic_map=self.topic_map).filter(
-            value=value)
+        return self._get_by_value(Name.objects.filter(
+                topic_map=self.topic_map), value)
 
     def get_occurrences (self, value, datatype=None):
         """Returns the `Occurrence`s in the topic map whose value
@@ -69,7 +76,56 @@ class LiteralIndex (Index):
             datatype = XSD_STRING
         else:
             datatype = datatype.get_reference()
-        return Occurrence.objects.filter(topic__topic_map=self.topic_map).filter(value=value).filter(datatype=datatype)
+        return self._get_by_value(Occurrence.objects.filter(
+                topic_map=self.topic_map, datatype=datatype), value)
+
+    def get_occurrences_in_range (self, lower=None, upper=None,
+                                  occurrence_type=None, include_lower=True,
+                                  include_upper=True):
+        """Returns the `Occurrence`s in the topic map whose typed
+        value lies between `lower` and `upper`.
+
+        If the bounds are numbers, the `Occurrence`s must have a
+        numeric datatype (xsd:decimal, xsd:double, xsd:float, xsd:int,
+        xsd:integer or xsd:long). If the bounds are dates or
+        datetimes, they must have the datatype xsd:date or
+        xsd:dateTime; dates are taken to be midnight, and naive
+        datetimes to be in UTC.
+
+        Either bound may be None, for a range that is open at that
+        end, but not both. Each bound is inclusive unless
+        `include_lower` or `include_upper` respectively is False.
+
+        Numeric values are indexed as floats, which approximate
+        xsd:decimal values with many digits and xsd:long and
+        xsd:integer values beyond 2**53. Values that are equal to an
+        integer or decimal bound as floats are compared with it
+        exactly, but values equal as floats are ordered by ID.
+
+        If `occurrence_type` is not None, the `Occurrence`s returned
+        must be of that type.
+
+        The `Occurrence`s are ordered by their value.
+
+        :param lower: the lower bound of the values
+        :type lower: number, `datetime.date` or `datetime.datetime`
+        :param upper: the upper bound of the values
+        :type upper: number, `datetime.date` or `datetime.datetime`
+        :param occurrence_type: optional type of the `Occurrence`s
+          to be returned
+        :type occurrence_type: `Topic`
+        :param include_lower: whether `lower` is in the range
+        :type include_lower: boolean
+        :param include_upper: whether `upper` is in the range
+        :type include_upper: boolean
+        :rtype: `QuerySet` of `Occurrence`s
+
+        """
+        occurrences = Occurrence.objects.filter(topic_map=self.topic_map)
+        if occurrence_type is not None:
+            occurrences = occurrences.filter(type=occurrence_type)
+        return self._get_in_range(occurrences, lower, upper, include_lower,
+                                  include_upper)
 
     def get_variants (self, value, datatype=None):
         """Returns the `Variant`s in teh topic map whose value
@@ -103,4 +159,250 @@ class LiteralIndex (Index):
             datatype = XSD_STRING
         else:
             datatype = datatype.get_reference()
-        return Variant.objects.filter(name__topic__topic_map=self.topic_map).filter(value=value).filter(datatype=datatype)
+        return self._get_by_value(Variant.objects.filter(
+                topic_map=self.topic_map, datatype=datatype), value)
+
+    def get_variants_in_range (self, lower=None, upper=None,
+                               include_lower=True, include_upper=True):
+        """Returns the `Variant`s in the topic map whose typed value
+        lies between `lower` and `upper`.
+
+        The bounds are as for `get_occurrences_in_range`.
+
+        :param lower: the lower bound of the values
+        :type lower: number, `datetime.date` or `datetime.datetime`
+        :param upper: the upper bound of the values
+        :type upper: number, `datetime.date` or `datetime.datetime`
+        :param include_lower: whether `lower` is in the range
+        :type include_lower: boolean
+        :param include_upper: whether `upper` is in the range
+        :type include_upper: boolean
+        :rtype: `QuerySet` of `Variant`s
+
+        """
+        return self._get_in_range(
+            Variant.objects.filter(topic_map=self.topic_map), lower, upper,
+            include_lower, include_upper)
+
+    def search_names (self, query, prefix=False, offset=0, limit=None):
+        """Returns the topic names in the topic map whose value
+        contains every word of `query`.
+
+        Words are matched case-insensitively against the stored
+        tokens of the values. If `prefix` is True, the last word of
+        `query` matches any word that it begins, as for
+        autocompletion.
+
+        The names are ranked by how early in their value the first
+        word of `query` appears, then by value. Of the ranked names,
+        those from position `offset` are returned, up to `limit` of
+        them if `limit` is not None.
+
+        :param query: the words to search for
+        :type query: string
+        :param prefix: whether the last word is a prefix
+        :type prefix: boolean
+        :param offset: the number of ranked names to skip
+        :type offset: integer
+        :param limit: the maximum number of names to return
+        :type limit: integer
+        :rtype: `QuerySet` of `Name`s
+
+        """
+        return self._search(Name.objects.filter(topic_map=self.topic_map),
+                            query, prefix, offset, limit)
+
+    def search_occurrences (self, query, datatype=None, prefix=False,
+                            offset=0, limit=None):
+        """Returns the `Occurrence`s in the topic map whose value
+        contains every word of `query`.
+
+        If `datatype` is None, the `Occurrence`s' datatype property
+        must be xsd:string.
+
+        Matching, ranking and pagination are as for `search_names`.
+
+        :param query: the words to search for
+        :type query: string
+        :param datatype: optional datatype of the `Occurrence`s to be returned
+        :type datatype: `Locator`
+        :param prefix: whether the last word is a prefix
+        :type prefix: boolean
+        :param offset: the number of ranked occurrences to skip
+        :type offset: integer
+        :param limit: the maximum number of occurrences to return
+        :type limit: integer
+        :rtype: `QuerySet` of `Occurrence`s
+
+        """
+        return self._search(Occurrence.objects.filter(
+                topic_map=self.topic_map, datatype=self._get_datatype(
+                    datatype)), query, prefix, offset, limit)
+
+    def search_variants (self, query, datatype=None, prefix=False, offset=0,
+                         limit=None):
+        """Returns the `Variant`s in the topic map whose value
+        contains every word of `query`.
+
+        If `datatype` is None, the `Variant`s' datatype property must
+        be xsd:string.
+
+        Matching, ranking and pagination are as for `search_names`.
+
+        :param query: the words to search for
+        :type query: string
+        :param datatype: optional datatype of the `Variant`s to be returned
+        :type datatype: `Locator`
+        :param prefix: whether the last word is a prefix
+        :type prefix: boolean
+        :param offset: the number of ranked variants to skip
+        :type offset: integer
+        :param limit: the maximum number of variants to return
+        :type limit: integer
+        :rtype: `QuerySet` of `Variant`s
+
+        """
+        return self._search(Variant.objects.filter(
+                topic_map=self.topic_map, datatype=self._get_datatype(
+                    datatype)), query, prefix, offset, limit)
+
+    def _get_by_value (self, constructs, value):
+        """Returns those of `constructs` whose value is `value`.
+
+        The indexed hash of the value is matched first, and the value
+        itself is then compared to rule out hash collisions.
+
+        :param constructs: the constructs to search
+        :type constructs: `QuerySet`
+        :param value: the value to match
+        :type value: string
+        :rtype: `QuerySet`
+
+        """
+        return constructs.filter(value_hash=generate_value_hash(value),
+                                 value=value)
+
+    def _get_datatype (self, datatype):
+        """Returns the reference of `datatype`, defaulting to
+        xsd:string.
+
+        :type datatype: `Locator`
+        :rtype: string
+
+        """
+        if datatype is None:
+            return XSD_STRING
+        return datatype.get_reference()
+
+    def _get_in_range (self, constructs, lower, upper, include_lower,
+                       include_upper):
+        """Returns those of `constructs` whose typed value lies
+        between `lower` and `upper`, ordered by that value.
+
+        :param constructs: the constructs to search
+        :type constructs: `QuerySet`
+        :rtype: `QuerySet`
+
+        """
+        if lower is None and upper is None:
+            raise IllegalArgumentException(
+                'lower and upper must not both be None')
+        bounds = [bound for bound in (lower, upper) if bound is not None]
+        if all([isinstance(bound, datetime.date) for bound in bounds]):
+            column = 'temporal_value'
+            convert = normalize_date_time
+        elif all([isinstance(bound, (decimal.Decimal, float, int, long)) and
+                  not isinstance(bound, bool) for bound in bounds]):
+            column = 'numeric_value'
+            convert = float
+        else:
+            raise IllegalArgumentException(
+                'lower and upper must both be numbers or both be dates')
+        excluded = []
+        if lower is not None:
+            lookup = column + '__gt'
+            if include_lower or _is_exact(lower):
+                lookup += 'e'
+            if _is_exact(lower):
+                excluded.extend(self._get_outside_bound(
+                        constructs, lower, include_lower, 1))
+            constructs = constructs.filter(**{lookup: convert(lower)})
+        if upper is not None:
+            lookup = column + '__lt'
+            if include_upper or _is_exact(upper):
+                lookup += 'e'
+            if _is_exact(upper):
+                excluded.extend(self._get_outside_bound(
+                        constructs, upper, include_upper, -1))
+            constructs = constructs.filter(**{lookup: convert(upper)})
+        if excluded:
+            constructs = constructs.exclude(id__in=excluded)
+        return constructs.order_by(column, 'id')
+
+    def _get_outside_bound (self, constructs, bound, include, direction):
+        """Returns the IDs of those of `constructs` whose numeric
+        value is equal to `bound` as a float, but which lie outside
+        the range bounded by `bound` when compared exactly.
+
+        :param bound: the integer or decimal bound
+        :param include: whether `bound` is in the range
+        :type include: boolean
+        :param direction: 1 if `bound` is a lower bound, -1 if it is
+          an upper bound
+        :type direction: integer
+        :rtype: list of integers
+
+        """
+        bound = decimal.Decimal(bound)
+        outside = []
+        for construct_id, value in constructs.filter(
+            numeric_value=float(bound)).values_list('id', 'value'):
+            try:
+                comparison = cmp(decimal.Decimal(value.strip()), bound)
+            except decimal.InvalidOperation:
+                # The value is only known as a float.
+                comparison = 0
+            if comparison * direction < 0 or (comparison == 0 and
+                                               not include):
+                outside.append(construct_id)
+        return outside
+
+    def _search (self, constructs, query, prefix, offset, limit):
+        """Returns the ranked page of `constructs` whose value
+        contains every word of `query`.
+
+        :param constructs: the constructs to search
+        :type constructs: `QuerySet`
+        :rtype: `QuerySet`
+
+        """
+        if query is None:
+            raise IllegalArgumentException('query must not be None')
+        tokens = tokenize(query)
+        if not tokens:
+            return constructs.none()
+        last = len(tokens) - 1
+        for index, token in enumerate(tokens):
+            lookup = 'tokens__token'
+            if prefix and index == last:
+                lookup += '__startswith'
+            # Each filter joins the token table again, so that every
+            # token must be matched.
+            constructs = constructs.filter(**{lookup: token})
+            if index == 0:
+                constructs = constructs.annotate(rank=Min('tokens__position'))
+        constructs = constructs.order_by('rank', 'value', 'id')
+        if limit is None:
+            return constructs[offset:]
+        return constructs[offset:offset+limit]
+
+
+def _is_exact (bound):
+    """Returns True if `bound` is an integer or decimal number, which
+    a float may not represent exactly.
+
+    :rtype: boolean
+
+    """
+    return isinstance(bound, (decimal.Decimal, int, long)) and \
+        not isinstance(bound, bool)
@@ -0,0 +1,231 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from tmapi.indices.association_index import AssociationIndex, _check_path
+from tmapi.indices.index import ConstructSet, _discard
+from tmapi.models import Association, Role, Topic
+from tmapi.models.events import ConstructCreated, ConstructRemoved, \
+    PlayerChanged, TopicMapChanged, TopicsMerged, TypeChanged
+
+
+class MaterializedAssociationIndex (AssociationIndex):
+
+    """`AssociationIndex` that answers queries from an adjacency
+    structure held in memory.
+
+    The index maps each topic to the roles it plays, and each
+    association to its type and roles, so that following a path
+    needs no queries. The structure is loaded when the index is
+    opened, and is then kept up to date from the events describing
+    each change to the topic map; a bulk change or a merge causes it
+    to be reloaded. While the index is closed, queries are answered
+    from the database as by `AssociationIndex`.
+
+    The events are those of changes made in this process, sent as
+    they are made rather than when they are committed. The structure
+    therefore does not reflect a rolled back transaction or changes
+    made by other processes, and the index is not auto updated:
+    `reindex()` must be called after a rollback, and before use where
+    other processes change the topic map.
+
+    Results are returned as `ConstructSet`s rather than `QuerySet`s.
+
+    """
+
+    def __init__ (self, topic_map):
+        super(MaterializedAssociationIndex, self).__init__(topic_map)
+        self._clear()
+
+    def close (self):
+        super(MaterializedAssociationIndex, self).close()
+        self._clear()
+
+    def get_counterparts (self, topic, association_type=None, role_type=None,
+                          other_role_type=None):
+        if not self._open:
+            return super(MaterializedAssociationIndex,
+                         self).get_counterparts(
+                topic, association_type, role_type, other_role_type)
+        return ConstructSet(Role, self._get_counterpart_ids(
+                [topic.id], association_type, role_type, other_role_type))
+
+    def get_neighbours (self, topic, association_type=None, role_type=None,
+                        other_role_type=None):
+        if not self._open:
+            return super(MaterializedAssociationIndex, self).get_neighbours(
+                topic, association_type, role_type, other_role_type)
+        return ConstructSet(Topic, self._get_neighbour_ids(
+                [topic.id], association_type, role_type, other_role_type))
+
+    def get_path_topics (self, topic, path):
+        if not self._open:
+            return super(MaterializedAssociationIndex,
+                         self).get_path_topics(topic, path)
+        _check_path(path)
+        topic_ids = [topic.id]
+        for association_type, role_type, other_role_type in path:
+            topic_ids = self._get_neighbour_ids(
+                topic_ids, association_type, role_type, other_role_type)
+        return ConstructSet(Topic, topic_ids)
+
+    def is_auto_updated (self):
+        return False
+
+    def notify (self, event):
+        if not self._open:
+            return
+        if isinstance(event, (TopicMapChanged, TopicsMerged)):
+            self.reindex()
+        elif event.model is Association:
+            if isinstance(event, ConstructCreated):
+                self._association_types[event.construct_id] = \
+                    event.construct.type_id
+            elif isinstance(event, ConstructRemoved):
+                self._association_types.pop(event.construct_id, None)
+            elif isinstance(event, TypeChanged):
+                self._association_types[event.construct_id] = \
+                    event.new_value
+        elif event.model is Role:
+            if isinstance(event, ConstructCreated):
+                role = event.construct
+                self._add_role(role.id, role.association_id, role.type_id,
+                               role.player_id)
+            elif isinstance(event, ConstructRemoved):
+                self._remove_role(event.construct_id)
+            elif isinstance(event, (PlayerChanged, TypeChanged)):
+                role = self._remove_role(event.construct_id)
+                if role is None:
+                    return
+                association_id, type_id, player_id = role
+                if isinstance(event, PlayerChanged):
+                    player_id = event.new_value
+                else:
+                    type_id = event.new_value
+                self._add_role(event.construct_id, association_id, type_id,
+                               player_id)
+
+    def open (self):
+        super(MaterializedAssociationIndex, self).open()
+        self.reindex()
+
+    def reindex (self):
+        """Reloads the adjacency structure from the topic map, if the
+        index is open."""
+        if not self._open:
+            return
+        self._clear()
+        self._association_types = dict(Association.objects.filter(
+                topic_map=self.topic_map).values_list(
+                'id', 'type').iterator())
+        for role in Role.objects.filter(topic_map=self.topic_map).values_list(
+            'id', 'association', 'type', 'player').iterator():
+            self._add_role(*role)
+
+    def _add_role (self, role_id, association_id, type_id, player_id):
+        """Adds the role with `role_id` to the adjacency structure."""
+        self._roles[role_id] = (association_id, type_id, player_id)
+        self._association_roles.setdefault(association_id, set()).add(
+            role_id)
+        self._player_roles.setdefault(player_id, set()).add(role_id)
+
+    def _clear (self):
+        """Discards the adjacency structure."""
+        # Map of association ID to the IDs of its roles.
+        self._association_roles = {}
+        # Map of association ID to the ID of its type.
+        self._association_types = {}
+        # Map of topic ID to the IDs of the roles it plays.
+        self._player_roles = {}
+        # Map of role ID to the IDs of its association, type and
+        # player.
+        self._roles = {}
+
+    def _get_adjacent (self, topic_ids, association_type, role_type,
+                       other_role_type):
+        if not self._open:
+            return super(MaterializedAssociationIndex, self)._get_adjacent(
+                topic_ids, association_type, role_type, other_role_type)
+        return [(self._roles[role_id][2], self._roles[other_id][2])
+                for role_id, other_id in self._get_counterpart_pairs(
+                topic_ids, association_type, role_type, other_role_type)]
+
+    def _get_counterpart_ids (self, topic_ids, association_type, role_type,
+                              other_role_type):
+        """Returns the database IDs of the counterpart roles of the
+        topics with `topic_ids`.
+
+        :rtype: set of integers
+
+        """
+        return set([other_id for role_id, other_id in
+                    self._get_counterpart_pairs(topic_ids, association_type,
+                                                role_type, other_role_type)])
+
+    def _get_counterpart_pairs (self, topic_ids, association_type, role_type,
+                                other_role_type):
+        """Returns the pairs of the database IDs of each role played
+        by the topics with `topic_ids` and of its counterparts.
+
+        :rtype: list of (integer, integer) tuples
+
+        """
+        played = set()
+        for topic_id in topic_ids:
+            for role_id in self._player_roles.get(topic_id, ()):
+                association_id, type_id, player_id = self._roles[role_id]
+                if role_type is not None and type_id != role_type.id:
+                    continue
+                if association_type is not None and \
+                        self._association_types.get(association_id) != \
+                        association_type.id:
+                    continue
+                played.add(role_id)
+        pairs = []
+        for role_id in played:
+            association_id = self._roles[role_id][0]
+            for other_id in self._association_roles[association_id]:
+                if other_id == role_id:
+                    continue
+                if other_role_type is not None and \
+                        self._roles[other_id][1] != other_role_type.id:
+                    continue
+                pairs.append((role_id, other_id))
+        return pairs
+
+    def _get_neighbour_ids (self, topic_ids, association_type, role_type,
+                            other_role_type):
+        """Returns the database IDs of the topics that play the
+        counterpart roles of the topics with `topic_ids`.
+
+        :rtype: set of integers
+
+        """
+        return set([self._roles[role_id][2] for role_id in
+                    self._get_counterpart_ids(topic_ids, association_type,
+                                              role_type, other_role_type)])
+
+    def _remove_role (self, role_id):
+        """Removes the role with `role_id` from the adjacency
+        structure.
+
+        :rtype: tuple of the IDs of the role's association, type and
+          player
+
+        """
+        role = self._roles.pop(role_id, None)
+        if role is not None:
+            association_id, type_id, player_id = role
+            _discard(self._association_roles, association_id, role_id)
+            _discard(self._player_roles, player_id, role_id)
+        return role
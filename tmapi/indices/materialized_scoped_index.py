@@ -0,0 +1,274 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from tmapi.exceptions import IllegalArgumentException
+from tmapi.indices.index import ConstructSet, _discard
+from tmapi.indices.scoped_index import ScopedIndex
+from tmapi.models import Association, Name, Occurrence, Topic
+from tmapi.models.events import ConstructCreated, ConstructEvent, \
+    ConstructRemoved, ThemeAdded, ThemeRemoved, TopicMapChanged, \
+    TopicsMerged
+from tmapi.models.variant import Variant
+
+
+class MaterializedScopedIndex (ScopedIndex):
+
+    """`ScopedIndex` that answers queries from an inverted index of
+    scopes held in memory.
+
+    For each kind of scoped construct, the index maps each theme to
+    the set of the database IDs of the constructs whose scope contains
+    it, so that queries for any or all of a list of themes are
+    answered by the union or intersection of those sets. The scope of
+    a variant includes the scope of its name.
+
+    The index is loaded when it is opened, and is then kept up to
+    date from the events describing each change to the topic map; a
+    bulk change or a merge causes it to be reloaded. While the index
+    is closed, queries are answered from the database as by
+    `ScopedIndex`.
+
+    Only changes made in this process are reported, and they are
+    reported when made rather than when committed, so the index is
+    not auto updated: `reindex()` must be called after a transaction
+    that changed the topic map is rolled back, and before use where
+    other processes change the topic map.
+
+    Results are returned as `ConstructSet`s rather than `QuerySet`s.
+
+    """
+
+    def __init__ (self, topic_map):
+        super(MaterializedScopedIndex, self).__init__(topic_map)
+        self._clear()
+
+    def close (self):
+        super(MaterializedScopedIndex, self).close()
+        self._clear()
+
+    def get_associations (self, themes=None, match_all=False):
+        if not self._open:
+            return super(MaterializedScopedIndex, self).get_associations(
+                themes, match_all)
+        return self._get_scoped(Association, themes, match_all)
+
+    def get_association_themes (self):
+        if not self._open:
+            return super(MaterializedScopedIndex,
+                         self).get_association_themes()
+        return ConstructSet(Topic, self._postings[Association])
+
+    def get_names (self, themes=None, match_all=False):
+        if not self._open:
+            return super(MaterializedScopedIndex, self).get_names(
+                themes, match_all)
+        return self._get_scoped(Name, themes, match_all)
+
+    def get_name_themes (self):
+        if not self._open:
+            return super(MaterializedScopedIndex, self).get_name_themes()
+        return ConstructSet(Topic, self._postings[Name])
+
+    def get_occurrences (self, themes=None, match_all=False):
+        if not self._open:
+            return super(MaterializedScopedIndex, self).get_occurrences(
+                themes, match_all)
+        return self._get_scoped(Occurrence, themes, match_all)
+
+    def get_occurrence_themes (self):
+        if not self._open:
+            return super(MaterializedScopedIndex,
+                         self).get_occurrence_themes()
+        return ConstructSet(Topic, self._postings[Occurrence])
+
+    def get_variants (self, themes, match_all=False):
+        if not self._open:
+            return super(MaterializedScopedIndex, self).get_variants(
+                themes, match_all)
+        if themes is None:
+            raise IllegalArgumentException('themes must not be None')
+        return self._get_scoped(Variant, themes, match_all)
+
+    def get_variant_themes (self):
+        if not self._open:
+            return super(MaterializedScopedIndex, self).get_variant_themes()
+        # Every theme of a name is a variant theme, whether or not the
+        # name has variants.
+        return ConstructSet(Topic, set(self._postings[Variant]).union(
+                self._postings[Name]))
+
+    def is_auto_updated (self):
+        return False
+
+    def notify (self, event):
+        if not self._open:
+            return
+        if isinstance(event, (TopicMapChanged, TopicsMerged)):
+            self.reindex()
+            return
+        if not isinstance(event, ConstructEvent) or \
+                event.model not in self._scopes:
+            return
+        # The scopes of the variants affected by the change are
+        # compared before and after it, since their postings include
+        # the themes of their names.
+        if event.model is Name:
+            variant_ids = list(self._name_variants.get(
+                    event.construct_id, ()))
+        elif event.model is Variant:
+            variant_ids = [event.construct_id]
+        else:
+            variant_ids = []
+        old_scopes = [self._get_variant_scope(variant_id)
+                      for variant_id in variant_ids]
+        scopes = self._scopes[event.model]
+        if isinstance(event, ConstructCreated):
+            self._constructs[event.model].add(event.construct_id)
+            scopes[event.construct_id] = set()
+            if event.model is Variant:
+                name_id = event.construct.name_id
+                self._variant_names[event.construct_id] = name_id
+                self._name_variants.setdefault(name_id, set()).add(
+                    event.construct_id)
+        elif isinstance(event, ConstructRemoved):
+            self._constructs[event.model].discard(event.construct_id)
+            for theme_id in scopes.pop(event.construct_id, ()):
+                self._remove_posting(event.model, theme_id,
+                                     event.construct_id)
+            if event.model is Variant:
+                name_id = self._variant_names.pop(event.construct_id, None)
+                _discard(self._name_variants, name_id, event.construct_id)
+        elif isinstance(event, ThemeRemoved):
+            scopes.get(event.construct_id, set()).discard(event.theme_id)
+            self._remove_posting(event.model, event.theme_id,
+                                 event.construct_id)
+        elif isinstance(event, ThemeAdded):
+            scopes.setdefault(event.construct_id, set()).add(event.theme_id)
+            self._add_posting(event.model, event.theme_id,
+                              event.construct_id)
+        for variant_id, old_scope in zip(variant_ids, old_scopes):
+            scope = self._get_variant_scope(variant_id)
+            for theme_id in old_scope.difference(scope):
+                _discard(self._postings[Variant], theme_id, variant_id)
+            for theme_id in scope.difference(old_scope):
+                self._postings[Variant].setdefault(theme_id, set()).add(
+                    variant_id)
+
+    def open (self):
+        super(MaterializedScopedIndex, self).open()
+        self.reindex()
+
+    def reindex (self):
+        """Reloads the inverted index from the topic map, if the index
+        is open."""
+        if not self._open:
+            return
+        constructs = {}
+        scopes = {}
+        for model in (Association, Name, Occurrence, Variant):
+            column = model._meta.object_name.lower()
+            model_scopes = dict([(construct_id, set()) for construct_id in
+                                 model.objects.filter(
+                        topic_map=self.topic_map).values_list(
+                        'id', flat=True).iterator()])
+            for construct_id, theme_id in model.scope.through.objects.filter(
+                **{column + '__topic_map': self.topic_map}).values_list(
+                column, 'topic').iterator():
+                model_scopes[construct_id].add(theme_id)
+            constructs[model] = set(model_scopes)
+            scopes[model] = model_scopes
+        variant_names = dict(Variant.objects.filter(
+                topic_map=self.topic_map).values_list('id', 'name').iterator())
+        name_variants = {}
+        for variant_id, name_id in variant_names.items():
+            name_variants.setdefault(name_id, set()).add(variant_id)
+        self._constructs = constructs
+        self._scopes = scopes
+        self._variant_names = variant_names
+        self._name_variants = name_variants
+        postings = {}
+        for model, model_scopes in scopes.items():
+            model_postings = {}
+            for construct_id in model_scopes:
+                if model is Variant:
+                    scope = self._get_variant_scope(construct_id)
+                else:
+                    scope = model_scopes[construct_id]
+                for theme_id in scope:
+                    model_postings.setdefault(theme_id, set()).add(
+                        construct_id)
+            postings[model] = model_postings
+        self._postings = postings
+
+    def _add_posting (self, model, theme_id, construct_id):
+        """Adds `construct_id` to the posting list of `theme_id`.
+        Variant postings are maintained by `notify()`."""
+        if model is not Variant:
+            self._postings[model].setdefault(theme_id, set()).add(
+                construct_id)
+
+    def _clear (self):
+        """Discards the inverted index."""
+        self._constructs = {}
+        self._name_variants = {}
+        self._postings = {}
+        self._scopes = {}
+        self._variant_names = {}
+
+    def _get_scoped (self, model, themes, match_all):
+        """Returns the constructs of `model` whose scope contains at
+        least one of `themes`, or all of them if `match_all` is True,
+        or that are in the unconstrained scope if `themes` is None.
+
+        :rtype: `ConstructSet`
+
+        """
+        postings = self._postings[model]
+        if themes is None:
+            if match_all:
+                raise IllegalArgumentException(
+                    'match_all must not be specified if themes is None')
+            ids = self._constructs[model].difference(*postings.values())
+        else:
+            if isinstance(themes, Topic):
+                themes = [themes]
+            # Start from the shortest posting lists, so that
+            # intersections shrink as quickly as possible.
+            lists = sorted([postings.get(theme.id, frozenset())
+                            for theme in themes], key=len)
+            if not lists:
+                ids = frozenset()
+            elif match_all:
+                ids = lists[0].intersection(*lists[1:])
+            else:
+                ids = frozenset().union(*lists)
+        return ConstructSet(model, ids)
+
+    def _get_variant_scope (self, variant_id):
+        """Returns the database IDs of the themes of the variant with
+        `variant_id`, including those of its name.
+
+        :rtype: set of integers
+
+        """
+        scope = set(self._scopes[Variant].get(variant_id, ()))
+        name_id = self._variant_names.get(variant_id)
+        scope.update(self._scopes[Name].get(name_id, ()))
+        return scope
+
+    def _remove_posting (self, model, theme_id, construct_id):
+        """Removes `construct_id` from the posting list of
+        `theme_id`. Variant postings are maintained by `notify()`."""
+        if model is not Variant:
+            _discard(self._postings[model], theme_id, construct_id)
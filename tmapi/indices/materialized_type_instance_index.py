@@ -0,0 +1,233 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from tmapi.indices.index import ConstructSet, _discard
+from tmapi.indices.type_instance_index import TypeInstanceIndex
+from tmapi.models import Association, Name, Occurrence, Role, Topic
+from tmapi.models.events import ConstructCreated, ConstructRemoved, \
+    TopicMapChanged, TopicsMerged, TopicTypeAdded, TopicTypeRemoved, \
+    TypeChanged
+
+
+class MaterializedTypeInstanceIndex (TypeInstanceIndex):
+
+    """`TypeInstanceIndex` that answers queries from maps of database
+    IDs held in memory.
+
+    The maps are loaded when the index is opened, and are then kept
+    up to date from the events describing each change to the topic
+    map; a bulk change or a merge causes them to be reloaded. While
+    the index is closed, queries are answered from the database as by
+    `TypeInstanceIndex`.
+
+    Since the events describe the changes made in this process as
+    they are made, not as they are committed, the maps are not
+    corrected when a transaction is rolled back, nor updated with the
+    changes of other processes. The index is therefore not auto
+    updated, and `reindex()` must be called in those cases.
+
+    Results are returned as `ConstructSet`s rather than `QuerySet`s.
+
+    """
+
+    def __init__ (self, topic_map):
+        super(MaterializedTypeInstanceIndex, self).__init__(topic_map)
+        self._clear()
+
+    def close (self):
+        super(MaterializedTypeInstanceIndex, self).close()
+        self._clear()
+
+    def get_associations (self, association_type):
+        if not self._open:
+            return super(MaterializedTypeInstanceIndex,
+                         self).get_associations(association_type)
+        return self._get_typed(Association, association_type)
+
+    def get_association_types (self):
+        if not self._open:
+            return super(MaterializedTypeInstanceIndex,
+                         self).get_association_types()
+        return ConstructSet(Topic, self._typed[Association])
+
+    def get_names (self, name_type):
+        if not self._open:
+            return super(MaterializedTypeInstanceIndex, self).get_names(
+                name_type)
+        return self._get_typed(Name, name_type)
+
+    def get_name_types (self):
+        if not self._open:
+            return super(MaterializedTypeInstanceIndex,
+                         self).get_name_types()
+        return ConstructSet(Topic, self._typed[Name])
+
+    def get_occurrences (self, occurrence_type):
+        if not self._open:
+            return super(MaterializedTypeInstanceIndex,
+                         self).get_occurrences(occurrence_type)
+        return self._get_typed(Occurrence, occurrence_type)
+
+    def get_occurrence_types (self):
+        if not self._open:
+            return super(MaterializedTypeInstanceIndex,
+                         self).get_occurrence_types()
+        return ConstructSet(Topic, self._typed[Occurrence])
+
+    def get_roles (self, role_type):
+        if not self._open:
+            return super(MaterializedTypeInstanceIndex, self).get_roles(
+                role_type)
+        return self._get_typed(Role, role_type)
+
+    def get_role_types (self):
+        if not self._open:
+            return super(MaterializedTypeInstanceIndex,
+                         self).get_role_types()
+        return ConstructSet(Topic, self._typed[Role])
+
+    def get_topics (self, topic_types=None, match_all=False,
+                    transitive=False):
+        if not self._open:
+            return super(MaterializedTypeInstanceIndex, self).get_topics(
+                topic_types, match_all, transitive)
+        if topic_types is None:
+            # All topics that are not an instance of another topic.
+            ids = self._topic_ids.difference(self._types)
+        else:
+            if isinstance(topic_types, Topic):
+                topic_types = [topic_types]
+            instances = [self._get_instance_ids(topic_type, transitive)
+                         for topic_type in topic_types]
+            if not instances:
+                ids = frozenset()
+            elif match_all:
+                ids = instances[0].intersection(*instances[1:])
+            else:
+                ids = frozenset().union(*instances)
+        return ConstructSet(Topic, ids)
+
+    def get_topic_types (self):
+        if not self._open:
+            return super(MaterializedTypeInstanceIndex,
+                         self).get_topic_types()
+        return ConstructSet(Topic, self._instances)
+
+    def is_auto_updated (self):
+        return False
+
+    def notify (self, event):
+        if not self._open:
+            return
+        if isinstance(event, (TopicMapChanged, TopicsMerged)):
+            self.reindex()
+        elif isinstance(event, (TopicTypeAdded, TopicTypeRemoved)):
+            if isinstance(event, TopicTypeRemoved):
+                _discard(self._types, event.construct_id, event.type_id)
+                _discard(self._instances, event.type_id, event.construct_id)
+            else:
+                self._types.setdefault(event.construct_id, set()).add(
+                    event.type_id)
+                self._instances.setdefault(event.type_id, set()).add(
+                    event.construct_id)
+        elif event.model is Topic:
+            if isinstance(event, ConstructCreated):
+                self._topic_ids.add(event.construct_id)
+            elif isinstance(event, ConstructRemoved):
+                self._topic_ids.discard(event.construct_id)
+                for type_id in self._types.pop(event.construct_id, ()):
+                    _discard(self._instances, type_id, event.construct_id)
+        elif event.model in self._typed:
+            types = self._construct_types[event.model]
+            typed = self._typed[event.model]
+            if isinstance(event, ConstructCreated):
+                types[event.construct_id] = event.construct.type_id
+                typed.setdefault(event.construct.type_id, set()).add(
+                    event.construct_id)
+            elif isinstance(event, ConstructRemoved):
+                type_id = types.pop(event.construct_id, None)
+                _discard(typed, type_id, event.construct_id)
+            elif isinstance(event, TypeChanged):
+                _discard(typed, event.old_value, event.construct_id)
+                types[event.construct_id] = event.new_value
+                typed.setdefault(event.new_value, set()).add(
+                    event.construct_id)
+
+    def open (self):
+        super(MaterializedTypeInstanceIndex, self).open()
+        self.reindex()
+
+    def reindex (self):
+        """Reloads the maps from the topic map, if the index is open."""
+        if not self._open:
+            return
+        topic_ids = set()
+        types = {}
+        instances = {}
+        for topic_id in self.topic_map.topic_constructs.values_list(
+            'id', flat=True).iterator():
+            topic_ids.add(topic_id)
+        for topic_id, type_id in Topic.types.through.objects.filter(
+            from_topic__topic_map=self.topic_map).values_list(
+            'from_topic', 'to_topic').iterator():
+            types.setdefault(topic_id, set()).add(type_id)
+            instances.setdefault(type_id, set()).add(topic_id)
+        construct_types = {}
+        typed = {}
+        for model in (Association, Name, Occurrence, Role):
+            construct_types[model] = dict(model.objects.filter(
+                    topic_map=self.topic_map).values_list(
+                    'id', 'type').iterator())
+            constructs = {}
+            for construct_id, type_id in construct_types[model].items():
+                constructs.setdefault(type_id, set()).add(construct_id)
+            typed[model] = constructs
+        self._construct_types = construct_types
+        self._topic_ids = topic_ids
+        self._types = types
+        self._instances = instances
+        self._typed = typed
+
+    def _clear (self):
+        """Discards the maps."""
+        self._construct_types = {}
+        self._topic_ids = set()
+        self._types = {}
+        self._instances = {}
+        self._typed = {}
+
+    def _get_instance_ids (self, topic_type, transitive):
+        """Returns the database IDs of the instances of `topic_type`,
+        and of its subtypes if `transitive` is True.
+
+        The subtypes are queried from the database.
+
+        :rtype: frozenset of integers
+
+        """
+        type_ids = [topic_type.id]
+        if transitive:
+            type_ids.extend(self.get_subtypes(topic_type).values_list(
+                    'id', flat=True))
+        return frozenset().union(*[self._instances.get(type_id, ())
+                                   for type_id in type_ids])
+
+    def _get_typed (self, model, topic_type):
+        """Returns the constructs of `model` typed by `topic_type`.
+
+        :rtype: `ConstructSet`
+
+        """
+        return ConstructSet(model, self._typed[model].get(
+                topic_type.id, frozenset()))
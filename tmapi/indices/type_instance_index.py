@@ -12,10 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from django.db import connection
 from django.db.models import Q
 
+from tmapi.constants import SUBTYPE, SUPERTYPE, SUPERTYPE_SUBTYPE
 from tmapi.indices.index import Index
-from tmapi.models import Name, Occurrence, Role, Topic
+from tmapi.models import Association, Name, Occurrence, Role, Topic
+from tmapi.models.subject_identifier import SubjectIdentifier
 
 
 class TypeInstanceIndex (Index):
@@ -28,6 +31,11 @@ class TypeInstanceIndex (Index):
     retrieval of `Association`s, `Role`s, `Occurrence`s and `Name`s by
     their `type` property is supported.
 
+    The supertype-subtype hierarchy is formed by associations of the
+    TMDM supertype-subtype type. It is followed by a recursive query,
+    which requires a database that supports recursive common table
+    expressions (SQLite 3.8.3, PostgreSQL 8.4, MySQL 8.0).
+
     """
 
     def get_associations (self, association_type):
@@ -129,7 +137,34 @@ class TypeInstanceIndex (Index):
         """
         return self.topic_map.get_topics().exclude(typed_roles=None)
 
-    def get_topics (self, topic_types=None, match_all=False):
+    def get_subtypes (self, topic_type):
+        """Returns the topics that are direct or indirect subtypes of
+        `topic_type`.
+
+        The return value may be empty but must never be None.
+
+        :param topic_type: the supertype
+        :type topic_type: `Topic`
+        :rtype: `QuerySet` of `Topic`s
+
+        """
+        return self._get_hierarchy(topic_type, SUPERTYPE, SUBTYPE)
+
+    def get_supertypes (self, topic_type):
+        """Returns the topics that are direct or indirect supertypes
+        of `topic_type`.
+
+        The return value may be empty but must never be None.
+
+        :param topic_type: the subtype
+        :type topic_type: `Topic`
+        :rtype: `QuerySet` of `Topic`s
+
+        """
+        return self._get_hierarchy(topic_type, SUBTYPE, SUPERTYPE)
+
+    def get_topics (self, topic_types=None, match_all=False,
+                    transitive=False):
         """Returns the topics which are an instance of at least one of
         the specified `topic_types`, or all topics which are not an
         instance of another topic (iff `topic_types` is None).
@@ -137,6 +172,9 @@ class TypeInstanceIndex (Index):
         If `match_all` is True, a topic must be an instance of all
         `topic_types`; if False, the topic must be an instace of at
         least one type.
+
+        If `transitive` is True, a topic that is an instance of a
+        subtype of a type is also an instance of that type.
         
         The return value may be empty but must never by None.
 
@@ -145,11 +183,22 @@ class TypeInstanceIndex (Index):
         :param match_all: whether a topic must be an instance of only
           one or all `topic_types`
         :type match_all: boolean
+        :param transitive: whether to include the instances of
+          subtypes of `topic_types`
+        :type transitive: boolean
         :rtype: `QuerySet` of `Topic`s
         
         """
         topics = self.topic_map.get_topics()
-        if topic_types is not None:
+        if topic_types is not None and transitive:
+            if isinstance(topic_types, Topic):
+                topic_types = [topic_types]
+            if match_all:
+                for topic_type in topic_types:
+                    topics = self._filter_instances(topics, [topic_type])
+            else:
+                topics = self._filter_instances(topics, topic_types)
+        elif topic_types is not None:
             if isinstance(topic_types, Topic):
                 topics = topics.filter(types=topic_types)
             elif match_all:
@@ -178,3 +227,92 @@ class TypeInstanceIndex (Index):
         """
         return self.topic_map.get_topics().exclude(typed_topics=None)
 
+    def _filter_instances (self, topics, topic_types):
+        """Returns `topics` filtered to the instances of
+        `topic_types` or their subtypes.
+
+        :rtype: `QuerySet` of `Topic`s
+
+        """
+        through = Topic.types.through._meta
+        sql, params = self._get_hierarchy_sql(
+            [topic_type.id for topic_type in topic_types], SUPERTYPE,
+            SUBTYPE)
+        quote_name = connection.ops.quote_name
+        where = '%s.%s IN (SELECT %s FROM %s WHERE %s IN (%s))' % (
+            quote_name(Topic._meta.db_table),
+            quote_name(Topic._meta.pk.column),
+            quote_name(through.get_field('from_topic').column),
+            quote_name(through.db_table),
+            quote_name(through.get_field('to_topic').column), sql)
+        return topics.extra(where=[where], params=params)
+
+    def _get_hierarchy (self, topic_type, from_role_type, to_role_type):
+        """Returns the topics reached from `topic_type` through
+        supertype-subtype associations, from the role of
+        `from_role_type` to the role of `to_role_type`.
+
+        :rtype: `QuerySet` of `Topic`s
+
+        """
+        sql, params = self._get_hierarchy_sql(
+            [topic_type.id], from_role_type, to_role_type)
+        where = '%s.%s IN (%s)' % (
+            connection.ops.quote_name(Topic._meta.db_table),
+            connection.ops.quote_name(Topic._meta.pk.column), sql)
+        return self.topic_map.get_topics().extra(
+            where=[where], params=params).exclude(id=topic_type.id)
+
+    def _get_hierarchy_sql (self, topic_ids, from_role_type, to_role_type):
+        """Returns the SQL, and its parameters, of a query selecting
+        the IDs of the topics with `topic_ids` and of all of the
+        topics reached from them through supertype-subtype
+        associations, from the role of `from_role_type` to the role of
+        `to_role_type`.
+
+        The types are identified by their subject identifiers. The
+        query is only used as a subquery, since Python's sqlite3
+        module commits the current transaction before a statement that
+        does not begin with SELECT.
+
+        :rtype: tuple of string and list
+
+        """
+        quote_name = connection.ops.quote_name
+        role = Role._meta
+        psi = SubjectIdentifier._meta
+        # Selects the ID of the topic in this topic map with the
+        # subject identifier given as a parameter.
+        psi_sql = 'SELECT %s FROM %s WHERE %s = %%s AND %s = %%s' % (
+            quote_name(psi.get_field('topic').column),
+            quote_name(psi.db_table),
+            quote_name(psi.get_field('address').column),
+            quote_name(psi.get_field('containing_topic_map').column))
+        sql = """WITH RECURSIVE hierarchy (topic_id) AS (
+            SELECT %(topic_id)s FROM %(topic)s WHERE %(topic_id)s IN (%(ids)s)
+            UNION
+            SELECT other.%(player)s FROM hierarchy
+            INNER JOIN %(role)s own ON own.%(player)s = hierarchy.topic_id
+            INNER JOIN %(role)s other ON other.%(association)s =
+                own.%(association)s
+            INNER JOIN %(association_table)s a ON a.%(association_id)s =
+                own.%(association)s
+            WHERE a.%(association_type)s IN (%(psi)s)
+                AND own.%(type)s IN (%(psi)s) AND other.%(type)s IN (%(psi)s))
+            SELECT topic_id FROM hierarchy""" % {
+            'association': quote_name(role.get_field('association').column),
+            'association_id': quote_name(Association._meta.pk.column),
+            'association_table': quote_name(Association._meta.db_table),
+            'association_type': quote_name(
+                Association._meta.get_field('type').column),
+            'ids': ', '.join(['%s'] * len(topic_ids)),
+            'player': quote_name(role.get_field('player').column),
+            'psi': psi_sql, 'role': quote_name(role.db_table),
+            'topic': quote_name(Topic._meta.db_table),
+            'topic_id': quote_name(Topic._meta.pk.column),
+            'type': quote_name(role.get_field('type').column)}
+        topic_map_id = self.topic_map.id
+        params = list(topic_ids) + [SUPERTYPE_SUBTYPE, topic_map_id,
+                                    from_role_type, topic_map_id,
+                                    to_role_type, topic_map_id]
+        return sql, params
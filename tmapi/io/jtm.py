@@ -0,0 +1,150 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing a writer for JTM 1.1 topic maps.
+
+The writer fetches and serializes the topic map a chunk at a time.
+
+"""
+
+import json
+
+from walker import TopicMapWalker
+
+
+class JTMWriter (object):
+
+    """Writes a topic map as a JTM 1.1 document.
+
+    Every topic is given an item identifier derived from its database
+    ID and the base locator, which is used to reference it.
+
+    """
+
+    def __init__ (self, topic_map, base=None, chunk_size=1000):
+        """Creates a writer for `topic_map`.
+
+        :param topic_map: the topic map to write
+        :type topic_map: `TopicMap`
+        :param base: the base locator used to generate topic
+          references; defaults to the topic map's locator
+        :type base: `Locator` or string
+        :param chunk_size: the number of topics or associations to
+          fetch and serialize at a time
+        :type chunk_size: integer
+
+        """
+        self._topic_map = topic_map
+        if base is None:
+            base = topic_map.get_locator()
+        if not isinstance(base, basestring):
+            base = base.to_external_form()
+        self._base = base.split('#')[0]
+        self._chunk_size = chunk_size
+
+    def serialize (self):
+        """Yields the JTM document in UTF-8 encoded chunks.
+
+        :rtype: generator of strings
+
+        """
+        walker = TopicMapWalker(self._topic_map, self._chunk_size)
+        header = {'version': '1.1', 'item_type': 'topicmap'}
+        iids = [iid.address for iid in self._topic_map.get_item_identifiers()]
+        if iids:
+            header['item_identifiers'] = iids
+        if self._topic_map.reifier_id is not None:
+            header['reifier'] = self._topic_ref(self._topic_map.reifier_id)
+        yield json.dumps(header)[:-1] + ', "topics": ['
+        separator = ''
+        for topics in walker.get_topics():
+            chunk = [self._topic(topic) for topic in topics]
+            yield separator + ', '.join(chunk)
+            separator = ', '
+        yield '], "associations": ['
+        separator = ''
+        for associations in walker.get_associations():
+            chunk = [self._association(association)
+                     for association in associations]
+            yield separator + ', '.join(chunk)
+            separator = ', '
+        yield ']}\n'
+
+    def write (self, out):
+        """Writes the JTM document to the file object `out`.
+
+        :param out: the file object to write to
+        :type out: file
+
+        """
+        for chunk in self.serialize():
+            out.write(chunk)
+
+    def _association (self, association):
+        result = self._construct(association)
+        result['roles'] = []
+        for role in association['roles']:
+            role_result = self._construct(role)
+            role_result['player'] = self._topic_ref(role['player'])
+            result['roles'].append(role_result)
+        return json.dumps(result)
+
+    def _construct (self, construct):
+        """Returns a dictionary of the item identifiers, reifier, type
+        and scope of `construct`, omitting those that are not
+        present."""
+        result = {}
+        if construct['iids']:
+            result['item_identifiers'] = construct['iids']
+        if construct['reifier'] is not None:
+            result['reifier'] = self._topic_ref(construct['reifier'])
+        if construct.get('type') is not None:
+            result['type'] = self._topic_ref(construct['type'])
+        if construct.get('scope'):
+            result['scope'] = [self._topic_ref(theme_id)
+                               for theme_id in construct['scope']]
+        for key in ('value', 'datatype'):
+            if key in construct:
+                result[key] = construct[key]
+        return result
+
+    def _topic (self, topic):
+        result = {'item_identifiers': [self._topic_address(topic['id'])] +
+                  topic['iids']}
+        if topic['sids']:
+            result['subject_identifiers'] = topic['sids']
+        if topic['slos']:
+            result['subject_locators'] = topic['slos']
+        if topic['types']:
+            result['instance_of'] = [self._topic_ref(type_id)
+                                     for type_id in topic['types']]
+        if topic['names']:
+            result['names'] = []
+            for name in topic['names']:
+                name_result = self._construct(name)
+                if name['variants']:
+                    name_result['variants'] = [
+                        self._construct(variant)
+                        for variant in name['variants']]
+                result['names'].append(name_result)
+        if topic['occurrences']:
+            result['occurrences'] = [self._construct(occurrence) for
+                                     occurrence in topic['occurrences']]
+        return json.dumps(result)
+
+    def _topic_address (self, topic_id):
+        return '%s#id%d' % (self._base, topic_id)
+
+    def _topic_ref (self, topic_id):
+        return 'ii:' + self._topic_address(topic_id)
@@ -0,0 +1,690 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing the batch loader used by the topic map readers.
+
+A reader parses a serialized topic map into plain dictionaries, and
+passes batches of them to a `BatchLoader`, which writes them to a
+topic map using a fixed number of bulk queries per batch.
+
+A topic reference is a (kind, address) tuple, where kind is one of
+`ITEM_IDENTIFIER`, `SUBJECT_IDENTIFIER` and `SUBJECT_LOCATOR`, and
+address is the external form of a locator.
+
+A topic is a dictionary with the keys 'iids', 'sids' and 'slos'
+(lists of addresses), 'types' (list of topic references), 'names' and
+'occurrences'.
+
+A name is a dictionary with the keys 'type' (topic reference),
+'scope' (list of topic references), 'value', 'reifier' (topic
+reference or None), 'iids' and 'variants'. Occurrences and variants
+have the same keys, less 'variants', plus 'datatype' (variants have
+no 'type').
+
+An association is a dictionary with the keys 'type', 'scope',
+'reifier', 'iids' and 'roles'. A role is a dictionary with the keys
+'type', 'player', 'reifier' and 'iids'.
+
+The result of loading is the same as creating each construct with
+the TMAPI methods and merging as `TopicMap.merge_in` does: topics
+sharing an identity are merged, and duplicate characteristics and
+associations are not created.
+
+"""
+
+from tmapi.constants import BULK_BATCH_SIZE
+from tmapi.exceptions import IdentityConstraintException, \
+    ModelConstraintException
+from tmapi.models import Association, ItemIdentifier, Locator, Name, \
+    Occurrence, Role, SubjectIdentifier, SubjectLocator, Topic, TopicMap, \
+    Variant
+from tmapi.models.bulk_utils import bulk_add_item_identifiers, \
+    bulk_create_constructs
+from tmapi.models.events import TopicMapChanged
+from tmapi.models.index_registry import notify_indices
+from tmapi.models.signature import generate_signature_hash
+
+
+ITEM_IDENTIFIER = 'ii'
+SUBJECT_IDENTIFIER = 'si'
+SUBJECT_LOCATOR = 'sl'
+
+# Kinds of union-find nodes, in addition to the locator kinds.
+_IDENTITY = 'id'
+_ELEMENT = 'element'
+_DATABASE = 'db'
+
+
+class BatchLoader (object):
+
+    """Writes batches of parsed topics and associations to a topic map."""
+
+    def __init__ (self, topic_map):
+        self._topic_map = topic_map
+
+    def load (self, topics, associations):
+        """Writes `topics` and `associations` to the topic map.
+
+        :param topics: parsed topics
+        :type topics: list of dictionaries
+        :param associations: parsed associations
+        :type associations: list of dictionaries
+
+        """
+        self._parents = {}
+        self._assigned_iids = {}
+        self._deferred = []
+        self._resolve_topics(topics, associations)
+        self._add_types(topics)
+        self._add_names(topics)
+        self._add_occurrences(topics)
+        self._add_associations(associations)
+        for method, args in self._deferred:
+            method(*args)
+        notify_indices(self._topic_map.id,
+                       TopicMapChanged(self._topic_map.id))
+
+    def _add_associations (self, associations):
+        """Creates the non-duplicate `associations`."""
+        signatures = {}
+        new = []
+        for association in associations:
+            type_id = self._get_topic_id(association['type'])
+            scope = self._get_scope(association['scope'])
+            roles = {}
+            for role in association['roles']:
+                role_signature = (self._get_topic_id(role['type']),
+                                  self._get_topic_id(role['player']))
+                if role_signature in roles:
+                    self._merge_parsed(roles[role_signature], role)
+                else:
+                    roles[role_signature] = role
+            signature = (type_id, scope, frozenset(roles.keys()))
+            if signature in signatures:
+                existing = signatures[signature]
+                self._merge_parsed(existing, association)
+                for role_signature, role in roles.items():
+                    self._merge_parsed(existing['roles'][role_signature],
+                                       role)
+            else:
+                association = dict(association, roles=roles)
+                signatures[signature] = association
+                new.append((signature, association))
+        hashes = dict([(signature, generate_signature_hash(*signature))
+                       for signature, association in new])
+        existing = self._get_existing_associations(hashes)
+        constructs = []
+        for signature, association in new:
+            if signature in existing:
+                if _has_merge_data(association):
+                    self._deferred.append((self._merge_association,
+                                           (existing[signature], association)))
+                continue
+            constructs.append((Association(
+                        type_id=signature[0], topic_map=self._topic_map,
+                        reifier_id=self._get_reifier_id(association),
+                        signature=hashes[signature]), signature[1],
+                               association))
+        self._create(Association, constructs)
+        roles = []
+        for construct, scope, association in constructs:
+            for (type_id, player_id), role in association['roles'].items():
+                roles.append((Role(association_id=construct.id,
+                                   type_id=type_id, player_id=player_id,
+                                   topic_map=self._topic_map,
+                                   reifier_id=self._get_reifier_id(role)),
+                               (), role))
+        self._create(Role, roles)
+
+    def _add_names (self, topics):
+        """Creates the non-duplicate names of `topics`."""
+        new = []
+        for index, topic in enumerate(topics):
+            topic_id = self._get_topic_id((_ELEMENT, index))
+            for name in topic['names']:
+                signature = (topic_id, self._get_topic_id(name['type']),
+                             self._get_scope(name['scope']), name['value'])
+                new.append((signature, name))
+        new = self._merge_duplicates(new)
+        hashes = dict([(signature, generate_signature_hash(
+                        signature[1], signature[2], value=signature[3]))
+                       for signature, name in new])
+        existing = self._get_existing_characteristics(Name, hashes)
+        constructs = []
+        for signature, name in new:
+            if signature in existing:
+                if _has_merge_data(name):
+                    self._deferred.append((self._merge_name,
+                                           (existing[signature], name)))
+                continue
+            topic_id, type_id, scope, value = signature
+            constructs.append((Name(
+                        topic_id=topic_id, type_id=type_id, value=value,
+                        topic_map=self._topic_map,
+                        reifier_id=self._get_reifier_id(name),
+                        signature=hashes[signature]), scope, name))
+        self._create(Name, constructs)
+        variants = []
+        for construct, scope, name in constructs:
+            for signature, variant in self._merge_duplicates(
+                [((self._get_scope(variant['scope']), variant['datatype'],
+                   variant['value']), variant)
+                 for variant in name['variants']]):
+                variants.append((Variant(
+                            name_id=construct.id, value=variant['value'],
+                            datatype=variant['datatype'],
+                            topic_map=self._topic_map,
+                            reifier_id=self._get_reifier_id(variant),
+                            signature=generate_signature_hash(
+                                None, signature[0], (), *signature[1:])),
+                                 signature[0], variant))
+        self._create(Variant, variants)
+
+    def _add_occurrences (self, topics):
+        """Creates the non-duplicate occurrences of `topics`."""
+        new = []
+        for index, topic in enumerate(topics):
+            topic_id = self._get_topic_id((_ELEMENT, index))
+            for occurrence in topic['occurrences']:
+                signature = (topic_id, self._get_topic_id(occurrence['type']),
+                             self._get_scope(occurrence['scope']),
+                             occurrence['datatype'], occurrence['value'])
+                new.append((signature, occurrence))
+        new = self._merge_duplicates(new)
+        hashes = dict([(signature, generate_signature_hash(
+                        signature[1], signature[2], (), *signature[3:]))
+                       for signature, occurrence in new])
+        existing = self._get_existing_characteristics(Occurrence, hashes)
+        constructs = []
+        for signature, occurrence in new:
+            if signature in existing:
+                if _has_merge_data(occurrence):
+                    self._deferred.append((self._merge_occurrence,
+                                           (existing[signature], occurrence)))
+                continue
+            topic_id, type_id, scope, datatype, value = signature
+            constructs.append((Occurrence(
+                        topic_id=topic_id, type_id=type_id, value=value,
+                        datatype=datatype, topic_map=self._topic_map,
+                        reifier_id=self._get_reifier_id(occurrence),
+                        signature=hashes[signature]), scope, occurrence))
+        self._create(Occurrence, constructs)
+
+    def _add_types (self, topics):
+        """Adds the types of `topics` that their target topics do not
+        already have."""
+        pairs = set()
+        for index, topic in enumerate(topics):
+            topic_id = self._get_topic_id((_ELEMENT, index))
+            for reference in topic['types']:
+                pairs.add((topic_id, self._get_topic_id(reference)))
+        through = Topic.types.through
+        instance_ids = list(set([instance_id for instance_id, type_id in pairs
+                                 if instance_id in self._existing_topic_ids]))
+        for batch in _chunks(instance_ids):
+            pairs.difference_update(through.objects.filter(
+                    from_topic__in=batch).values_list(
+                    'from_topic', 'to_topic'))
+        through.objects.bulk_create(
+            [through(from_topic_id=instance_id, to_topic_id=type_id)
+             for instance_id, type_id in pairs], batch_size=BULK_BATCH_SIZE)
+
+    def _check_reifiers (self, constructs):
+        """Raises a `ModelConstraintException` if an existing topic
+        used as the reifier of one of the unsaved `constructs` already
+        reifies a construct."""
+        reifier_ids = [construct.reifier_id for construct, scope, parsed
+                       in constructs
+                       if construct.reifier_id in self._existing_topic_ids]
+        for model in (Association, Name, Occurrence, Role, TopicMap, Variant):
+            for batch in _chunks(reifier_ids):
+                if model.objects.filter(reifier__in=batch).exists():
+                    raise ModelConstraintException(
+                        self._topic_map,
+                        'The reifier already reifies another construct')
+
+    def _create (self, model, constructs):
+        """Saves the unsaved constructs in `constructs`, along with
+        their scope and item identifiers.
+
+        :param model: the model class of the constructs
+        :type model: class
+        :param constructs: the unsaved construct, its scope (as a
+          frozenset of topic IDs), and its parsed representation
+        :type constructs: list of tuples
+
+        """
+        if not constructs:
+            return
+        self._check_reifiers(constructs)
+        bulk_create_constructs(self._topic_map, [construct for construct,
+                                                 scope, parsed in constructs])
+        pairs = []
+        for construct, scope, parsed in constructs:
+            for address in parsed['iids']:
+                if self._assigned_iids.get(address) is construct:
+                    # Duplicates merged into this construct may have
+                    # had the same item identifier.
+                    continue
+                self._assign_iid(address, construct)
+                pairs.append((construct.id, address))
+        bulk_add_item_identifiers(self._topic_map, model, pairs)
+        if model in (Association, Name, Occurrence, Variant):
+            through = model.scope.through
+            column = '%s_id' % model._meta.object_name.lower()
+            through.objects.bulk_create(
+                [through(**{column: construct.id, 'topic_id': theme_id})
+                 for construct, scope, parsed in constructs
+                 for theme_id in scope], batch_size=BULK_BATCH_SIZE)
+
+    def _assign_iid (self, address, construct):
+        """Records that the item identifier `address` is to be added
+        to the non-topic `construct`, raising an
+        `IdentityConstraintException` if it belongs to another
+        construct."""
+        existing = self._assigned_iids.get(address)
+        if address in self._existing_iids:
+            existing = self._topic_map.get_construct_by_item_identifier(
+                Locator(address))
+        if existing is not None:
+            raise IdentityConstraintException(
+                construct, existing, Locator(address),
+                'This item identifier is already associated with another construct')
+        self._assigned_iids[address] = construct
+
+    def _find (self, node):
+        """Returns the representative node of the set containing `node`."""
+        root = self._parents.setdefault(node, node)
+        while root != self._parents[root]:
+            root = self._parents[root]
+        while node != root:
+            self._parents[node], node = root, self._parents[node]
+        return root
+
+    def _get_existing_associations (self, hashes):
+        """Returns a dictionary mapping those of the signatures in
+        `hashes` that match associations in the topic map to the ID of
+        one such association.
+
+        :param hashes: dictionary mapping signatures to their hashes
+        :type hashes: dictionary
+        :rtype: dictionary
+
+        """
+        # Only associations whose role players all existed before
+        # this batch can have duplicates in the topic map.
+        signatures = {}
+        for signature, signature_hash in hashes.items():
+            type_id, scope, roles = signature
+            if set([player_id for role_type_id, player_id in roles]) <= \
+                    self._existing_topic_ids:
+                signatures[signature_hash] = signature
+        existing = {}
+        for batch in _chunks(signatures.keys()):
+            for association_id, signature_hash in \
+                    self._topic_map.association_constructs.filter(
+                signature__in=batch).values_list('id', 'signature'):
+                existing[signatures[signature_hash]] = association_id
+        return existing
+
+    def _get_existing_characteristics (self, model, hashes):
+        """Returns a dictionary mapping those of the signatures in
+        `hashes` that match characteristics of type `model` in the
+        topic map to the ID of one such characteristic.
+
+        :param model: the model class of the characteristics
+        :type model: class
+        :param hashes: dictionary mapping signatures, whose first item
+          is the ID of the parent topic, to their hashes
+        :type hashes: dictionary
+        :rtype: dictionary
+
+        """
+        signatures = {}
+        for signature, signature_hash in hashes.items():
+            if signature[0] in self._existing_topic_ids:
+                signatures[(signature[0], signature_hash)] = signature
+        existing = {}
+        signature_hashes = list(set([signature_hash for topic_id,
+                                     signature_hash in signatures]))
+        for batch in _chunks(signature_hashes):
+            for construct_id, topic_id, signature_hash in model.objects.filter(
+                topic_map=self._topic_map, signature__in=batch).values_list(
+                'id', 'topic', 'signature'):
+                signature = signatures.get((topic_id, signature_hash))
+                if signature is not None:
+                    existing[signature] = construct_id
+        return existing
+
+    def _get_reifier_id (self, parsed):
+        """Returns the ID of the topic reifying the construct
+        `parsed`, or None."""
+        if parsed['reifier'] is None:
+            return None
+        reifier_id = self._get_topic_id(parsed['reifier'])
+        if reifier_id in self._used_reifiers:
+            raise ModelConstraintException(
+                self._topic_map,
+                'The reifier already reifies another construct')
+        self._used_reifiers.add(reifier_id)
+        return reifier_id
+
+    def _get_scope (self, references):
+        """Returns the scope represented by the topic `references`.
+
+        :rtype: frozenset of topic IDs
+
+        """
+        return frozenset([self._get_topic_id(reference)
+                          for reference in references])
+
+    def _get_topic_id (self, reference):
+        """Returns the ID of the topic identified by `reference`.
+
+        :param reference: a topic reference or element node
+        :type reference: tuple
+        :rtype: integer
+
+        """
+        kind, key = reference
+        if kind in (ITEM_IDENTIFIER, SUBJECT_IDENTIFIER):
+            reference = (_IDENTITY, key)
+        return self._topic_ids[self._find(reference)]
+
+    def _merge_association (self, association_id, parsed):
+        """Merges the item identifiers and reifiers of the parsed
+        association `parsed`, and of its roles, into the existing
+        association with ID `association_id`."""
+        association = Association.objects.get(pk=association_id)
+        self._merge_construct(association, parsed)
+        for role in association.get_roles():
+            parsed_role = parsed['roles'].get((role.type_id, role.player_id))
+            self._merge_construct(role, parsed_role)
+
+    def _merge_construct (self, construct, parsed):
+        """Merges the item identifiers and reifier of the parsed
+        construct `parsed` into the existing `construct`.
+
+        :param construct: the existing construct
+        :type construct: `Construct`
+        :param parsed: the parsed construct
+        :type parsed: dictionary
+
+        """
+        for address in parsed['iids']:
+            construct.add_item_identifier(Locator(address))
+        if parsed['reifier'] is not None:
+            reifier = Topic.objects.get(pk=self._get_topic_id(
+                    parsed['reifier']))
+            existing_reifier = construct.get_reifier()
+            if existing_reifier is None:
+                construct.set_reifier(reifier)
+            else:
+                existing_reifier.merge_in(reifier)
+
+    def _merge_duplicates (self, constructs):
+        """Returns `constructs` with those having the same signature
+        merged into a single construct.
+
+        :param constructs: signatures and parsed constructs
+        :type constructs: list of tuples
+        :rtype: list of tuples
+
+        """
+        merged = {}
+        result = []
+        for signature, parsed in constructs:
+            existing = merged.get(signature)
+            if existing is None:
+                merged[signature] = parsed
+                result.append((signature, parsed))
+            else:
+                self._merge_parsed(existing, parsed)
+        return result
+
+    def _merge_name (self, name_id, parsed):
+        """Merges the item identifiers, reifier and variants of the
+        parsed name `parsed` into the existing name with ID
+        `name_id`."""
+        name = Name.objects.get(pk=name_id)
+        self._merge_construct(name, parsed)
+        signatures = set()
+        for variant in name.get_variants():
+            signatures.add((frozenset(variant.scope.values_list(
+                            'id', flat=True)), variant.datatype,
+                            variant.value))
+        for signature, variant in self._merge_duplicates(
+            [((self._get_scope(variant['scope']), variant['datatype'],
+               variant['value']), variant) for variant in parsed['variants']]):
+            if signature in signatures:
+                continue
+            scope = list(Topic.objects.filter(id__in=signature[0]))
+            created = name.create_variant(variant['value'], scope,
+                                          Locator(variant['datatype']))
+            self._merge_construct(created, variant)
+
+    def _merge_occurrence (self, occurrence_id, parsed):
+        """Merges the item identifiers and reifier of the parsed
+        occurrence `parsed` into the existing occurrence with ID
+        `occurrence_id`."""
+        self._merge_construct(Occurrence.objects.get(pk=occurrence_id),
+                              parsed)
+
+    def _merge_parsed (self, existing, parsed):
+        """Merges the parsed construct `parsed` into the parsed
+        construct `existing`, which has the same signature."""
+        existing['iids'] = existing['iids'] + parsed['iids']
+        if existing['reifier'] is None:
+            existing['reifier'] = parsed['reifier']
+        elif parsed['reifier'] is not None:
+            reifier_id = self._get_topic_id(existing['reifier'])
+            other_id = self._get_topic_id(parsed['reifier'])
+            if reifier_id != other_id:
+                self._deferred.append((self._merge_topics,
+                                       (reifier_id, other_id)))
+        if 'variants' in parsed:
+            existing['variants'] = existing['variants'] + parsed['variants']
+
+    def _merge_topics (self, topic_id, other_id):
+        """Merges the topic with ID `other_id` into the topic with ID
+        `topic_id`."""
+        Topic.objects.get(pk=topic_id).merge_in(
+            Topic.objects.get(pk=other_id))
+
+    def _resolve_topics (self, topics, associations):
+        """Determines the topic for every topic and topic reference in
+        the batch, merging existing topics and creating new topics as
+        required, and adds any new identities to those topics."""
+        identities = set()
+        for index, topic in enumerate(topics):
+            element = (_ELEMENT, index)
+            self._find(element)
+            for address in topic['iids']:
+                identities.add((ITEM_IDENTIFIER, address))
+                self._union(element, (ITEM_IDENTIFIER, address))
+            for address in topic['sids']:
+                identities.add((SUBJECT_IDENTIFIER, address))
+                self._union(element, (SUBJECT_IDENTIFIER, address))
+            for address in topic['slos']:
+                identities.add((SUBJECT_LOCATOR, address))
+                self._union(element, (SUBJECT_LOCATOR, address))
+        for reference in _get_references(topics, associations):
+            identities.add(reference)
+            self._find(self._get_node(reference))
+        # Find the existing topics with any of the identities.
+        existing = set()
+        self._existing_iids = set()
+        addresses = list(set([address for kind, address in identities
+                              if kind != SUBJECT_LOCATOR]))
+        iids = list(set([address for topic in topics
+                         for address in _get_iids(topic)] +
+                        [address for association in associations
+                         for address in _get_iids(association)] +
+                        [address for kind, address in identities
+                         if kind == ITEM_IDENTIFIER]))
+        topics_by_iid = self._topic_map.topic_constructs
+        for batch in _chunks(addresses):
+            for address, topic_id in topics_by_iid.filter(
+                item_identifiers__address__in=batch).values_list(
+                'item_identifiers__address', 'id'):
+                existing.add((ITEM_IDENTIFIER, address))
+                self._union((_IDENTITY, address), (_DATABASE, topic_id))
+            for address, topic_id in SubjectIdentifier.objects.filter(
+                containing_topic_map=self._topic_map,
+                address__in=batch).values_list('address', 'topic'):
+                existing.add((SUBJECT_IDENTIFIER, address))
+                self._union((_IDENTITY, address), (_DATABASE, topic_id))
+        for batch in _chunks(list(set([address for kind, address in identities
+                                       if kind == SUBJECT_LOCATOR]))):
+            for address, topic_id in SubjectLocator.objects.filter(
+                containing_topic_map=self._topic_map,
+                address__in=batch).values_list('address', 'topic'):
+                existing.add((SUBJECT_LOCATOR, address))
+                self._union((SUBJECT_LOCATOR, address), (_DATABASE, topic_id))
+        for batch in _chunks(iids):
+            self._existing_iids.update(ItemIdentifier.objects.filter(
+                    containing_topic_map=self._topic_map,
+                    address__in=batch).values_list('address', flat=True))
+        # Merge existing topics that share an identity, and create a
+        # topic for each set of identities that matched none.
+        groups = {}
+        for node in self._parents.keys():
+            group = groups.setdefault(self._find(node), [])
+            if node[0] == _DATABASE:
+                group.append(node[1])
+        self._topic_ids = {}
+        self._existing_topic_ids = set()
+        self._used_reifiers = set()
+        new_groups = []
+        for root, topic_ids in groups.items():
+            if not topic_ids:
+                new_groups.append(root)
+                continue
+            topic_ids.sort()
+            target_id = topic_ids[0]
+            if len(topic_ids) > 1:
+                target = Topic.objects.get(pk=target_id)
+                for topic_id in topic_ids[1:]:
+                    target.merge_in(Topic.objects.get(pk=topic_id))
+            self._topic_ids[root] = target_id
+            self._existing_topic_ids.add(target_id)
+        new_topics = [Topic(topic_map=self._topic_map) for root in new_groups]
+        bulk_create_constructs(self._topic_map, new_topics)
+        for root, topic in zip(new_groups, new_topics):
+            self._topic_ids[root] = topic.id
+        # Add the new identities.
+        iids = []
+        sids = []
+        slos = []
+        for kind, address in identities - existing:
+            topic_id = self._get_topic_id((kind, address))
+            if kind == ITEM_IDENTIFIER:
+                if address in self._existing_iids:
+                    locator = Locator(address)
+                    raise IdentityConstraintException(
+                        Topic.objects.get(pk=topic_id),
+                        self._topic_map.get_construct_by_item_identifier(
+                            locator), locator,
+                        'This item identifier is already associated with another non-Topic construct')
+                iids.append((topic_id, address))
+            elif kind == SUBJECT_IDENTIFIER:
+                sids.append(SubjectIdentifier(
+                        topic_id=topic_id, address=address,
+                        containing_topic_map=self._topic_map))
+            else:
+                slos.append(SubjectLocator(
+                        topic_id=topic_id, address=address,
+                        containing_topic_map=self._topic_map))
+        bulk_add_item_identifiers(self._topic_map, Topic, iids)
+        self._existing_iids.update([address for topic_id, address in iids])
+        SubjectIdentifier.objects.bulk_create(sids, batch_size=BULK_BATCH_SIZE)
+        SubjectLocator.objects.bulk_create(slos, batch_size=BULK_BATCH_SIZE)
+
+    def _get_node (self, reference):
+        """Returns the union-find node for the topic `reference`."""
+        kind, address = reference
+        if kind in (ITEM_IDENTIFIER, SUBJECT_IDENTIFIER):
+            return (_IDENTITY, address)
+        return reference
+
+    def _union (self, node1, node2):
+        """Joins the sets containing `node1` and `node2`."""
+        root1 = self._find(self._get_node(node1))
+        root2 = self._find(self._get_node(node2))
+        if root1 != root2:
+            self._parents[root2] = root1
+
+
+def _chunks (items):
+    """Yields successive slices of `items` of at most
+    `BULK_BATCH_SIZE` items."""
+    for start in range(0, len(items), BULK_BATCH_SIZE):
+        yield items[start:start+BULK_BATCH_SIZE]
+
+def _get_iids (construct):
+    """Returns the item identifiers of the non-topic constructs
+    within the parsed `construct`."""
+    return [address for parsed in _get_reifiables(construct)
+            for address in parsed['iids']]
+
+def _get_references (topics, associations):
+    """Yields every topic reference in `topics` and `associations`."""
+    for topic in topics:
+        for reference in topic['types']:
+            yield reference
+        for parsed in _get_reifiables(topic):
+            if parsed.get('type') is not None:
+                yield parsed['type']
+            if parsed.get('player') is not None:
+                yield parsed['player']
+            if parsed['reifier'] is not None:
+                yield parsed['reifier']
+            for reference in parsed.get('scope', ()):
+                yield reference
+    for association in associations:
+        for parsed in _get_reifiables(association):
+            yield parsed['type']
+            if parsed.get('player') is not None:
+                yield parsed['player']
+            if parsed['reifier'] is not None:
+                yield parsed['reifier']
+            for reference in parsed.get('scope', ()):
+                yield reference
+
+def _get_reifiables (construct):
+    """Yields the parsed reifiable constructs within the parsed
+    topic or association `construct`."""
+    if 'roles' in construct:
+        yield construct
+        for role in construct['roles']:
+            yield role
+    else:
+        for name in construct['names']:
+            yield name
+            for variant in name['variants']:
+                yield variant
+        for occurrence in construct['occurrences']:
+            yield occurrence
+
+def _has_merge_data (parsed):
+    """Returns whether merging the parsed construct `parsed` into an
+    existing duplicate would add anything to it: item identifiers, a
+    reifier, variants, or the same for its roles."""
+    if parsed['iids'] or parsed['reifier'] is not None or \
+            parsed.get('variants'):
+        return True
+    for role in parsed.get('roles', {}).values():
+        if _has_merge_data(role):
+            return True
+    return False
@@ -0,0 +1,193 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing the topic map walker used by the topic map
+writers.
+
+A `TopicMapWalker` yields the topics and associations of a topic map
+as plain dictionaries, in the same form as is used by the
+`BatchLoader`, except that topic references are topic IDs and every
+topic and association has an 'id' key.
+
+The constructs are fetched in ranges of database IDs, with a fixed
+number of queries per range, so that neither the whole topic map nor
+one query per construct is needed. Each range is found by a query
+limited to the chunk size, starting after the previous range, so no
+query returns more than a chunk's worth of rows. Server-side cursors
+are not used, since the database drivers supported by Django buffer
+the whole result of a query in the client.
+
+"""
+
+from tmapi.models import Name, Occurrence, Role, SubjectIdentifier, \
+    SubjectLocator, Topic, Variant
+
+
+class TopicMapWalker (object):
+
+    """Yields the topics and associations of a topic map."""
+
+    def __init__ (self, topic_map, chunk_size=1000):
+        """Creates a walker over `topic_map`.
+
+        :param topic_map: the topic map to walk
+        :type topic_map: `TopicMap`
+        :param chunk_size: the number of topics or associations to
+          fetch at a time
+        :type chunk_size: integer
+
+        """
+        self._topic_map = topic_map
+        self._chunk_size = chunk_size
+
+    def get_associations (self):
+        """Yields lists of associations, each list being one chunk.
+
+        :rtype: generator of lists of dictionaries
+
+        """
+        associations = self._topic_map.association_constructs
+        for id_range in self._get_ranges(associations):
+            roles = {}
+            for role in self._get_reifiables(
+                Role.objects.filter(association__range=id_range,
+                                    topic_map=self._topic_map),
+                ('association', 'type', 'player'), 'role'):
+                roles.setdefault(role.pop('association'), []).append(role)
+            chunk = []
+            for association in self._get_reifiables(
+                associations.filter(id__range=id_range), ('type',),
+                'association', True):
+                association['roles'] = roles.get(association['id'], [])
+                chunk.append(association)
+            yield chunk
+
+    def get_topics (self):
+        """Yields lists of topics, each list being one chunk.
+
+        :rtype: generator of lists of dictionaries
+
+        """
+        topics = self._topic_map.topic_constructs
+        for id_range in self._get_ranges(topics):
+            iids = _group(Topic.item_identifiers.through.objects.filter(
+                    topic__range=id_range, topic__topic_map=self._topic_map),
+                          'topic', 'itemidentifier__address')
+            sids = _group(SubjectIdentifier.objects.filter(
+                    topic__range=id_range,
+                    containing_topic_map=self._topic_map), 'topic', 'address')
+            slos = _group(SubjectLocator.objects.filter(
+                    topic__range=id_range,
+                    containing_topic_map=self._topic_map), 'topic', 'address')
+            types = _group(Topic.types.through.objects.filter(
+                    from_topic__range=id_range,
+                    from_topic__topic_map=self._topic_map),
+                           'from_topic', 'to_topic')
+            variants = {}
+            for variant in self._get_reifiables(
+                Variant.objects.filter(name__topic__range=id_range,
+                                       topic_map=self._topic_map),
+                ('name', 'value', 'datatype'), 'variant', True):
+                variants.setdefault(variant.pop('name'), []).append(variant)
+            names = {}
+            for name in self._get_reifiables(
+                Name.objects.filter(topic__range=id_range,
+                                    topic_map=self._topic_map),
+                ('topic', 'type', 'value'), 'name', True):
+                name['variants'] = variants.get(name.pop('id'), [])
+                names.setdefault(name.pop('topic'), []).append(name)
+            occurrences = {}
+            for occurrence in self._get_reifiables(
+                Occurrence.objects.filter(topic__range=id_range,
+                                          topic_map=self._topic_map),
+                ('topic', 'type', 'value', 'datatype'), 'occurrence', True):
+                del occurrence['id']
+                occurrences.setdefault(occurrence.pop('topic'), []).append(
+                    occurrence)
+            chunk = []
+            for topic_id in topics.filter(id__range=id_range).order_by(
+                'id').values_list('id', flat=True).iterator():
+                chunk.append({'id': topic_id, 'iids': iids.get(topic_id, []),
+                              'sids': sids.get(topic_id, []),
+                              'slos': slos.get(topic_id, []),
+                              'types': types.get(topic_id, []),
+                              'names': names.get(topic_id, []),
+                              'occurrences': occurrences.get(topic_id, [])})
+            yield chunk
+
+    def _get_ranges (self, constructs):
+        """Yields (first, last) tuples of database IDs, each range
+        covering at most `chunk_size` of `constructs`.
+
+        :param constructs: the constructs to divide into ranges
+        :type constructs: `QuerySet`
+        :rtype: generator of tuples
+
+        """
+        construct_ids = constructs.order_by('id').values_list(
+            'id', flat=True)
+        last = None
+        while True:
+            if last is not None:
+                range_ids = construct_ids.filter(id__gt=last)
+            else:
+                range_ids = construct_ids
+            range_ids = list(range_ids[:self._chunk_size])
+            if not range_ids:
+                break
+            last = range_ids[-1]
+            yield (range_ids[0], last)
+            if len(range_ids) < self._chunk_size:
+                break
+
+    def _get_reifiables (self, constructs, fields, name, scoped=False):
+        """Yields dictionaries of `fields` for each of `constructs`,
+        along with their 'id', 'reifier', 'iids' and (if `scoped`)
+        'scope'.
+
+        :param constructs: the constructs to fetch
+        :type constructs: `QuerySet`
+        :param fields: the names of the fields to include
+        :type fields: tuple of strings
+        :param name: the lower case name of the constructs' model
+        :type name: string
+        :param scoped: whether the constructs are scoped
+        :type scoped: boolean
+        :rtype: generator of dictionaries
+
+        """
+        model = constructs.model
+        construct_ids = constructs.values('id')
+        iids = _group(model.item_identifiers.through.objects.filter(
+                **{name + '__in': construct_ids}), name,
+                      'itemidentifier__address')
+        if scoped:
+            scopes = _group(model.scope.through.objects.filter(
+                    **{name + '__in': construct_ids}), name, 'topic')
+        for row in constructs.order_by('id').values_list(
+            'id', 'reifier', *fields).iterator():
+            construct = dict(zip(('id', 'reifier') + fields, row))
+            construct['iids'] = iids.get(row[0], [])
+            if scoped:
+                construct['scope'] = scopes.get(row[0], [])
+            yield construct
+
+
+def _group (queryset, key, value):
+    """Returns a dictionary mapping each `key` value in `queryset` to
+    a list of the corresponding `value` values."""
+    grouped = {}
+    for row_key, row_value in queryset.values_list(key, value).iterator():
+        grouped.setdefault(row_key, []).append(row_value)
+    return grouped
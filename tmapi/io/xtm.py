@@ -0,0 +1,535 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing a reader and a writer for XTM 2.0 topic maps.
+
+The reader parses the document incrementally, and each topic and
+association is discarded once it has been handed to the loader, so
+that memory use does not grow with the size of the document.
+
+The writer likewise fetches and serializes the topic map a chunk at a
+time.
+
+"""
+
+from xml.etree import cElementTree as ElementTree
+from xml.sax.saxutils import escape, quoteattr
+
+from django.db import transaction
+
+from tmapi.constants import TOPIC_NAME_TYPE, XSD_ANY_URI, XSD_STRING, \
+    XTM_NAMESPACE
+from tmapi.exceptions import DeserializationException
+from tmapi.models import Locator
+
+from loader import BatchLoader, ITEM_IDENTIFIER, SUBJECT_IDENTIFIER, \
+    SUBJECT_LOCATOR
+from walker import TopicMapWalker
+
+
+def _tag (name):
+    return '{%s}%s' % (XTM_NAMESPACE, name)
+
+ASSOCIATION = _tag('association')
+INSTANCE_OF = _tag('instanceOf')
+ITEM_IDENTITY = _tag('itemIdentity')
+MERGE_MAP = _tag('mergeMap')
+NAME = _tag('name')
+OCCURRENCE = _tag('occurrence')
+RESOURCE_DATA = _tag('resourceData')
+RESOURCE_REF = _tag('resourceRef')
+ROLE = _tag('role')
+SCOPE = _tag('scope')
+SUBJECT_IDENTIFIER_ELEMENT = _tag('subjectIdentifier')
+SUBJECT_IDENTIFIER_REF = _tag('subjectIdentifierRef')
+SUBJECT_LOCATOR_ELEMENT = _tag('subjectLocator')
+SUBJECT_LOCATOR_REF = _tag('subjectLocatorRef')
+TOPIC = _tag('topic')
+TOPIC_MAP = _tag('topicMap')
+TOPIC_REF = _tag('topicRef')
+TYPE = _tag('type')
+VALUE = _tag('value')
+VARIANT = _tag('variant')
+
+REFERENCE_KINDS = {
+    TOPIC_REF: ITEM_IDENTIFIER,
+    SUBJECT_IDENTIFIER_REF: SUBJECT_IDENTIFIER,
+    SUBJECT_LOCATOR_REF: SUBJECT_LOCATOR,
+    }
+
+
+def _get_qualified_name (name, prefixes):
+    """Returns the qualified name of the element or attribute
+    `name`, in ElementTree's {namespace}local form, using the prefix
+    in `prefixes` for its namespace."""
+    if not name.startswith('{'):
+        return name
+    uri, local_name = name[1:].split('}', 1)
+    prefix = prefixes.get(uri)
+    if prefix:
+        return '%s:%s' % (prefix, local_name)
+    return local_name
+
+def _serialise (element, prefixes):
+    """Returns the XML serialisation of `element`, excluding its
+    tail, using the namespace prefixes declared in the document.
+
+    :param element: the element to serialise
+    :type element: `Element`
+    :param prefixes: the prefixes in scope, keyed by namespace URI
+    :type prefixes: dictionary
+    :rtype: unicode
+
+    """
+    prefixes = dict(prefixes)
+    for name, value in element.items():
+        if name == 'xmlns':
+            prefixes[value] = ''
+        elif name.startswith('xmlns:'):
+            prefixes[value] = name[6:]
+    tag = _get_qualified_name(element.tag, prefixes)
+    parts = [u'<', tag]
+    for name, value in element.items():
+        parts.append(u' %s=%s' % (_get_qualified_name(name, prefixes),
+                                  quoteattr(value)))
+    if element.text is None and not len(element):
+        parts.append(u'/>')
+        return u''.join(parts)
+    parts.append(u'>')
+    parts.append(escape(element.text or u''))
+    for child in element:
+        parts.append(_serialise(child, prefixes))
+        parts.append(escape(child.tail or u''))
+    parts.append(u'</%s>' % tag)
+    return u''.join(parts)
+
+
+class XTMReader (object):
+
+    """Reads an XTM 2.0 (or 2.1) document into a topic map.
+
+    The topics and associations in the document are written to the
+    topic map in batches, each within its own transaction.
+
+    """
+
+    def __init__ (self, topic_map, source, base=None, batch_size=1000):
+        """Creates a reader for the XTM document `source`.
+
+        :param topic_map: the topic map to read the document into
+        :type topic_map: `TopicMap`
+        :param source: the filename of, or file object containing,
+          the XTM document
+        :type source: string or file
+        :param base: the base locator used to resolve references in
+          the document; defaults to the topic map's locator
+        :type base: `Locator` or string
+        :param batch_size: the number of topics and associations to
+          write (and commit) at a time
+        :type batch_size: integer
+
+        """
+        self._topic_map = topic_map
+        self._source = source
+        if base is None:
+            base = topic_map.get_locator()
+        elif not isinstance(base, Locator):
+            base = Locator(base)
+        self._base = base
+        self._batch_size = batch_size
+        # Dictionary of the namespace prefixes in scope, keyed by
+        # namespace URI.
+        self._prefixes = {}
+
+    def read (self):
+        """Reads the document into the topic map."""
+        loader = BatchLoader(self._topic_map)
+        topics = []
+        associations = []
+        iids = []
+        depth = 0
+        root = None
+        reifier = None
+        declarations = []
+        namespaces = []
+        for event, element in ElementTree.iterparse(
+            self._source, events=('start', 'end', 'start-ns', 'end-ns')):
+            if event in ('start-ns', 'end-ns'):
+                if event == 'start-ns':
+                    declarations.append(element)
+                    namespaces.append(element)
+                else:
+                    namespaces.pop()
+                self._prefixes = dict([(uri, prefix) for prefix, uri
+                                       in namespaces])
+                continue
+            if event == 'start':
+                # Namespace declarations are kept as attributes, so
+                # that markup in values is serialised with them.
+                for prefix, uri in declarations:
+                    if prefix:
+                        element.set('xmlns:' + prefix, uri)
+                    else:
+                        element.set('xmlns', uri)
+                declarations = []
+                if root is None:
+                    if element.tag != TOPIC_MAP:
+                        raise DeserializationException(
+                            'The document is not an XTM 2.0 topic map')
+                    root = element
+                    reifier = self._get_reifier(element)
+                depth += 1
+                continue
+            depth -= 1
+            if depth != 1:
+                continue
+            if element.tag == TOPIC:
+                topics.append(self._parse_topic(element))
+            elif element.tag == ASSOCIATION:
+                associations.append(self._parse_association(element))
+            elif element.tag == ITEM_IDENTITY:
+                iids.append(self._resolve(element))
+            elif element.tag == MERGE_MAP:
+                raise DeserializationException('mergeMap is not supported')
+            root.clear()
+            if len(topics) + len(associations) >= self._batch_size:
+                self._load(loader, topics, associations)
+                topics = []
+                associations = []
+        self._load(loader, topics, associations)
+        with transaction.commit_on_success():
+            for address in iids:
+                self._topic_map.add_item_identifier(Locator(address))
+            if reifier is not None:
+                self._set_reifier(reifier)
+
+    def _get_reference (self, element):
+        """Returns the topic reference in the children of `element`.
+
+        :rtype: tuple
+
+        """
+        references = self._get_references(element)
+        if len(references) != 1:
+            raise DeserializationException(
+                'Expected a single topic reference in %s' % element.tag)
+        return references[0]
+
+    def _get_references (self, element):
+        """Returns the topic references in the children of `element`.
+
+        :rtype: list of tuples
+
+        """
+        return [(REFERENCE_KINDS[child.tag], self._resolve(child))
+                for child in element if child.tag in REFERENCE_KINDS]
+
+    def _get_reifier (self, element):
+        """Returns the topic reference for the reifier of `element`,
+        or None."""
+        reifier = element.get('reifier')
+        if reifier is None:
+            return None
+        return (ITEM_IDENTIFIER, self._base.resolve(reifier).to_external_form())
+
+    def _load (self, loader, topics, associations):
+        """Writes `topics` and `associations` to the topic map in a
+        single transaction."""
+        if topics or associations:
+            with transaction.commit_on_success():
+                loader.load(topics, associations)
+
+    def _new_construct (self, element):
+        """Returns the parsed representation of the reifiable
+        construct `element`, with only its reifier and (empty) item
+        identifiers set."""
+        return {'reifier': self._get_reifier(element), 'iids': []}
+
+    def _parse_association (self, element):
+        association = self._new_construct(element)
+        association.update({'type': None, 'scope': [], 'roles': []})
+        for child in element:
+            if child.tag == ITEM_IDENTITY:
+                association['iids'].append(self._resolve(child))
+            elif child.tag == TYPE:
+                association['type'] = self._get_reference(child)
+            elif child.tag == SCOPE:
+                association['scope'] = self._get_references(child)
+            elif child.tag == ROLE:
+                association['roles'].append(self._parse_role(child))
+        if association['type'] is None:
+            raise DeserializationException('An association must have a type')
+        return association
+
+    def _parse_name (self, element):
+        name = self._new_construct(element)
+        name.update({'type': (SUBJECT_IDENTIFIER, TOPIC_NAME_TYPE),
+                     'scope': [], 'value': u'', 'variants': []})
+        for child in element:
+            if child.tag == ITEM_IDENTITY:
+                name['iids'].append(self._resolve(child))
+            elif child.tag == TYPE:
+                name['type'] = self._get_reference(child)
+            elif child.tag == SCOPE:
+                name['scope'] = self._get_references(child)
+            elif child.tag == VALUE:
+                name['value'] = child.text or u''
+            elif child.tag == VARIANT:
+                name['variants'].append(self._parse_variant(child))
+        return name
+
+    def _parse_occurrence (self, element):
+        occurrence = self._parse_value(element)
+        occurrence['type'] = None
+        for child in element:
+            if child.tag == TYPE:
+                occurrence['type'] = self._get_reference(child)
+        if occurrence['type'] is None:
+            raise DeserializationException('An occurrence must have a type')
+        return occurrence
+
+    def _parse_role (self, element):
+        role = self._new_construct(element)
+        role['type'] = None
+        for child in element:
+            if child.tag == ITEM_IDENTITY:
+                role['iids'].append(self._resolve(child))
+            elif child.tag == TYPE:
+                role['type'] = self._get_reference(child)
+        role['player'] = self._get_reference(element)
+        if role['type'] is None:
+            raise DeserializationException('A role must have a type')
+        return role
+
+    def _parse_topic (self, element):
+        topic = {'iids': [], 'sids': [], 'slos': [], 'types': [],
+                 'names': [], 'occurrences': []}
+        topic_id = element.get('id')
+        if topic_id is not None:
+            topic['iids'].append(
+                self._base.resolve('#' + topic_id).to_external_form())
+        for child in element:
+            if child.tag == ITEM_IDENTITY:
+                topic['iids'].append(self._resolve(child))
+            elif child.tag == SUBJECT_IDENTIFIER_ELEMENT:
+                topic['sids'].append(self._resolve(child))
+            elif child.tag == SUBJECT_LOCATOR_ELEMENT:
+                topic['slos'].append(self._resolve(child))
+            elif child.tag == INSTANCE_OF:
+                topic['types'].extend(self._get_references(child))
+            elif child.tag == NAME:
+                topic['names'].append(self._parse_name(child))
+            elif child.tag == OCCURRENCE:
+                topic['occurrences'].append(self._parse_occurrence(child))
+        return topic
+
+    def _parse_value (self, element):
+        """Returns the parsed representation of the occurrence or
+        variant `element`, without its type."""
+        construct = self._new_construct(element)
+        construct['scope'] = []
+        for child in element:
+            if child.tag == ITEM_IDENTITY:
+                construct['iids'].append(self._resolve(child))
+            elif child.tag == SCOPE:
+                construct['scope'] = self._get_references(child)
+            elif child.tag == RESOURCE_REF:
+                construct['value'] = self._resolve(child)
+                construct['datatype'] = XSD_ANY_URI
+            elif child.tag == RESOURCE_DATA:
+                datatype = child.get('datatype')
+                if datatype is None:
+                    datatype = XSD_STRING
+                else:
+                    datatype = self._base.resolve(datatype).to_external_form()
+                value = child.text or u''
+                if len(child):
+                    # The value is the XML content of the element,
+                    # including the text between its child elements.
+                    value = escape(value)
+                    for markup in child:
+                        value += _serialise(markup, self._prefixes)
+                        value += escape(markup.tail or u'')
+                construct['value'] = value
+                construct['datatype'] = datatype
+        if 'value' not in construct:
+            raise DeserializationException('A value must be specified')
+        return construct
+
+    def _parse_variant (self, element):
+        variant = self._parse_value(element)
+        if not variant['scope']:
+            raise DeserializationException('A variant must have a scope')
+        return variant
+
+    def _resolve (self, element):
+        """Returns the external form of the locator specified by the
+        href attribute of `element`, resolved against the base
+        locator."""
+        return self._base.resolve(element.get('href')).to_external_form()
+
+    def _set_reifier (self, reference):
+        """Sets the reifier of the topic map to the topic identified
+        by `reference`, merging it with any existing reifier."""
+        kind, address = reference
+        reifier = self._topic_map.create_topic_by_item_identifier(
+            Locator(address))
+        existing = self._topic_map.get_reifier()
+        if existing is None:
+            self._topic_map.set_reifier(reifier)
+        elif existing != reifier:
+            existing.merge_in(reifier)
+
+
+class XTMWriter (object):
+
+    """Writes a topic map as an XTM 2.0 document.
+
+    Every topic is given an id attribute derived from its database
+    ID, which is used to reference it.
+
+    """
+
+    def __init__ (self, topic_map, chunk_size=1000):
+        """Creates a writer for `topic_map`.
+
+        :param topic_map: the topic map to write
+        :type topic_map: `TopicMap`
+        :param chunk_size: the number of topics or associations to
+          fetch and serialize at a time
+        :type chunk_size: integer
+
+        """
+        self._topic_map = topic_map
+        self._chunk_size = chunk_size
+
+    def serialize (self):
+        """Yields the XTM document in UTF-8 encoded chunks.
+
+        :rtype: generator of strings
+
+        """
+        walker = TopicMapWalker(self._topic_map, self._chunk_size)
+        yield '<?xml version="1.0" encoding="utf-8"?>\n'
+        header = [u'<topicMap xmlns="%s" version="2.0"%s>' % (
+                XTM_NAMESPACE, self._reifier(self._topic_map.reifier_id))]
+        for iid in self._topic_map.get_item_identifiers():
+            header.append(self._item_identity(iid.address))
+        yield self._encode(header)
+        for topics in walker.get_topics():
+            chunk = []
+            for topic in topics:
+                self._write_topic(chunk, topic)
+            yield self._encode(chunk)
+        for associations in walker.get_associations():
+            chunk = []
+            for association in associations:
+                self._write_association(chunk, association)
+            yield self._encode(chunk)
+        yield '</topicMap>\n'
+
+    def write (self, out):
+        """Writes the XTM document to the file object `out`.
+
+        :param out: the file object to write to
+        :type out: file
+
+        """
+        for chunk in self.serialize():
+            out.write(chunk)
+
+    def _encode (self, parts):
+        return (u''.join(parts) + u'\n').encode('utf-8')
+
+    def _item_identity (self, address):
+        return u'<itemIdentity href=%s/>' % quoteattr(address)
+
+    def _reifier (self, reifier_id):
+        if reifier_id is None:
+            return u''
+        return u' reifier="#id%d"' % reifier_id
+
+    def _topic_ref (self, topic_id):
+        return u'<topicRef href="#id%d"/>' % topic_id
+
+    def _write_association (self, chunk, association):
+        chunk.append(u'<association%s>' % self._reifier(
+                association['reifier']))
+        self._write_construct(chunk, association)
+        for role in association['roles']:
+            chunk.append(u'<role%s>' % self._reifier(role['reifier']))
+            self._write_construct(chunk, role)
+            chunk.append(self._topic_ref(role['player']))
+            chunk.append(u'</role>')
+        chunk.append(u'</association>')
+
+    def _write_construct (self, chunk, construct):
+        """Appends the item identities, type and scope of
+        `construct`."""
+        for address in construct['iids']:
+            chunk.append(self._item_identity(address))
+        if construct.get('type') is not None:
+            chunk.append(u'<type>%s</type>' % self._topic_ref(
+                    construct['type']))
+        if construct.get('scope'):
+            chunk.append(u'<scope>')
+            for theme_id in construct['scope']:
+                chunk.append(self._topic_ref(theme_id))
+            chunk.append(u'</scope>')
+
+    def _write_topic (self, chunk, topic):
+        chunk.append(u'<topic id="id%d">' % topic['id'])
+        for address in topic['iids']:
+            chunk.append(self._item_identity(address))
+        for address in topic['slos']:
+            chunk.append(u'<subjectLocator href=%s/>' % quoteattr(address))
+        for address in topic['sids']:
+            chunk.append(u'<subjectIdentifier href=%s/>' % quoteattr(address))
+        if topic['types']:
+            chunk.append(u'<instanceOf>')
+            for type_id in topic['types']:
+                chunk.append(self._topic_ref(type_id))
+            chunk.append(u'</instanceOf>')
+        for name in topic['names']:
+            chunk.append(u'<name%s>' % self._reifier(name['reifier']))
+            self._write_construct(chunk, name)
+            chunk.append(u'<value>%s</value>' % escape(name['value']))
+            for variant in name['variants']:
+                chunk.append(u'<variant%s>' % self._reifier(
+                        variant['reifier']))
+                self._write_construct(chunk, variant)
+                self._write_value(chunk, variant)
+                chunk.append(u'</variant>')
+            chunk.append(u'</name>')
+        for occurrence in topic['occurrences']:
+            chunk.append(u'<occurrence%s>' % self._reifier(
+                    occurrence['reifier']))
+            self._write_construct(chunk, occurrence)
+            self._write_value(chunk, occurrence)
+            chunk.append(u'</occurrence>')
+        chunk.append(u'</topic>')
+
+    def _write_value (self, chunk, construct):
+        """Appends the value of the occurrence or variant
+        `construct`."""
+        datatype = construct['datatype']
+        if datatype == XSD_ANY_URI:
+            chunk.append(u'<resourceRef href=%s/>' % quoteattr(
+                    construct['value']))
+        elif datatype == XSD_STRING:
+            chunk.append(u'<resourceData>%s</resourceData>' % escape(
+                    construct['value']))
+        else:
+            chunk.append(u'<resourceData datatype=%s>%s</resourceData>' % (
+                    quoteattr(datatype), escape(construct['value'])))
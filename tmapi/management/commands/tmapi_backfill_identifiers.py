@@ -0,0 +1,53 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Management command to backfill Identifier.construct_type and
+ItemIdentifier.identifier for rows created before those columns were
+added.
+
+The columns must first be added to the existing tables (see the output
+of "manage.py sql tmapi" for their definitions).
+
+"""
+
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+
+from tmapi.models import Association, Identifier, ItemIdentifier, Name, \
+    Occurrence, Role, Topic, TopicMap, Variant
+
+
+class Command (NoArgsCommand):
+
+    help = 'Records the construct type of each identifier, and the identifier of the construct of each item identifier, where they are missing.'
+
+    def handle_noargs (self, **options):
+        identifier_count = 0
+        item_identifier_count = 0
+        with transaction.commit_on_success():
+            for model in (Association, Name, Occurrence, Role, Topic,
+                          TopicMap, Variant):
+                construct_type = model._meta.object_name.lower()
+                identifier_count += Identifier.objects.filter(
+                    construct_type='', **{construct_type + '__isnull': False}
+                    ).update(construct_type=construct_type)
+                through = model.item_identifiers.through
+                rows = through.objects.filter(
+                    itemidentifier__identifier=None).values_list(
+                    'itemidentifier', construct_type + '__identifier')
+                for item_identifier_id, identifier_id in list(rows):
+                    item_identifier_count += ItemIdentifier.objects.filter(
+                        pk=item_identifier_id).update(identifier=identifier_id)
+        self.stdout.write('Updated %d identifiers and %d item identifiers.\n'
+                          % (identifier_count, item_identifier_count))
@@ -0,0 +1,42 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Management command to recompute the stored signature hashes of
+associations, names, occurrences and variants.
+
+It must be run once for rows created before the signature column was
+added (see the output of "manage.py sql tmapi" for its definition),
+since duplicates are detected using the stored hashes.
+
+"""
+
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+
+from tmapi.models import Association, Name, Occurrence, TopicMap, Variant
+from tmapi.models.signature import update_signature_hashes
+
+
+class Command (NoArgsCommand):
+
+    help = 'Recomputes the signature hash of each association, name, occurrence and variant, storing those that have changed.'
+
+    def handle_noargs (self, **options):
+        count = 0
+        with transaction.commit_on_success():
+            for topic_map_id in TopicMap.objects.values_list('id', flat=True):
+                for model in (Association, Name, Occurrence, Variant):
+                    count += update_signature_hashes(model, model.objects.filter(
+                            topic_map=topic_map_id))
+        self.stdout.write('Updated %d signatures.\n' % count)
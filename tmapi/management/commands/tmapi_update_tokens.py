@@ -0,0 +1,47 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Management command to rebuild the stored tokens, hashes and typed
+values of the values of names, occurrences and variants.
+
+It must be run once for rows created before the LiteralToken table
+and the value_hash, numeric_value and temporal_value columns were
+added (see the output of "manage.py sql tmapi" for their
+definitions), since LiteralIndex lookups use the stored tokens and
+derived values.
+
+"""
+
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+
+from tmapi.models import Name, Occurrence, TopicMap, Variant
+from tmapi.models.tokenized import update_tokens, update_value_fields
+
+
+class Command (NoArgsCommand):
+
+    help = 'Rebuilds the stored tokens, hash and typed value of the value of each name, occurrence and variant.'
+
+    def handle_noargs (self, **options):
+        token_count = 0
+        value_count = 0
+        with transaction.commit_on_success():
+            for topic_map_id in TopicMap.objects.values_list('id', flat=True):
+                for model in (Name, Occurrence, Variant):
+                    constructs = model.objects.filter(topic_map=topic_map_id)
+                    token_count += update_tokens(model, constructs.iterator())
+                    value_count += update_value_fields(model, constructs)
+        self.stdout.write('Stored %d tokens and updated the value fields of %d constructs.\n'
+                          % (token_count, value_count))
@@ -36,6 +36,7 @@ from scoped import Scoped
 from subject_identifier import SubjectIdentifier
 from subject_locator import SubjectLocator
 from tmapi_feature import TMAPIFeature
+from tokenized import LiteralToken, Tokenized
 from topic import Topic
 from topic_map import TopicMap
 from topic_map_system import TopicMapSystem
@@ -15,6 +15,7 @@
 from tmapi.exceptions import ModelConstraintException
 
 from construct_fields import ConstructFields
+from events import ConstructCreated
 from reifiable import Reifiable
 from role import Role
 from scoped import Scoped
@@ -50,6 +51,7 @@ class Association (ConstructFields, Reifiable, Scoped, Typed):
         role = Role(association=self, type=role_type, player=player,
                     topic_map=self.topic_map)
         role.save()
+        role._send_event(ConstructCreated, role)
         return role
 
     def get_parent (self):
@@ -84,3 +86,14 @@ class Association (ConstructFields, Reifiable, Scoped, Typed):
 
         """
         return Topic.objects.filter(typed_roles__association=self).distinct()
+
+    def _get_signature_roles (self):
+        """Returns the (type ID, player ID) pairs of the roles of this
+        association.
+
+        :rtype: list of tuples
+
+        """
+        if self.pk is None:
+            return []
+        return self.roles.values_list('type', 'player')
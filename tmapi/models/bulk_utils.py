@@ -0,0 +1,118 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing functions for creating Topic Maps constructs
+and their item identifiers with bulk inserts.
+
+These functions perform no checking of the Topic Maps - Data Model
+constraints; callers are responsible for ensuring that the
+constructs and identifiers they create are valid and do not
+duplicate existing ones. Nor do they notify the indices of the topic
+map; callers send a `TopicMapChanged` event once they are done.
+
+"""
+
+from django.db import models
+
+from tmapi.constants import BULK_BATCH_SIZE
+from tmapi.exceptions import TMAPIRuntimeException
+
+from identifier import Identifier, get_construct_type
+from item_identifier import ItemIdentifier
+from tokenized import Tokenized, update_tokens
+
+
+def bulk_add_item_identifiers (topic_map, model, pairs):
+    """Adds item identifiers to constructs of type `model`.
+
+    :param topic_map: the topic map containing the constructs
+    :type topic_map: `TopicMap`
+    :param model: the model class of the constructs
+    :type model: class
+    :param pairs: the database ID of a construct and the address of
+      the item identifier to add to it
+    :type pairs: list of (integer, string) tuples
+
+    """
+    through = model.item_identifiers.through
+    column = '%s_id' % model._meta.object_name.lower()
+    for start in range(0, len(pairs), BULK_BATCH_SIZE):
+        batch = dict([(address, construct_id) for construct_id, address
+                      in pairs[start:start+BULK_BATCH_SIZE]])
+        identifier_ids = dict(model.objects.filter(
+                id__in=set(batch.values())).values_list('id', 'identifier'))
+        ItemIdentifier.objects.bulk_create(
+            [ItemIdentifier(address=address, containing_topic_map=topic_map,
+                            identifier_id=identifier_ids[construct_id])
+             for address, construct_id in batch.items()])
+        iis = ItemIdentifier.objects.filter(
+            containing_topic_map=topic_map,
+            address__in=batch.keys()).values_list('id', 'address')
+        through.objects.bulk_create(
+            [through(**{column: batch[address], 'itemidentifier_id': ii_id})
+             for ii_id, address in iis])
+
+def bulk_create_constructs (topic_map, constructs):
+    """Saves the unsaved `constructs` with bulk inserts.
+
+    Each of `constructs` has its identifier and database ID set. The
+    fields derived from the values of tokenized constructs are set,
+    and their tokens are stored.
+
+    :param topic_map: the topic map containing the constructs
+    :type topic_map: `TopicMap`
+    :param constructs: unsaved constructs, all of the same model
+    :type constructs: list of `Construct`s
+    :raises `TMAPIRuntimeException`: if identifiers were created in
+      `topic_map` by another process during the creation; the
+      identifiers of the batch have then already been inserted, and
+      the caller must roll back its transaction
+
+    """
+    for start in range(0, len(constructs), BULK_BATCH_SIZE):
+        batch = constructs[start:start+BULK_BATCH_SIZE]
+        model = batch[0].__class__
+        # Bulk inserts do not return the database IDs of the new
+        # rows, so the new identifiers are retrieved as those
+        # following the highest existing ID.
+        last_id = Identifier.objects.aggregate(
+            last_id=models.Max('id'))['last_id'] or 0
+        construct_type = get_construct_type(batch[0])
+        Identifier.objects.bulk_create(
+            [Identifier(containing_topic_map=topic_map,
+                        construct_type=construct_type)
+             for construct in batch])
+        identifier_ids = list(Identifier.objects.filter(
+            containing_topic_map=topic_map, id__gt=last_id).order_by(
+            'id').values_list('id', flat=True))
+        if len(identifier_ids) != len(batch):
+            raise TMAPIRuntimeException(
+                'Identifiers were created concurrently with a bulk construct creation')
+        constructs_by_identifier = {}
+        for construct, identifier_id in zip(batch, identifier_ids):
+            construct.identifier_id = identifier_id
+            constructs_by_identifier[identifier_id] = construct
+        tokenized = issubclass(model, Tokenized)
+        if tokenized:
+            for construct in batch:
+                construct._set_value_fields()
+        model.objects.bulk_create(batch)
+        # Constructs in other topic maps may have identifiers within
+        # the same range, so only the new identifiers are matched.
+        ids = model.objects.filter(
+            identifier__in=identifier_ids).values_list('identifier', 'id')
+        for identifier_id, construct_id in ids:
+            constructs_by_identifier[identifier_id].id = construct_id
+        if tokenized:
+            update_tokens(model, batch, False)
@@ -15,6 +15,9 @@
 from tmapi.exceptions import IdentityConstraintException, \
     ModelConstraintException
 
+from events import IdentifierAdded, IdentifierRemoved
+from identity_cache import ITEM_IDENTIFIER, get_identity_cache
+from index_registry import notify_indices
 from item_identifier import ItemIdentifier
 
 
@@ -46,8 +49,8 @@ class Construct (object):
         address = item_identifier.to_external_form()
         topic_map = self.get_topic_map()
         try:
-            ii = ItemIdentifier.objects.get(address=address,
-                                            containing_topic_map=topic_map)
+            ii = ItemIdentifier.objects.select_related('identifier').get(
+                address=address, containing_topic_map=topic_map)
             construct = ii.get_construct()
             if construct == self:
                 return
@@ -59,13 +62,40 @@ class Construct (object):
             # raise an exception without checking that construct is
             # not None.
             raise IdentityConstraintException(
-                self, ii.get_construct(), item_identifier,
+                self, construct, item_identifier,
                 'This item identifier is already associated with another construct')
         except ItemIdentifier.DoesNotExist:
             ii = ItemIdentifier(address=address,
-                                containing_topic_map=topic_map)
+                                containing_topic_map=topic_map,
+                                identifier_id=self.identifier_id)
             ii.save()
             self.item_identifiers.add(ii)
+            self._discard_identity(ITEM_IDENTIFIER, address)
+            self._send_event(IdentifierAdded, ITEM_IDENTIFIER, address)
+
+    def _discard_identity (self, kind, address):
+        """Removes the identifier of `kind` with `address` from the
+        identity cache of this construct's topic map, if it is
+        enabled.
+
+        :param kind: the kind of identifier
+        :type kind: string
+        :param address: external form of a locator
+        :type address: string
+
+        """
+        cache = self._get_identity_cache()
+        if cache is not None:
+            cache.discard(kind, address)
+
+    def _get_identity_cache (self):
+        """Returns the identity cache of this construct's topic map,
+        or None if it is disabled.
+
+        :rtype: `IdentityCache` or None
+
+        """
+        return get_identity_cache(self.topic_map_id)
 
     def get_id (self):
         """Returns the identifier of this construct.
@@ -119,6 +149,9 @@ class Construct (object):
         undefined state and must not be used further.
 
         """
+        cache = self._get_identity_cache()
+        if cache is not None:
+            cache.discard_construct(self)
         # item identifiers are joined to a construct in a many to many
         # relationship, so they need to be explicitly deleted.
         self.get_item_identifiers().delete()
@@ -141,5 +174,23 @@ class Construct (object):
             ii = ItemIdentifier.objects.get(
                 address=address, containing_topic_map=topic_map)
             ii.delete()
+            self._send_event(IdentifierRemoved, ITEM_IDENTIFIER, address)
         except ItemIdentifier.DoesNotExist:
             pass
+        self._discard_identity(ITEM_IDENTIFIER, address)
+
+    def _send_event (self, event_class, *args):
+        """Sends an event concerning this construct to the indices of
+        its topic map.
+
+        :param event_class: the class of the event
+        :type event_class: subclass of `ConstructEvent`
+        :param args: the arguments to the event following the model
+          and database ID of this construct
+
+        """
+        # A TopicMap is not contained in a topic map, and is the
+        # subject of events about itself.
+        topic_map_id = getattr(self, 'topic_map_id', self.id)
+        notify_indices(topic_map_id, event_class(
+                topic_map_id, self._meta.concrete_model, self.id, *args))
@@ -14,7 +14,7 @@
 
 from django.db import models
 
-from identifier import Identifier
+from identifier import Identifier, get_construct_type
 
 
 class BaseConstructFields (models.Model):
@@ -42,7 +42,9 @@ class BaseConstructFields (models.Model):
                 # first time, so it is not possible to set the
                 # database ID yet.
                 topic_map = None
-            identifier = Identifier(containing_topic_map=topic_map)
+            identifier = Identifier(
+                containing_topic_map=topic_map,
+                construct_type=get_construct_type(self))
             identifier.save()
             self.identifier = identifier
         super(BaseConstructFields, self).save(*args, **kwargs)
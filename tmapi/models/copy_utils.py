@@ -17,17 +17,31 @@
 one topic map to another without creating duplicates (ie, merging
 where appropriate).
 
-It is a port of the Java code written by Lars Heuer for the tinyTiM
-project (http://tinytim.sourceforget.net/).
+The source topic map is read in chunks by a `TopicMapWalker`, and
+each chunk is written to the target topic map by a `BatchLoader`.
+Topics are therefore matched by their identities with bulk lookups,
+and new constructs are created with bulk inserts, skipping those that
+would duplicate existing constructs rather than creating and then
+removing them.
+
+No transaction is started or committed, so that a copy made within
+the caller's transaction is rolled back with it.
 
 """
 
+from django.contrib.sites.models import Site
+
+from tmapi.constants import BULK_BATCH_SIZE
+
+from identity_cache import ITEM_IDENTIFIER, SUBJECT_IDENTIFIER, \
+    SUBJECT_LOCATOR
+from locator import Locator
+from subject_identifier import SubjectIdentifier
+from subject_locator import SubjectLocator
 from topic import Topic
-from merge_utils import move_role_characteristics
-from signature import generate_association_signature, generate_name_signature, \
-    generate_occurrence_signature, generate_variant_signature
 
-def copy (source, target):
+
+def copy (source, target, chunk_size=1000):
     """Copies the topics and associations from the `source` to the
     `target` topic map.
 
@@ -35,300 +49,157 @@ def copy (source, target):
     :type source: `TopicMap`
     :param target: the topic map to receive the topics and associations
     :type target: `TopicMap`
+    :param chunk_size: the number of topics or associations to copy
+      at a time
+    :type chunk_size: integer
 
     """
+    # The loader and walker import the models, so they cannot be
+    # imported when this module is.
+    from tmapi.io.loader import BatchLoader
+    from tmapi.io.walker import TopicMapWalker
     if source == target:
         return
-    merge_map = {}
-    for topic in source.get_topics():
-        for slo in topic.get_subject_locators():
-            existing = target.get_topic_by_subject_locator(slo)
-            if existing is not None:
-                _add_merge(topic, existing, merge_map)
-        for sid in topic.get_subject_identifiers():
-            existing = target.get_topic_by_subject_identifier(sid)
-            if existing is not None:
-                _add_merge(topic, existing, merge_map)
-            existing_construct = target.get_construct_by_item_identifier(sid)
-            if isinstance(existing_construct, Topic):
-                _add_merge(topic, existing_construct, merge_map)
-        for iid in topic.get_item_identifiers():
-            existing_construct = target.get_construct_by_item_identifier(iid)
-            if isinstance(existing_construct, Topic):
-                _add_merge(topic, existing_construct, merge_map)
-            existing = target.get_topic_by_subject_identifier(iid)
-            if existing is not None:
-                _add_merge(topic, existing, merge_map)
+    loader = BatchLoader(target)
+    walker = TopicMapWalker(source, chunk_size)
+    domain = Site.objects.get_current().domain
+    for topics in walker.get_topics():
+        _load(loader, source, domain, topics, [])
+    for associations in walker.get_associations():
+        _load(loader, source, domain, [], associations)
     source_reifier = source.get_reifier()
     target_reifier = target.get_reifier()
     if source_reifier is not None and target_reifier is not None:
-        _add_merge(source_reifier, target_reifier, merge_map)
-    for topic in source.get_topics():
-        if topic not in merge_map:
-            _copy_topic(topic, target, merge_map)
-    for topic in merge_map:
-        target_topic = merge_map.get(topic)
-        _copy_identities(topic, target_topic)
-        _copy_types(topic, target_topic, merge_map)
-        _copy_characteristics(topic, target_topic, merge_map)
-    _copy_associations(source, target, merge_map)
-
-def _add_merge (source, target, merge_map):
-    """Adds a mapping from `source` to `target` into the `merge_map`.
-
-    If `source` already has a mapping to another target topic,
-    `target` is merged with the existing target topic.
-
-    :param source: the source topic
-    :type source: `Topic`
-    :param target: the target topic
-    :type target: `Topic`
-    :param merge_map: the map that holds the merge mappings
-    :type merge_map: dictionary
-
-    """
-    previous_target = merge_map.get(source)
-    if previous_target is not None:
-        if previous_target != target:
-            previous_target.merge_in(target)
-    else:
-        merge_map[source] = target
-
-def _copy_associations (source, target, merge_map):
-    """Copies the associations from `source` topic map to `target`
-    topic map.
-
-    :param source: the topic map to take the associations from
-    :type source: `TopicMap`
-    :param target: the topic map that receives the associations
-    :type target: `TopicMap`
-    :param merge_map: the map that holds the merge mappings
-    :type merge_map: dictionary
-
-    """
-    signatures = {}
-    for association in target.get_associations():
-        signature = generate_association_signature(association)
-        signatures[signature] = association
-    for association in source.get_associations():
-        association_type = _copy_type(association, target, merge_map)
-        scope = _copy_scope(association, target, merge_map)
-        target_association = target.create_association(association_type, scope)
-        for role in association.get_roles():
-            role_type = _copy_type(role, target, merge_map)
-            source_player = role.get_player()
-            if source_player in merge_map:
-                player = merge_map.get(source_player)
-            else:
-                player = _copy_topic(source_player, target, merge_map)
-            target_role = target_association.create_role(role_type, player)
-            _copy_item_identifiers(role, target_role)
-            _copy_reifier(role, target_role, merge_map)
-        signature = generate_association_signature(target_association)
-        existing = signatures.get(signature)
-        if existing is not None:
-            move_role_characteristics(target_association, existing)
-            target_association.remove()
-            target_association = existing
-        _copy_reifier(association, target_association, merge_map)
-        _copy_item_identifiers(association, target_association)
-
-def _copy_characteristics (topic, target_topic, merge_map):
-    """Copies the occurrences and names from `topic` to the `target_topic`.
-
-    :param topic: the topic to take the characteristics from
-    :type topic: `Topic`
-    :param target_topic: the topic that receives the characteristics
-    :type target_topic: `Topic`
-    :param merge_map: the map that holds the merge mappings
-    :type merge_map: dictionary
-
-    """
-    signatures = {}
-    for occurrence in target_topic.get_occurrences():
-        signature = generate_occurrence_signature(occurrence)
-        signatures[signature] = occurrence
-    topic_map = target_topic.get_topic_map()
-    for occurrence in topic.get_occurrences():
-        occ_type = _copy_type(occurrence, topic_map, merge_map)
-        scope = _copy_scope(occurrence, topic_map, merge_map)
-        target_occurrence = target_topic.create_occurrence(
-            occ_type, occurrence.get_value(), scope, occurrence.get_datatype())
-        signature = generate_occurrence_signature(target_occurrence)
-        existing = signatures.get(signature)
-        if existing is not None:
-            target_occurrence.remove()
-            target_occurrence = existing
-        _copy_reifier(occurrence, target_occurrence, merge_map)
-        _copy_item_identifiers(occurrence, target_occurrence)
-    signatures = {}
-    for name in target_topic.get_names():
-        signature = generate_name_signature(name)
-        signatures[signature] = name
-    for name in topic.get_names():
-        name_type = _copy_type(name, topic_map, merge_map)
-        scope = _copy_scope(name, topic_map, merge_map)
-        target_name = target_topic.create_name(name.get_value(), name_type,
-                                               scope)
-        signature = generate_name_signature(target_name)
-        existing = signatures.get(signature)
-        if existing is not None:
-            target_name.remove()
-            target_name = existing
-        _copy_reifier(name, target_name, merge_map)
-        _copy_item_identifiers(name, target_name)
-        _copy_variants(name, target_name, merge_map)
-
-def _copy_identities (topic, target_topic):
-    """Copies the identities (item identifiers, subject identifiers
-    and subject locators) from the `source` to the `target_topic`.
-
-    :param topic: the topic to take the identities from
-    :type topic: `Topic`
-    :param target_topic: the topic that receives the identities
-    :type target_topic: `Topic`
-
-    """
-    for sid in topic.get_subject_identifiers():
-        target_topic.add_subject_identifier(sid)
-    for slo in topic.get_subject_locators():
-        target_topic.add_subject_locator(slo)
-    _copy_item_identifiers(topic, target_topic)
+        reifier = _get_topic(target, _get_references(
+                source, domain, [source_reifier.id])[source_reifier.id])
+        if reifier != target_reifier:
+            target_reifier.merge_in(reifier)
 
-def _copy_item_identifiers (source, target):
-    """Copies the item identifiers from `source` to `target`.
+def _get_reference (topic):
+    """Returns a topic reference to the walked `topic` made from one
+    of its identities, or None if it has none.
 
-    :param source: the Topic Maps construct to take the item identifiers from
-    :type source: `Construct`
-    :param target: the Topic Maps construct that receives the item identifiers
-    :type target: `Construct`
+    :param topic: the walked topic
+    :type topic: dictionary
+    :rtype: tuple
 
     """
-    for iid in source.get_item_identifiers():
-        target.add_item_identifier(iid)
+    for kind, key in ((SUBJECT_IDENTIFIER, 'sids'), (ITEM_IDENTIFIER, 'iids'),
+                      (SUBJECT_LOCATOR, 'slos')):
+        if topic[key]:
+            return (kind, topic[key][0])
+    return None
 
-def _copy_reifier (source, target, merge_map):
-    """Copies the reifier of `source` to the `target`.
+def _get_references (source, domain, topic_ids):
+    """Returns a dictionary mapping each of `topic_ids` to a topic
+    reference, as used by the `BatchLoader`, that identifies the
+    topic in another topic map.
 
-    :param source: the reifiable Topic Maps construct to take the reifier from
-    :type source: `Reifiable`
-    :param target: the target Topic Maps construct that receives the reifier
-    :type target: `Reifiable`
-    :param merge_map: the map that holds the merge mappings
-    :type merge_map: dictionary
+    A topic with no identities is referenced by the item identifier
+    that `TopicMap.create_topic` would have given it.
 
-    """
-    source_reifier = source.get_reifier()
-    if source_reifier is not None:
-        if source_reifier in merge_map:
-            reifier = merge_map.get(source_reifier)
-        else:
-            reifier = _copy_topic(source_reifier, target.get_topic_map(),
-                                  merge_map)
-        target.set_reifier(reifier)
-
-def _copy_scope (source, topic_map, merge_map):
-    """Copes and returns all themes from `source` into `topic_map`.
-
-    :param source: the source to take the scope from
-    :type source: `Scoped`
-    :param topic_map: the Topic Map that receives the scope
-    :type topic_map: `TopicMap`
-    ::param merge_map: the map that holds the merge mappings
-    :type merge_map: dictionary
-    :rtype:
-
-    """
-    themes = []
-    for source_theme in source.get_scope():
-        if source_theme in merge_map:
-            theme = merge_map.get(source_theme)
-        else:
-            theme = _copy_topic(source_theme, topic_map, merge_map)
-        themes.append(theme)
-    return themes
-
-def _copy_topic (topic, target, merge_map):
-    """Copies the `topic` to the `target` topic map.
-
-    Returns the newly created topic.
-
-    :param topic: the topic to copy
-    :type topic: `Topic`
-    :param target: the target topic map
-    :type target: `TopicMap`
-    :param merge_map: the map that holds the merge mappings
-    :type merge_map: dictionary
-    :rtype: `Topic`
+    :param source: the topic map containing the topics
+    :type source: `TopicMap`
+    :param domain: the domain of the current `Site`
+    :type domain: string
+    :param topic_ids: the database IDs of the topics
+    :type topic_ids: list of integers
+    :rtype: dictionary
 
     """
-    target_topic = target.create_empty_topic()
-    _copy_identities(topic, target_topic)
-    _copy_types(topic, target_topic, merge_map)
-    _copy_characteristics(topic, target_topic, merge_map)
-    return target_topic
-
-def _copy_type (source, topic_map, merge_map):
-    """Copies and returns the type of `source` into `topic_map`.
-
-    :param source: the Topic Maps construct to take the type from
-    :type source: `Typed`
-    :param topic_map: the Topic Map that receives the type
+    identities = (
+        (SUBJECT_LOCATOR, SubjectLocator.objects, 'address'),
+        (ITEM_IDENTIFIER, Topic.item_identifiers.through.objects,
+         'itemidentifier__address'),
+        (SUBJECT_IDENTIFIER, SubjectIdentifier.objects, 'address'))
+    references = {}
+    for start in range(0, len(topic_ids), BULK_BATCH_SIZE):
+        batch = topic_ids[start:start+BULK_BATCH_SIZE]
+        # Later kinds take precedence over earlier ones.
+        for kind, manager, field in identities:
+            for topic_id, address in manager.filter(
+                topic__in=batch).values_list('topic', field).iterator():
+                references[topic_id] = (kind, address)
+    for topic_id in topic_ids:
+        if topic_id not in references:
+            references[topic_id] = (
+                ITEM_IDENTIFIER, source._generate_item_identifier_address(
+                    domain, topic_id))
+    return references
+
+def _get_topic (topic_map, reference):
+    """Returns the topic in `topic_map` identified by `reference`.
+
+    :param topic_map: the topic map containing the topic
     :type topic_map: `TopicMap`
-    :param merge_map: the map that holds the merge mappings
-    :type merge_map: dictionary
+    :param reference: the topic reference
+    :type reference: tuple
     :rtype: `Topic`
 
     """
-    source_type = source.get_type()
-    if source_type in merge_map:
-        target_type = merge_map.get(source_type)
-    else:
-        target_type = _copy_topic(source_type, topic_map, merge_map)
-    return target_type
-
-def _copy_types (topic, target_topic, merge_map):
-    """Copes the types from the `topic` to the `target_topic`.
-
-    :param topic: the topic to take the types from
-    :type topic: `Topic`
-    :param target_topic: the topic that receives the types
-    :type target_topic: `Topic`
-    :param merge_map: the map that holds the merge mappings
-    :type merge_map: dictionary
-
-    """
-    for topic_type in topic.get_types():
-        target_type = merge_map.get(topic_type)
-        if target_type is None:
-            target_type = _copy_topic(type, target_topic.get_topic_map(),
-                                      merge_map)
-        target_topic.add_type(target_type)
-
-def _copy_variants (source, target, merge_map):
-    """Copies the variants from `source` to `target`.
-
-    :param source: the name to take the variants from
-    :type source: `Name`
-    :param target: the name that receives the variants
-    :type target: `Name`
-    :merge_map: the map that holds the merge mappings
-    :type merge_map: dictionary
+    kind, address = reference
+    if kind == SUBJECT_IDENTIFIER:
+        return topic_map.get_topic_by_subject_identifier(Locator(address))
+    elif kind == SUBJECT_LOCATOR:
+        return topic_map.get_topic_by_subject_locator(Locator(address))
+    return topic_map.get_construct_by_item_identifier(Locator(address))
+
+def _load (loader, source, domain, topics, associations):
+    """Writes the walked `topics` and `associations` of `source` to
+    the topic map of `loader`.
+
+    The topic IDs in the walked constructs are replaced with topic
+    references, which the loader resolves against the identities of
+    the topics in its topic map.
+
+    :param loader: the loader for the target topic map
+    :type loader: `BatchLoader`
+    :param source: the topic map being copied
+    :type source: `TopicMap`
+    :param domain: the domain of the current `Site`
+    :type domain: string
+    :param topics: walked topics
+    :type topics: list of dictionaries
+    :param associations: walked associations
+    :type associations: list of dictionaries
 
     """
-    signatures = {}
-    for variant in target.get_variants():
-        signature = generate_variant_signature(variant)
-        signatures[signature] = variant
-    topic_map = target.get_topic_map()
-    for variant in source.get_variants():
-        scope = _copy_scope(variant, topic_map, merge_map)
-        target_variant = target.create_variant(variant.get_value(), scope,
-                                               variant.get_datatype())
-        signature = generate_variant_signature(target_variant)
-        existing = signatures.get(signature)
-        if existing is not None:
-            target_variant.remove()
-            target_variant = existing
-        _copy_reifier(variant, target_variant, merge_map)
-        _copy_item_identifiers(variant, target_variant)
+    references = {}
+    for topic in topics:
+        reference = _get_reference(topic)
+        if reference is None:
+            reference = (ITEM_IDENTIFIER,
+                         source._generate_item_identifier_address(
+                    domain, topic['id']))
+            topic['iids'] = [reference[1]]
+        references[topic['id']] = reference
+    constructs = []
+    for topic in topics:
+        for name in topic['names']:
+            constructs.append(name)
+            constructs.extend(name['variants'])
+        constructs.extend(topic['occurrences'])
+    for association in associations:
+        constructs.append(association)
+        constructs.extend(association['roles'])
+    topic_ids = set()
+    for topic in topics:
+        topic_ids.update(topic['types'])
+    for construct in constructs:
+        for key in ('type', 'player', 'reifier'):
+            if construct.get(key) is not None:
+                topic_ids.add(construct[key])
+        topic_ids.update(construct.get('scope', ()))
+    references.update(_get_references(source, domain, list(
+                topic_ids.difference(references))))
+    for topic in topics:
+        topic['types'] = [references[topic_id] for topic_id
+                          in topic['types']]
+    for construct in constructs:
+        for key in ('type', 'player', 'reifier'):
+            if construct.get(key) is not None:
+                construct[key] = references[construct[key]]
+        if 'scope' in construct:
+            construct['scope'] = [references[topic_id] for topic_id
+                                  in construct['scope']]
+    loader.load(topics, associations)
@@ -12,23 +12,54 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import datetime
+import re
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+from django.utils.encoding import smart_unicode
 
-from tmapi.constants import XSD_ANY_URI, XSD_FLOAT, XSD_INT, XSD_LONG, \
+from tmapi.constants import XSD_ANY_URI, XSD_DATE, XSD_DATE_TIME, \
+    XSD_DECIMAL, XSD_DOUBLE, XSD_FLOAT, XSD_INT, XSD_INTEGER, XSD_LONG, \
     XSD_STRING
 from tmapi.exceptions import ModelConstraintException
 
+from events import ValueChanged
 from locator import Locator
 from reifiable import Reifiable
 from scoped import Scoped
+from tokenized import Tokenized
+
+
+# Datatypes whose values are stored in the numeric_value field.
+NUMERIC_DATATYPES = frozenset((XSD_DECIMAL, XSD_DOUBLE, XSD_FLOAT, XSD_INT,
+                               XSD_INTEGER, XSD_LONG))
+# Datatypes whose values are stored in the temporal_value field.
+TEMPORAL_DATATYPES = frozenset((XSD_DATE, XSD_DATE_TIME))
+
+_DATE_TIME_PATTERN = re.compile(
+    r'^(\d{4})-(\d{2})-(\d{2})(?:T(\d{2}):(\d{2}):(\d{2})(?:\.(\d+))?)?'
+    r'(Z|[+-]\d{2}:\d{2})?$')
 
 
-class DatatypeAware (Reifiable, Scoped):
+class DatatypeAware (Reifiable, Scoped, Tokenized):
 
     """Common base interface for `Occurrence`s and `Variant`s."""
     
     datatype = models.CharField(max_length=512, blank=True)
     value = models.TextField()
+    # Typed copies of numeric and date values, kept up to date so
+    # that values can be compared by range without casting them. The
+    # numeric copy is a float, which only approximates some decimal
+    # and large integer values (see `LiteralIndex`).
+    numeric_value = models.FloatField(null=True, db_index=True,
+                                      editable=False)
+    temporal_value = models.DateTimeField(null=True, db_index=True,
+                                          editable=False)
+
+    _value_fields = Tokenized._value_fields + ('numeric_value',
+                                               'temporal_value')
 
     class Meta:
         abstract = True
@@ -95,6 +126,77 @@ class DatatypeAware (Reifiable, Scoped):
                 datatype = XSD_LONG
         else:
             datatype = datatype.to_external_form()
+        old_value = self.value
+        old_datatype = self.datatype
         self.value = value
         self.datatype = datatype
         self.save()
+        self._send_event(ValueChanged, old_value, value, old_datatype,
+                         datatype)
+
+    def _set_value_fields (self):
+        super(DatatypeAware, self)._set_value_fields()
+        self.numeric_value = None
+        self.temporal_value = None
+        if self.datatype in NUMERIC_DATATYPES:
+            try:
+                numeric_value = float(self.value)
+            except ValueError:
+                numeric_value = None
+            # NaN is not ordered, so it cannot be found by range.
+            if numeric_value == numeric_value:
+                self.numeric_value = numeric_value
+        elif self.datatype in TEMPORAL_DATATYPES:
+            self.temporal_value = _parse_date_time(self.value)
+
+
+def normalize_date_time (moment):
+    """Returns `moment` in the form stored in the temporal_value
+    field: in UTC, and timezone-aware only if time zone support is
+    enabled.
+
+    A date is taken to be midnight, and a naive datetime to be in UTC.
+
+    :param moment: the date or datetime to normalize
+    :type moment: `datetime.date` or `datetime.datetime`
+    :rtype: `datetime.datetime`
+
+    """
+    if not isinstance(moment, datetime.datetime):
+        moment = datetime.datetime.combine(moment, datetime.time())
+    if timezone.is_aware(moment):
+        moment = timezone.make_naive(moment, timezone.utc)
+    if settings.USE_TZ:
+        moment = timezone.make_aware(moment, timezone.utc)
+    return moment
+
+def _parse_date_time (value):
+    """Returns the xsd:date or xsd:dateTime `value` as a datetime
+    normalized by `normalize_date_time`, or None if it cannot be
+    represented.
+
+    :param value: the lexical form of the date or datetime
+    :type value: string
+    :rtype: `datetime.datetime`
+
+    """
+    match = _DATE_TIME_PATTERN.match(smart_unicode(value).strip())
+    if match is None:
+        return None
+    year, month, day, hour, minute, second, fraction, offset = \
+        match.groups()
+    microsecond = int((fraction or '0')[:6].ljust(6, '0'))
+    try:
+        moment = datetime.datetime(
+            int(year), int(month), int(day), int(hour or 0),
+            int(minute or 0), int(second or 0), microsecond)
+        if offset and offset != 'Z':
+            delta = datetime.timedelta(hours=int(offset[1:3]),
+                                       minutes=int(offset[4:6]))
+            if offset[0] == '+':
+                moment -= delta
+            else:
+                moment += delta
+    except (OverflowError, ValueError):
+        return None
+    return normalize_date_time(moment)
@@ -0,0 +1,206 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing the events describing changes to a topic map,
+which are sent to its indices (see index_registry.py).
+
+Each event carries the database IDs of the constructs involved and,
+for a changed property, its old and new values, so that an index
+holding state in memory can update that state without querying the
+database.
+
+"""
+
+
+class Event (object):
+
+    """Base class for all change events."""
+
+    def __init__ (self, topic_map_id):
+        """Creates an event for a change to the topic map with
+        database ID `topic_map_id`."""
+        self.topic_map_id = topic_map_id
+
+
+class ConstructEvent (Event):
+
+    """Base class for events concerning a single construct."""
+
+    def __init__ (self, topic_map_id, model, construct_id):
+        """Creates an event for a change to the construct of type
+        `model` with database ID `construct_id`."""
+        super(ConstructEvent, self).__init__(topic_map_id)
+        self.model = model
+        self.construct_id = construct_id
+
+
+class ConstructCreated (ConstructEvent):
+
+    """A construct has been created.
+
+    The `construct` attribute holds the new construct. Its scope, if
+    any, is reported by subsequent `ThemeAdded` events.
+
+    """
+
+    def __init__ (self, topic_map_id, model, construct_id, construct):
+        super(ConstructCreated, self).__init__(topic_map_id, model,
+                                               construct_id)
+        self.construct = construct
+
+
+class ConstructRemoved (ConstructEvent):
+
+    """A construct has been removed, either directly or along with
+    its parent."""
+
+    pass
+
+
+class IdentifierAdded (ConstructEvent):
+
+    """An item identifier, subject identifier or subject locator has
+    been added to a construct.
+
+    The `kind` attribute is one of the identifier kinds defined in
+    identity_cache.py, and `address` is the external form of the
+    locator.
+
+    """
+
+    def __init__ (self, topic_map_id, model, construct_id, kind, address):
+        super(IdentifierAdded, self).__init__(topic_map_id, model,
+                                              construct_id)
+        self.kind = kind
+        self.address = address
+
+
+class IdentifierRemoved (IdentifierAdded):
+
+    """An item identifier, subject identifier or subject locator has
+    been removed from a construct."""
+
+    pass
+
+
+class PropertyChanged (ConstructEvent):
+
+    """Base class for events changing a single-valued property of a
+    construct from `old_value` to `new_value`."""
+
+    def __init__ (self, topic_map_id, model, construct_id, old_value,
+                  new_value):
+        super(PropertyChanged, self).__init__(topic_map_id, model,
+                                              construct_id)
+        self.old_value = old_value
+        self.new_value = new_value
+
+
+class PlayerChanged (PropertyChanged):
+
+    """The player of a role has changed. The values are topic IDs."""
+
+    pass
+
+
+class ReifierChanged (PropertyChanged):
+
+    """The reifier of a construct has changed. The values are topic
+    IDs, or None."""
+
+    pass
+
+
+class ThemeAdded (ConstructEvent):
+
+    """A theme has been added to the scope of a construct."""
+
+    def __init__ (self, topic_map_id, model, construct_id, theme_id):
+        super(ThemeAdded, self).__init__(topic_map_id, model, construct_id)
+        self.theme_id = theme_id
+
+
+class ThemeRemoved (ThemeAdded):
+
+    """A theme has been removed from the scope of a construct."""
+
+    pass
+
+
+class TopicTypeAdded (ConstructEvent):
+
+    """A type has been added to a topic."""
+
+    def __init__ (self, topic_map_id, model, construct_id, type_id):
+        super(TopicTypeAdded, self).__init__(topic_map_id, model,
+                                             construct_id)
+        self.type_id = type_id
+
+
+class TopicTypeRemoved (TopicTypeAdded):
+
+    """A type has been removed from a topic."""
+
+    pass
+
+
+class TypeChanged (PropertyChanged):
+
+    """The type of a typed construct has changed. The values are
+    topic IDs."""
+
+    pass
+
+
+class ValueChanged (PropertyChanged):
+
+    """The value of a name, occurrence or variant has changed.
+
+    The `old_datatype` and `new_datatype` attributes hold the
+    datatypes of the old and new values, or None for a name.
+
+    """
+
+    def __init__ (self, topic_map_id, model, construct_id, old_value,
+                  new_value, old_datatype=None, new_datatype=None):
+        super(ValueChanged, self).__init__(topic_map_id, model, construct_id,
+                                           old_value, new_value)
+        self.old_datatype = old_datatype
+        self.new_datatype = new_datatype
+
+
+class TopicMapChanged (Event):
+
+    """Any number of constructs have been created, changed or removed
+    by a bulk operation."""
+
+    pass
+
+
+class TopicsMerged (Event):
+
+    """The topic with database ID `source_id` has been merged into
+    the topic with database ID `target_id`.
+
+    Every use of the source topic has been replaced by the target
+    topic, and its characteristics moved to the target topic.
+    Duplicate constructs removed by the merge are reported by
+    `ConstructRemoved` events, and the source topic is then removed.
+
+    """
+
+    def __init__ (self, topic_map_id, source_id, target_id):
+        super(TopicsMerged, self).__init__(topic_map_id)
+        self.source_id = source_id
+        self.target_id = target_id
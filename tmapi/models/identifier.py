@@ -15,12 +15,24 @@
 from django.db import models
 
 
+# The names of the reverse relations from Identifier to each kind of
+# construct, which are also the values of Identifier.construct_type.
+CONSTRUCT_TYPES = ('association', 'name', 'occurrence', 'role', 'topic',
+                   'topicmap', 'variant')
+
+
 class Identifier (models.Model):
 
     # containing_topic_map may be null because when a TopicMap object
     # is first created (before it is saved) it has no database ID.
     containing_topic_map = models.ForeignKey(
         'TopicMap', related_name='identifiers_in_map', null=True)
+    # The kind of construct this is an identifier for, one of
+    # CONSTRUCT_TYPES, so that the construct can be retrieved without
+    # trying each reverse relation in turn. It is blank only for rows
+    # created before the field was added and not yet backfilled by
+    # the tmapi_backfill_identifiers command.
+    construct_type = models.CharField(max_length=16, blank=True)
 
     class Meta:
         app_label = 'tmapi'
@@ -31,15 +43,29 @@ class Identifier (models.Model):
         :rtype: `Construct` or None
 
         """
+        if self.construct_type:
+            construct_types = (self.construct_type,)
+        else:
+            construct_types = CONSTRUCT_TYPES
         construct = None
-        construct_types = ('association', 'name', 'occurrence', 'role',
-                           'topic', 'topicmap', 'variant')
         for construct_type in construct_types:
             try:
                 construct = getattr(self, construct_type)
-            except:
+                break
+            except models.ObjectDoesNotExist:
                 pass
         return construct
 
     def __unicode__ (self):
         return unicode(self.id)
+
+
+def get_construct_type (construct):
+    """Returns the construct type to record for `construct`.
+
+    :param construct: the construct
+    :type construct: `Construct`
+    :rtype: string
+
+    """
+    return construct._meta.concrete_model._meta.object_name.lower()
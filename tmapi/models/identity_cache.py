@@ -0,0 +1,270 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing the in-process identity resolution cache.
+
+An `IdentityCache` maps the normalised address of an item identifier,
+subject identifier or subject locator in a topic map to the model and
+database ID of the construct it identifies. Only successful lookups
+are cached, and a cached construct that no longer exists is treated as
+a miss, so the cache only needs to be told when an identifier is
+removed from, or moved to, another construct.
+
+The caches are held per process and per topic map, and are disabled
+unless a size is set, either for all topic maps with the
+TMAPI_IDENTITY_CACHE_SIZE setting, or for a single topic map with
+`TopicMap.set_identity_cache_size()`. The caches may be shared by
+threads. The cache is not aware of transactions, and must be cleared
+if a transaction that changed identifiers is rolled back.
+
+"""
+
+from collections import OrderedDict
+import threading
+
+from django.conf import settings
+
+
+# Keys for the different kinds of identifiers.
+ITEM_IDENTIFIER = 'ii'
+SUBJECT_IDENTIFIER = 'si'
+SUBJECT_LOCATOR = 'sl'
+
+# Dictionary of caches, keyed by topic map ID.
+_caches = {}
+
+# Dictionary of cache sizes set for individual topic maps, keyed by
+# topic map ID.
+_sizes = {}
+
+# Lock guarding `_caches` and `_sizes`.
+_lock = threading.Lock()
+
+
+class IdentityCache (object):
+
+    """Least recently used cache of identifier addresses to
+    constructs."""
+
+    def __init__ (self, size):
+        """Creates a cache holding at most `size` entries.
+
+        :param size: the maximum number of entries
+        :type size: integer
+
+        """
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # Dictionary of the keys of the entries for each construct,
+        # keyed by (model, database ID) tuple.
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def clear (self):
+        """Removes all entries from this cache, without resetting the
+        hit and miss counters."""
+        with self._lock:
+            self._entries.clear()
+            self._keys.clear()
+
+    def discard (self, kind, address):
+        """Removes the entry for the identifier of `kind` with
+        `address`, if there is one.
+
+        :param kind: the kind of identifier
+        :type kind: string
+        :param address: the external form of the identifier
+        :type address: string
+
+        """
+        with self._lock:
+            self._remove((kind, address))
+
+    def discard_construct (self, construct):
+        """Removes all entries for `construct`.
+
+        :param construct: the construct
+        :type construct: `Construct`
+
+        """
+        self.discard_constructs([construct])
+
+    def discard_constructs (self, constructs):
+        """Removes all entries for each of `constructs`.
+
+        :param constructs: the constructs
+        :type constructs: list of `Construct`s
+
+        """
+        with self._lock:
+            for construct in constructs:
+                for key in self._keys.pop((construct._meta.concrete_model,
+                                           construct.id), ()):
+                    del self._entries[key]
+
+    def get (self, kind, address):
+        """Returns the (model, database ID) tuple cached for the
+        identifier of `kind` with `address`, or None.
+
+        :param kind: the kind of identifier
+        :type kind: string
+        :param address: the external form of the identifier
+        :type address: string
+        :rtype: tuple or None
+
+        """
+        key = (kind, address)
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries[key] = value
+        return value
+
+    def get_construct (self, kind, address):
+        """Returns the cached construct identified by the identifier
+        of `kind` with `address`, or None.
+
+        If the cached construct no longer exists, its entry is removed
+        and the lookup counted as a miss.
+
+        :param kind: the kind of identifier
+        :type kind: string
+        :param address: the external form of the identifier
+        :type address: string
+        :rtype: `Construct` or None
+
+        """
+        value = self.get(kind, address)
+        if value is None:
+            return None
+        model, construct_id = value
+        try:
+            return model.objects.get(pk=construct_id)
+        except model.DoesNotExist:
+            with self._lock:
+                self._remove((kind, address))
+                self.hits -= 1
+                self.misses += 1
+            return None
+
+    def set (self, kind, address, construct):
+        """Caches `construct` as the construct identified by the
+        identifier of `kind` with `address`.
+
+        :param kind: the kind of identifier
+        :type kind: string
+        :param address: the external form of the identifier
+        :type address: string
+        :param construct: the identified construct
+        :type construct: `Construct`
+
+        """
+        key = (kind, address)
+        value = (construct._meta.concrete_model, construct.id)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = value
+            self._keys.setdefault(value, set()).add(key)
+            self._trim()
+
+    def set_size (self, size):
+        """Sets the maximum number of entries in this cache, removing
+        the least recently used entries beyond it.
+
+        :param size: the maximum number of entries
+        :type size: integer
+
+        """
+        with self._lock:
+            self.size = size
+            self._trim()
+
+    def _remove (self, key):
+        """Removes the entry with `key`, if there is one. The caller
+        must hold the lock."""
+        value = self._entries.pop(key, None)
+        if value is not None:
+            keys = self._keys[value]
+            keys.discard(key)
+            if not keys:
+                del self._keys[value]
+
+    def _trim (self):
+        """Removes the least recently used entries beyond the size of
+        this cache. The caller must hold the lock."""
+        while len(self._entries) > self.size:
+            self._remove(next(iter(self._entries)))
+
+    def __len__ (self):
+        return len(self._entries)
+
+
+def get_identity_cache (topic_map_id):
+    """Returns the identity cache for the topic map with database ID
+    `topic_map_id`, or None if caching is disabled for it.
+
+    :param topic_map_id: the database ID of the topic map
+    :type topic_map_id: integer
+    :rtype: `IdentityCache` or None
+
+    """
+    with _lock:
+        size = _sizes.get(topic_map_id)
+        if size is None:
+            size = getattr(settings, 'TMAPI_IDENTITY_CACHE_SIZE', 0)
+        if not size:
+            _caches.pop(topic_map_id, None)
+            return None
+        cache = _caches.get(topic_map_id)
+        if cache is None:
+            cache = _caches[topic_map_id] = IdentityCache(size)
+    if cache.size != size:
+        cache.set_size(size)
+    return cache
+
+
+def remove_identity_cache (topic_map_id):
+    """Removes the identity cache, and any size set, for the topic
+    map with database ID `topic_map_id`.
+
+    :param topic_map_id: the database ID of the topic map
+    :type topic_map_id: integer
+
+    """
+    with _lock:
+        _caches.pop(topic_map_id, None)
+        _sizes.pop(topic_map_id, None)
+
+
+def set_identity_cache_size (topic_map_id, size):
+    """Sets the size of the identity cache for the topic map with
+    database ID `topic_map_id`.
+
+    :param topic_map_id: the database ID of the topic map
+    :type topic_map_id: integer
+    :param size: the maximum number of entries, 0 to disable the
+      cache, or None to use the TMAPI_IDENTITY_CACHE_SIZE setting
+    :type size: integer or None
+
+    """
+    with _lock:
+        if size is None:
+            _sizes.pop(topic_map_id, None)
+        else:
+            _sizes[topic_map_id] = size
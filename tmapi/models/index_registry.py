@@ -0,0 +1,133 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing the registry of index classes, and the
+in-process index instances of each topic map.
+
+An index class must be registered (the TMAPI index interfaces are
+registered by the tmapi.indices package) before `TopicMap.get_index()`
+will return an instance of it, or of a subclass. Each index is created
+when it is first requested, and is then shared by every `TopicMap`
+instance for the same topic map in the process, so that state loaded
+by one request is available to the next.
+
+The indices of a topic map are sent an `Event` (see events.py) by
+`notify_indices()` whenever the topic map changes. The model methods
+that change a topic map send the events describing each change; bulk
+operations send a single `TopicMapChanged` event once they are done.
+Removals are reported from Django's post_delete signal, so that
+constructs removed along with their parent, or by a bulk delete, are
+also reported.
+
+Events are sent as the changes are made, before they are committed,
+and only for changes made in this process. An index kept up to date
+from them must be reindexed after a rollback, and does not see the
+changes of other processes.
+
+"""
+
+from django.db.models import signals
+
+from tmapi.exceptions import UnsupportedOperationException
+
+from events import ConstructRemoved
+
+
+# List of registered index classes.
+_index_classes = []
+
+# Dictionary of the indices of each topic map, keyed by topic map ID
+# and then by index class.
+_indices = {}
+
+
+def get_index (topic_map, index_class):
+    """Returns the index of type `index_class` for `topic_map`,
+    creating it if necessary.
+
+    :param topic_map: the topic map to index
+    :type topic_map: `TopicMap`
+    :param index_class: a registered index class, or a subclass of one
+    :type index_class: class
+    :rtype: `Index`
+
+    """
+    if not _index_classes or not issubclass(index_class,
+                                            tuple(_index_classes)):
+        raise UnsupportedOperationException(
+            'This TMAPI implementation does not support that index')
+    indices = _indices.setdefault(topic_map.id, {})
+    index = indices.get(index_class)
+    if index is None:
+        index = indices.setdefault(index_class, index_class(topic_map))
+    return index
+
+def notify_indices (topic_map_id, event):
+    """Sends `event` to each index of the topic map with database ID
+    `topic_map_id`.
+
+    :param topic_map_id: the database ID of the changed topic map
+    :type topic_map_id: integer
+    :param event: the change to the topic map
+    :type event: `Event`
+
+    """
+    for index in _indices.get(topic_map_id, {}).values():
+        index.notify(event)
+
+def register_index (index_class):
+    """Registers `index_class`, so that its instances and those of
+    its subclasses can be retrieved with `TopicMap.get_index()`.
+
+    :param index_class: the index class to register
+    :type index_class: subclass of `Index`
+
+    """
+    if index_class not in _index_classes:
+        _index_classes.append(index_class)
+
+def remove_indices (topic_map_id):
+    """Discards the indices of the topic map with database ID
+    `topic_map_id`.
+
+    :param topic_map_id: the database ID of the topic map
+    :type topic_map_id: integer
+
+    """
+    _indices.pop(topic_map_id, None)
+
+def unregister_index (index_class):
+    """Unregisters `index_class`, and discards its instances and
+    those of its subclasses.
+
+    :param index_class: the index class to unregister
+    :type index_class: class
+
+    """
+    if index_class in _index_classes:
+        _index_classes.remove(index_class)
+    for indices in _indices.values():
+        for registered_class in indices.keys():
+            if issubclass(registered_class, index_class):
+                del indices[registered_class]
+
+def _post_delete (sender, instance, **kwargs):
+    # Only constructs within a topic map have a topic_map field.
+    topic_map_id = getattr(instance, 'topic_map_id', None)
+    if topic_map_id in _indices:
+        notify_indices(topic_map_id, ConstructRemoved(
+                topic_map_id, instance._meta.concrete_model, instance.id))
+
+
+signals.post_delete.connect(_post_delete, dispatch_uid='tmapi_indices')
@@ -14,10 +14,11 @@
 
 from django.db import models
 
-from locator import LocatorBase
+from identifier import CONSTRUCT_TYPES
+from locator import AddressLocator
 
 
-class ItemIdentifier (LocatorBase, models.Model):
+class ItemIdentifier (AddressLocator, models.Model):
 
     address = models.CharField(max_length=512)
     # Include a reference to the topic map of the construct this
@@ -26,34 +27,32 @@ class ItemIdentifier (LocatorBase, models.Model):
     # a single relationship back to the construct.
     containing_topic_map = models.ForeignKey(
         'TopicMap', related_name='item_identifiers_in_map')
+    # The identifier of the construct this is an item identifier
+    # for. This is null only for rows created before the field was
+    # added and not yet backfilled by the tmapi_backfill_identifiers
+    # command.
+    identifier = models.ForeignKey('Identifier', null=True,
+                                   related_name='item_identifiers')
 
     class Meta:
         app_label = 'tmapi'
         unique_together = (('address', 'containing_topic_map'),)
 
-    def __init__ (self, *args, **kwargs):
-        super(ItemIdentifier, self).__init__(*args, **kwargs)
-        self.generate_forms(self.address)
-        
-    def save (self, *args, **kwargs):
-        super(ItemIdentifier, self).save(*args, **kwargs)
-        self.generate_forms(self.address)
-
     def get_construct (self):
         """Returns the `Construct` that this is an item identifier for.
 
         :rtype: `Construct` or None
 
         """
+        if self.identifier_id is not None:
+            return self.identifier.get_construct()
         construct = None
-        construct_types = ('association', 'name', 'occurrence', 'role',
-                           'topic', 'topicmap', 'variant')
-        for construct_type in construct_types:
+        for construct_type in CONSTRUCT_TYPES:
             manager = getattr(self, construct_type)
             try:
                 construct = manager.get()
                 break
-            except:
+            except models.ObjectDoesNotExist:
                 pass
         return construct
 
@@ -15,18 +15,47 @@
 import unicodedata
 import urllib
 import urlparse
+import weakref
 
+from tmapi.constants import LOCATOR_CACHE_SIZE
 from tmapi.exceptions import MalformedIRIException
 
 
+# Cache of the reference and external forms of each reference passed
+# to `LocatorBase.generate_forms`. It is cleared when full rather than
+# evicting entries one at a time, so that it is only changed by
+# single dictionary operations, which are safe to share between
+# threads.
+_forms = {}
+
+# Dictionary of the `Locator`s in use, keyed by class and reference.
+_locators = weakref.WeakValueDictionary()
+
+
 class LocatorBase (object):
 
     """Immutable representation of an IRI."""
 
-    def generate_forms (self, reference):
-        self._reference = self.unnormalise(reference)
-        self._external = self.normalise(self._reference)
-        
+    __slots__ = ()
+
+    def generate_forms (self, reference, external=False):
+        """Sets the reference and external forms of this locator from
+        `reference`.
+
+        The forms of recently used references are cached, so
+        that they are normalised only once. If `external` is True,
+        `reference` is trusted to be in external form already, as is
+        the stored address of an identifier, and is not normalised.
+
+        :param reference: the IRI
+        :type reference: string
+        :param external: whether `reference` is an external form
+        :type external: boolean
+
+        """
+        self._reference, self._external = self._get_forms(reference,
+                                                          external)
+
     def get_reference (self):
         """Returns a lexical representation of the IRI.
 
@@ -46,7 +75,7 @@ class LocatorBase (object):
         :rtype: `Locator`
 
         """
-        return Locator(urlparse.urljoin(self._external, reference))
+        return Locator(urlparse.urljoin(self.to_external_form(), reference))
     
     def to_external_form (self):
         """Returns the external form of the IRI.
@@ -86,11 +115,99 @@ class LocatorBase (object):
     def __ne__ (self, other):
         return not(self.__eq__(other))
 
+    def _get_forms (self, reference, external):
+        """Returns the reference and external forms of `reference`.
+
+        :rtype: tuple of strings
+
+        """
+        if external:
+            return (self.unnormalise(reference), reference)
+        forms = _forms.get(reference)
+        if forms is None:
+            unnormalised = self.unnormalise(reference)
+            forms = (unnormalised, self.normalise(unnormalised))
+            if len(_forms) >= LOCATOR_CACHE_SIZE:
+                _forms.clear()
+            _forms[reference] = forms
+        return forms
+
+
+class AddressLocator (LocatorBase):
+
+    """Locator whose IRI is the `address` field of a model.
+
+    The forms of the IRI are generated when they are first used, and
+    again whenever the address has changed, so that loading rows whose
+    forms are not used costs nothing more than loading their
+    addresses. The address of a row loaded from the database is
+    already in external form, and is not normalised.
+
+    Unlike a `Locator`, an instance is hashed as a model instance,
+    since the address of a row may change.
+
+    """
+
+    # The address from which the forms were generated.
+    _address = None
+
+    def get_reference (self):
+        self._check_forms()
+        return self._reference
+
+    def to_external_form (self):
+        self._check_forms()
+        return self._external
+
+    def _check_forms (self):
+        """Generates the forms of the IRI, if the address has changed
+        since they were last generated."""
+        if self._address is None or self._address != self.address:
+            self.generate_forms(self.address, self.pk is not None)
+            self._address = self.address
+
 
 class Locator (LocatorBase):
 
+    """Locator created from a reference.
+
+    Locators are immutable and hashable, and have no instance
+    dictionary, so that large numbers of them may be held as keys of
+    dictionaries and sets. They are also interned: while a `Locator`
+    for a reference is in use, creating another for the same
+    reference returns it.
+
+    """
+
+    __slots__ = ('_external', '_reference', '__weakref__')
+
+    def __new__ (cls, reference):
+        key = (cls, reference)
+        locator = _locators.get(key)
+        if locator is None:
+            locator = super(Locator, cls).__new__(cls)
+            forms = locator._get_forms(reference, False)
+            object.__setattr__(locator, '_reference', forms[0])
+            object.__setattr__(locator, '_external', forms[1])
+            _locators[key] = locator
+        return locator
+
     def __init__ (self, reference):
-        self.generate_forms(reference)
+        # The forms are generated by __new__, only once for an
+        # interned locator.
+        pass
+
+    def __delattr__ (self, name):
+        raise AttributeError('Locator is immutable')
+
+    def __hash__ (self):
+        return hash(self._external)
+
+    def __reduce__ (self):
+        return (self.__class__, (self._external,))
+
+    def __setattr__ (self, name, value):
+        raise AttributeError('Locator is immutable')
 
     def __unicode__ (self):
         return self._reference
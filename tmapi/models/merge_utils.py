@@ -20,7 +20,19 @@ project (http://tinytim.sourceforget.net/).
 
 """
 
-from signature import generate_role_signature, generate_variant_signature
+from django.db.models import Count, Q, get_model
+
+from tmapi.constants import BULK_BATCH_SIZE
+
+from events import TopicMapChanged, TopicsMerged
+from index_registry import notify_indices
+from item_identifier import ItemIdentifier
+from name import Name
+from occurrence import Occurrence
+from role import Role
+from signature import generate_role_signature, \
+    generate_variant_signature, update_signature_hashes
+from variant import Variant
 
 
 def handle_existing_construct (source, target):
@@ -40,6 +52,7 @@ def handle_existing_construct (source, target):
 
     """
     # Handle item identifiers.
+    source.get_item_identifiers().update(identifier=target.identifier_id)
     for iid in source.get_item_identifiers():
         source.item_identifiers.remove(iid)
         target.item_identifiers.add(iid)
@@ -96,3 +109,318 @@ def move_variants (source, target):
         else:
             variant.name = target
             variant.save()
+
+def merge_topics (source, target):
+    """Moves all of the characteristics and uses of `source` to
+    `target`, and removes the duplicate constructs that result.
+
+    The characteristics and uses are moved with bulk UPDATE
+    statements, the signature hashes of the constructs that may have
+    become duplicates are updated, and duplicates are found by
+    grouping on those hashes, so the number of queries does not
+    depend on the number of characteristics moved.
+
+    `source` is left with no characteristics and no uses, but is not
+    removed. Duplicate constructs that both have reifiers have their
+    reifiers set to None; the (target reifier ID, source reifier ID)
+    pairs of such topics are returned, and the caller is responsible
+    for merging them.
+
+    :param source: the topic to move characteristics from
+    :type source: `Topic`
+    :param target: the topic to move characteristics to
+    :type target: `Topic`
+    :rtype: list of tuples
+
+    """
+    # Association and Topic cannot be imported by this module
+    # without creating a circular import.
+    association_model = get_model('tmapi', 'Association')
+    topic_model = get_model('tmapi', 'Topic')
+    # Find the constructs that may become duplicates before the uses
+    # of source are changed.
+    name_parents = set([target.id])
+    name_parents.update(Name.objects.filter(
+            Q(type=source) | Q(scope=source)).values_list('topic', flat=True))
+    name_parents.update(Variant.objects.filter(scope=source).values_list(
+            'name__topic', flat=True))
+    name_parents.discard(source.id)
+    occurrence_parents = set([target.id])
+    occurrence_parents.update(Occurrence.objects.filter(
+            Q(type=source) | Q(scope=source)).values_list('topic', flat=True))
+    occurrence_parents.discard(source.id)
+    has_associations = association_model.objects.filter(
+        Q(type=source) | Q(scope=source) | Q(roles__player=source) |
+        Q(roles__type=source)).exists()
+    # Move the identifiers.
+    source.get_item_identifiers().update(identifier=target.identifier_id)
+    topic_model.item_identifiers.through.objects.filter(topic=source).update(
+        topic=target)
+    source.subject_identifiers.update(topic=target)
+    source.subject_locators.update(topic=target)
+    # Move the characteristics and uses.
+    Name.objects.filter(topic=source).update(topic=target)
+    Occurrence.objects.filter(topic=source).update(topic=target)
+    Role.objects.filter(player=source).update(player=target)
+    for model in (association_model, Name, Occurrence, Role):
+        model.objects.filter(type=source).update(type=target)
+    through = topic_model.types.through
+    _replace_topic(through, 'to_topic', 'from_topic', source, target)
+    _replace_topic(through, 'from_topic', 'to_topic', source, target)
+    for model in (association_model, Name, Occurrence, Variant):
+        _replace_topic(model.scope.through, 'topic',
+                       model._meta.object_name.lower(), source, target)
+    # Remove the duplicates.
+    reifiers = []
+    if has_associations:
+        associations = association_model.objects.filter(
+            id__in=association_model.objects.filter(
+                Q(type=target) | Q(scope=target) | Q(roles__player=target) |
+                Q(roles__type=target)).values('id'))
+        update_signature_hashes(association_model, associations)
+        _remove_duplicates(association_model, associations, ('signature',),
+                           reifiers, (Role, 'association'))
+        _remove_duplicates(Role, Role.objects.filter(
+                association__in=associations.values('id')),
+                           ('association', 'type', 'player'), reifiers)
+    name_parents = list(name_parents)
+    for start in range(0, len(name_parents), BULK_BATCH_SIZE):
+        names = Name.objects.filter(
+            topic__in=name_parents[start:start+BULK_BATCH_SIZE])
+        update_signature_hashes(Name, names)
+        _remove_duplicates(Name, names, ('topic', 'signature'), reifiers,
+                           (Variant, 'name'))
+        variants = Variant.objects.filter(name__in=names.values('id'))
+        update_signature_hashes(Variant, variants)
+        _remove_duplicates(Variant, variants, ('name', 'signature'), reifiers)
+    occurrence_parents = list(occurrence_parents)
+    for start in range(0, len(occurrence_parents), BULK_BATCH_SIZE):
+        occurrences = Occurrence.objects.filter(
+            topic__in=occurrence_parents[start:start+BULK_BATCH_SIZE])
+        update_signature_hashes(Occurrence, occurrences)
+        _remove_duplicates(Occurrence, occurrences, ('topic', 'signature'),
+                           reifiers)
+    notify_indices(target.topic_map_id, TopicsMerged(
+            target.topic_map_id, source.id, target.id))
+    return reifiers
+
+def remove_duplicates (topic_map):
+    """Removes the duplicate associations, roles, names, variants and
+    occurrences in `topic_map`.
+
+    The topic map is processed in batches of topics, covering the
+    characteristics of those topics and the associations typed by
+    them, so the memory used does not depend on the size of the topic
+    map. Duplicates are found by grouping on the stored signature
+    hashes, which are first recomputed for the constructs of each
+    batch, so that a hash left out of date does not hide a duplicate.
+
+    Duplicate constructs that both have reifiers have their reifiers
+    set to None; the (kept reifier ID, duplicate reifier ID) pairs of
+    such topics are returned, and the caller is responsible for
+    merging them.
+
+    :param topic_map: the topic map to remove duplicates from
+    :type topic_map: `TopicMap`
+    :rtype: tuple of a dictionary mapping the name of each kind of
+      construct to the number of duplicates removed, and a list of
+      tuples
+
+    """
+    association_model = get_model('tmapi', 'Association')
+    counts = {'association': 0, 'name': 0, 'occurrence': 0, 'role': 0,
+              'variant': 0}
+    reifiers = []
+    topic_ids = topic_map.topic_constructs.order_by('id').values_list(
+        'id', flat=True)
+    batch = list(topic_ids[:BULK_BATCH_SIZE])
+    while batch:
+        associations = association_model.objects.filter(
+            topic_map=topic_map, type__in=batch)
+        update_signature_hashes(association_model, associations)
+        counts['association'] += _remove_duplicates(
+            association_model, associations, ('signature',), reifiers,
+            (Role, 'association'))
+        counts['role'] += _remove_duplicates(Role, Role.objects.filter(
+                association__in=associations.values('id')),
+            ('association', 'type', 'player'), reifiers)
+        names = Name.objects.filter(topic__in=batch)
+        update_signature_hashes(Name, names)
+        counts['name'] += _remove_duplicates(
+            Name, names, ('topic', 'signature'), reifiers, (Variant, 'name'))
+        variants = Variant.objects.filter(name__in=names.values('id'))
+        update_signature_hashes(Variant, variants)
+        counts['variant'] += _remove_duplicates(
+            Variant, variants, ('name', 'signature'), reifiers)
+        occurrences = Occurrence.objects.filter(topic__in=batch)
+        update_signature_hashes(Occurrence, occurrences)
+        counts['occurrence'] += _remove_duplicates(
+            Occurrence, occurrences, ('topic', 'signature'), reifiers)
+        batch = list(topic_ids.filter(id__gt=batch[-1])[:BULK_BATCH_SIZE])
+    notify_indices(topic_map.id, TopicMapChanged(topic_map.id))
+    return counts, reifiers
+
+def _find_duplicates (constructs, fields):
+    """Returns a dictionary mapping the database ID of each duplicate
+    among `constructs` to the ID of the construct it duplicates.
+
+    Two constructs are duplicates if they have the same values for
+    `fields`. The groups of duplicates are found with a single
+    grouped query, and only the constructs in those groups are
+    fetched.
+
+    :param constructs: the constructs to check
+    :type constructs: `QuerySet`
+    :param fields: the names of the fields to group on
+    :type fields: tuple of strings
+    :rtype: dictionary
+
+    """
+    groups = set([row[:-1] for row in constructs.order_by().values_list(
+                *fields).annotate(count=Count('id')).filter(count__gt=1)])
+    duplicates = {}
+    if not groups:
+        return duplicates
+    # The constructs in a group share the value of the last field,
+    # so each group is fetched whole by one of these queries.
+    values = list(set([group[-1] for group in groups]))
+    for start in range(0, len(values), BULK_BATCH_SIZE):
+        kept = {}
+        for row in constructs.filter(**{
+                fields[-1] + '__in': values[start:start+BULK_BATCH_SIZE]}
+                                     ).order_by('id').values_list(
+            'id', *fields).iterator():
+            group = row[1:]
+            if group not in groups:
+                continue
+            if group in kept:
+                duplicates[row[0]] = kept[group]
+            else:
+                kept[group] = row[0]
+    return duplicates
+
+def _merge_duplicates (model, duplicates, reifiers, children=None):
+    """Merges each duplicate construct into the construct it
+    duplicates, and deletes the duplicates.
+
+    :param model: the model of the constructs
+    :type model: class
+    :param duplicates: dictionary mapping the database ID of each
+      duplicate to the ID of the construct to keep
+    :type duplicates: dictionary
+    :param reifiers: list to which the (kept reifier ID, duplicate
+      reifier ID) pairs of reifiers to be merged are added
+    :type reifiers: list
+    :param children: the model of the child constructs to move to the
+      kept construct, and the name of its field referring to the
+      parent
+    :type children: tuple or None
+
+    """
+    column = model._meta.object_name.lower()
+    through = model.item_identifiers.through
+    duplicate_ids = duplicates.keys()
+    for start in range(0, len(duplicate_ids), BULK_BATCH_SIZE):
+        batch = duplicate_ids[start:start+BULK_BATCH_SIZE]
+        rows = {}
+        for construct_id, identifier_id, reifier_id in model.objects.filter(
+            id__in=set(batch + [duplicates[duplicate_id] for duplicate_id
+                                in batch])).values_list(
+            'id', 'identifier', 'reifier'):
+            rows[construct_id] = [identifier_id, reifier_id]
+        # Only the duplicates that have item identifiers, reifiers or
+        # children need further queries, made once for each kept
+        # construct.
+        moves = {}
+        for row_id, duplicate_id, iid_id in through.objects.filter(
+            **{column + '__in': batch}).values_list(
+            'id', column, 'itemidentifier'):
+            kept_moves = moves.setdefault(duplicates[duplicate_id],
+                                          ([], [], []))
+            kept_moves[0].append(row_id)
+            kept_moves[1].append(iid_id)
+        if children is not None:
+            child_model, parent_field = children
+            for child_id, duplicate_id in child_model.objects.filter(
+                **{parent_field + '__in': batch}).values_list(
+                'id', parent_field):
+                moves.setdefault(duplicates[duplicate_id],
+                                 ([], [], []))[2].append(child_id)
+        for kept_id, (row_ids, iid_ids, child_ids) in moves.items():
+            if row_ids:
+                ItemIdentifier.objects.filter(id__in=iid_ids).update(
+                    identifier=rows[kept_id][0])
+                through.objects.filter(id__in=row_ids).update(
+                    **{column: kept_id})
+            if child_ids:
+                child_model.objects.filter(id__in=child_ids).update(
+                    **{parent_field: kept_id})
+        for duplicate_id in batch:
+            reifier_id = rows[duplicate_id][1]
+            if reifier_id is None:
+                continue
+            kept_id = duplicates[duplicate_id]
+            model.objects.filter(id=duplicate_id).update(reifier=None)
+            if rows[kept_id][1] is None:
+                model.objects.filter(id=kept_id).update(reifier=reifier_id)
+                rows[kept_id][1] = reifier_id
+            else:
+                reifiers.append((rows[kept_id][1], reifier_id))
+        model.objects.filter(id__in=batch).delete()
+
+def _remove_duplicates (model, constructs, fields, reifiers, children=None):
+    """Removes the duplicates among `constructs`, returning the number
+    removed.
+
+    Two constructs are duplicates if they have the same values for
+    `fields`.
+
+    :param model: the model of `constructs`
+    :type model: class
+    :param constructs: the constructs to check
+    :type constructs: `QuerySet`
+    :param fields: the names of the fields making up the signature
+    :type fields: tuple of strings
+    :param reifiers: list to which the pairs of reifiers to be merged
+      are added
+    :type reifiers: list
+    :param children: the model of the child constructs to move from a
+      duplicate to the kept construct, and the name of its field
+      referring to the parent
+    :type children: tuple or None
+    :rtype: integer
+
+    """
+    duplicates = _find_duplicates(constructs, fields)
+    _merge_duplicates(model, duplicates, reifiers, children)
+    return len(duplicates)
+
+def _replace_topic (through, column, other_column, source, target):
+    """Replaces `source` with `target` in the `column` of the
+    intermediary table `through`, deleting the rows that would then
+    duplicate existing ones.
+
+    :param through: the intermediary model
+    :type through: class
+    :param column: the name of the field referring to the topic
+    :type column: string
+    :param other_column: the name of the other field of `through`
+    :type other_column: string
+    :param source: the topic to replace
+    :type source: `Topic`
+    :param target: the topic to replace it with
+    :type target: `Topic`
+
+    """
+    others = list(through.objects.filter(**{column: source}).values_list(
+            other_column, flat=True))
+    for start in range(0, len(others), BULK_BATCH_SIZE):
+        duplicates = list(through.objects.filter(**{
+                    column: target, other_column + '__in':
+                        others[start:start+BULK_BATCH_SIZE]}).values_list(
+                other_column, flat=True))
+        if duplicates:
+            through.objects.filter(**{
+                    column: source, other_column + '__in': duplicates}).delete()
+    through.objects.filter(**{column: source}).update(**{column: target})
+
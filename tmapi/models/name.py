@@ -18,14 +18,16 @@ from tmapi.constants import XSD_ANY_URI, XSD_STRING
 from tmapi.exceptions import ModelConstraintException
 
 from construct_fields import ConstructFields
+from events import ValueChanged
 from locator import Locator
 from reifiable import Reifiable
 from scoped import Scoped
+from tokenized import Tokenized
 from typed import Typed
 from variant import Variant
 
 
-class Name (ConstructFields, Reifiable, Scoped, Typed):
+class Name (ConstructFields, Reifiable, Scoped, Tokenized, Typed):
 
     """Represents a topic name item."""
     
@@ -73,6 +75,8 @@ class Name (ConstructFields, Reifiable, Scoped, Typed):
         variant.save()
         for theme in scope:
             variant.scope.add(theme)
+        variant._update_signature([theme.id for theme in scope])
+        variant._send_created_events([theme.id for theme in scope])
         return variant
         
     def get_parent (self, proxy=None):
@@ -100,8 +104,10 @@ class Name (ConstructFields, Reifiable, Scoped, Typed):
         """Sets the value of this name. The previous value is overridden."""
         if value is None:
             raise ModelConstraintException(self, 'The value may not be None')
+        old_value = self.value
         self.value = value
         self.save()
+        self._send_event(ValueChanged, old_value, value)
 
     def __unicode__ (self):
         return self.value
@@ -17,6 +17,7 @@ from django.db import models
 from tmapi.exceptions import ModelConstraintException
 
 from construct import Construct
+from events import ReifierChanged
 
 
 class Reifiable (Construct, models.Model):
@@ -60,8 +61,10 @@ class Reifiable (Construct, models.Model):
                     self, 'The reifier is not from the same topic map')
             reified = reifier.get_reified()
         if reified is None:
+            old_reifier_id = self.reifier_id
             self.reifier = reifier
             self.save()
+            self._send_event(ReifierChanged, old_reifier_id, self.reifier_id)
         elif reified == self:
             pass
         else:
@@ -17,6 +17,7 @@ from django.db import models
 from tmapi.exceptions import ModelConstraintException
 
 from construct_fields import ConstructFields
+from events import PlayerChanged
 from reifiable import Reifiable
 from typed import Typed
 
@@ -53,6 +54,24 @@ class Role (ConstructFields, Reifiable, Typed):
             player = proxy.objects.get(pk=player.id)
         return player
 
+    def remove (self):
+        association = self.association
+        super(Role, self).remove()
+        association._update_signature()
+
+    def save (self, *args, **kwargs):
+        # The roles of an association form part of its signature,
+        # which is recomputed if the type or player of the stored row
+        # changes.
+        role = (self.type_id, self.player_id)
+        changed = True
+        if self.pk is not None:
+            changed = role not in Role.objects.filter(pk=self.pk).values_list(
+                'type', 'player')
+        super(Role, self).save(*args, **kwargs)
+        if changed:
+            self.association._update_signature()
+
     def set_player (self, player):
         """Sets the role player.
 
@@ -67,5 +86,7 @@ class Role (ConstructFields, Reifiable, Typed):
         if self.topic_map != player.topic_map:
             raise ModelConstraintException(
                 self, 'The player is not from the same topic map')
+        old_player_id = self.player_id
         self.player = player
         self.save()
+        self._send_event(PlayerChanged, old_player_id, player.id)
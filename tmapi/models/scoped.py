@@ -17,6 +17,8 @@ from django.db import models
 from tmapi.exceptions import ModelConstraintException
 
 from construct import Construct
+from events import ConstructCreated, ThemeAdded, ThemeRemoved
+from signature import generate_signature_hash
 
 
 class Scoped (Construct, models.Model):
@@ -26,6 +28,10 @@ class Scoped (Construct, models.Model):
     scoped."""
 
     scope = models.ManyToManyField('Topic', related_name='scoped_%(class)ss')
+    # Hash of the construct's signature (see signature.py), kept up
+    # to date so that duplicates can be found with grouped queries.
+    signature = models.CharField(max_length=40, blank=True, db_index=True,
+                                 editable=False)
 
     class Meta:
         abstract = True
@@ -44,6 +50,8 @@ class Scoped (Construct, models.Model):
             raise ModelConstraintException(
                 self, 'The theme is not from the same topic map')
         self.scope.add(theme)
+        self._update_signature()
+        self._send_event(ThemeAdded, theme.id)
         
     def get_scope (self):
         """Returns the topics which define the scope. An empty set
@@ -62,3 +70,85 @@ class Scoped (Construct, models.Model):
 
         """
         self.scope.remove(theme)
+        self._update_signature()
+        self._send_event(ThemeRemoved, theme.id)
+
+    def save (self, *args, **kwargs):
+        # The signature is only recomputed if a field of it differs
+        # from the stored row; otherwise the stored hash is kept, since
+        # the scope and roles may have been changed through another
+        # instance.
+        if self.pk is None:
+            self.signature = self._generate_signature_hash([])
+        else:
+            names = self._get_signature_field_names()
+            rows = self._meta.concrete_model.objects.filter(
+                pk=self.pk).values_list('signature', *names)
+            fields = tuple([getattr(self, self._meta.get_field(name).attname)
+                            for name in names])
+            if rows and fields == rows[0][1:]:
+                self.signature = rows[0][0]
+            else:
+                self.signature = self._generate_signature_hash()
+        super(Scoped, self).save(*args, **kwargs)
+
+    def _generate_signature_hash (self, scope=None):
+        """Returns the hash of this construct's signature, reading its
+        scope and roles from the database.
+
+        :param scope: the IDs of the themes of this construct, or
+          None to retrieve them
+        :type scope: list of integers
+        :rtype: string
+
+        """
+        if scope is None:
+            scope = self.scope.values_list('id', flat=True)
+        return generate_signature_hash(
+            getattr(self, 'type_id', None), scope,
+            self._get_signature_roles(), getattr(self, 'datatype', None),
+            getattr(self, 'value', None))
+
+    def _get_signature_field_names (self):
+        """Returns the names of the fields of this construct that form
+        part of its signature.
+
+        :rtype: list of strings
+
+        """
+        names = self._meta.get_all_field_names()
+        return [name for name in ('type', 'datatype', 'value')
+                if name in names]
+
+    def _get_signature_roles (self):
+        """Returns the (type ID, player ID) pairs of the roles of this
+        construct that form part of its signature.
+
+        :rtype: list of tuples
+
+        """
+        return []
+
+    def _send_created_events (self, scope):
+        """Sends the events reporting the creation of this construct
+        to the indices of its topic map.
+
+        :param scope: the IDs of the themes of this construct
+        :type scope: list of integers
+
+        """
+        self._send_event(ConstructCreated, self)
+        for theme_id in scope:
+            self._send_event(ThemeAdded, theme_id)
+
+    def _update_signature (self, scope=None):
+        """Recomputes and stores the hash of this construct's signature.
+
+        :param scope: the IDs of the themes of this construct, or
+          None to retrieve them
+        :type scope: list of integers
+
+        """
+        self.signature = self._generate_signature_hash(scope)
+        self._meta.concrete_model.objects.filter(pk=self.pk).update(
+            signature=self.signature)
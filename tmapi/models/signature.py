@@ -26,9 +26,20 @@ are accounted for in generating the signature.
 It is a port of the Java code written by Lars Heuer for the tinyTiM
 project (http://tinytim.sourceforget.net/).
 
+The signature hash of each scoped construct is also stored in its
+`signature` field, so that duplicates can be found by grouping on
+that column rather than by fetching and comparing every construct.
+
 """
 
-from name import Name
+import hashlib
+
+from django.db import connection, transaction
+from django.utils.encoding import smart_unicode
+
+from tmapi.constants import BULK_BATCH_SIZE
+
+from role import Role
 
 
 def generate_association_signature (association):
@@ -69,6 +80,40 @@ def generate_occurrence_signature (occurrence):
             _generate_scope_signature(occurrence),
             _generate_data_signature(occurrence))
 
+def generate_signature_hash (type_id, scope, roles=(), datatype=None,
+                             value=None):
+    """Returns the hash stored as the signature of a scoped construct.
+
+    The scope of a variant is taken to be its own themes only, since
+    all of the variants of a name share the name's scope.
+
+    :param type_id: the ID of the construct's type, or None
+    :type type_id: integer
+    :param scope: the IDs of the construct's themes
+    :type scope: iterable of integers
+    :param roles: the (type ID, player ID) pairs of an association's roles
+    :type roles: iterable of tuples
+    :param datatype: the datatype of the construct's value, or None
+    :type datatype: string
+    :param value: the construct's value, or None
+    :type value: string
+    :rtype: string
+
+    """
+    if type_id is not None:
+        type_id = int(type_id)
+    # The datatype and value are compared as they are stored in the
+    # database.
+    if datatype is not None:
+        datatype = smart_unicode(datatype)
+    if value is not None:
+        value = smart_unicode(value)
+    data = (type_id, sorted(set([int(theme_id) for theme_id in scope])),
+            sorted(set([(int(role_type_id), int(player_id)) for
+                        role_type_id, player_id in roles])),
+            datatype, value)
+    return hashlib.sha1(repr(data)).hexdigest()
+
 def generate_role_signature (role):
     """Generates the signature for a role.
 
@@ -90,6 +135,57 @@ def generate_variant_signature (variant):
     return (_generate_scope_signature(variant),
             _generate_data_signature(variant))
 
+def update_signature_hashes (model, constructs):
+    """Recomputes the signature hashes of `constructs`, storing those
+    that have changed.
+
+    The number of queries does not depend on the number of
+    constructs.
+
+    :param model: the model of `constructs`
+    :type model: class
+    :param constructs: the constructs to update
+    :type constructs: `QuerySet`
+    :rtype: integer
+
+    """
+    column = model._meta.object_name.lower()
+    construct_ids = constructs.values('id')
+    scopes = {}
+    for construct_id, theme_id in model.scope.through.objects.filter(
+        **{column + '__in': construct_ids}).values_list(
+        column, 'topic').iterator():
+        scopes.setdefault(construct_id, []).append(theme_id)
+    roles = {}
+    if column == 'association':
+        for association_id, type_id, player_id in Role.objects.filter(
+            association__in=construct_ids).values_list(
+            'association', 'type', 'player').iterator():
+            roles.setdefault(association_id, []).append((type_id, player_id))
+    field_names = [field.name for field in model._meta.fields]
+    fields = [field for field in ('type', 'datatype', 'value')
+              if field in field_names]
+    changed = []
+    for row in constructs.values_list('id', 'signature', *fields).iterator():
+        data = dict(zip(fields, row[2:]))
+        signature = generate_signature_hash(
+            data.get('type'), scopes.get(row[0], ()), roles.get(row[0], ()),
+            data.get('datatype'), data.get('value'))
+        if signature != row[1]:
+            changed.append((signature, row[0]))
+    if changed:
+        # A single UPDATE cannot set a different value on each row,
+        # so the statements are sent together.
+        cursor = connection.cursor()
+        sql = 'UPDATE %s SET %s = %%s WHERE %s = %%s' % (
+            connection.ops.quote_name(model._meta.db_table),
+            connection.ops.quote_name('signature'),
+            connection.ops.quote_name(model._meta.pk.column))
+        for start in range(0, len(changed), BULK_BATCH_SIZE):
+            cursor.executemany(sql, changed[start:start+BULK_BATCH_SIZE])
+        transaction.commit_unless_managed()
+    return len(changed)
+
 def _generate_data_signature (construct):
     """Returns the signature for a value/datatype pair.
 
@@ -98,7 +194,7 @@ def _generate_data_signature (construct):
     :rtype: tuple
 
     """
-    if isinstance(construct, Name):
+    if not hasattr(construct, 'datatype'):
         datatype = None
     else:
         datatype = hash(construct.get_datatype().to_external_form())
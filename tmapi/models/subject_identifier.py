@@ -14,10 +14,10 @@
 
 from django.db import models
 
-from locator import LocatorBase
+from locator import AddressLocator
 
 
-class SubjectIdentifier (LocatorBase, models.Model):
+class SubjectIdentifier (AddressLocator, models.Model):
 
     topic = models.ForeignKey('Topic', related_name='subject_identifiers')
     address = models.CharField(db_index=True, max_length=512)
@@ -27,13 +27,5 @@ class SubjectIdentifier (LocatorBase, models.Model):
     class Meta:
         app_label = 'tmapi'
 
-    def __init__ (self, *args, **kwargs):
-        super(SubjectIdentifier, self).__init__(*args, **kwargs)
-        self.generate_forms(self.address)
-
-    def save (self, *args, **kwargs):
-        super(SubjectIdentifier, self).save(*args, **kwargs)
-        self.generate_forms(self.address)
-
     def __unicode__ (self):
         return self.address
@@ -14,6 +14,17 @@
 
 from django.db import models
 
+from tmapi.exceptions import FeatureNotRecognizedException
+
+
+# Dictionary of the features of each topic map system, keyed by
+# system ID. Features cannot change once a system has been created,
+# so they are loaded once and then shared within the process; each
+# value is a frozenset of (feature string, value) pairs, so that no
+# caller can alter the features seen by another.
+_features = {}
+
+
 class TMAPIFeature (models.Model):
 
     topic_map_system = models.ForeignKey('TopicMapSystem',
@@ -24,3 +35,43 @@ class TMAPIFeature (models.Model):
     class Meta:
         app_label = 'tmapi'
         unique_together = ('topic_map_system', 'feature_string')
+
+
+def get_feature (topic_map_system_id, feature_name):
+    """Returns the value of the feature `feature_name` of the topic
+    map system with database ID `topic_map_system_id`.
+
+    :param topic_map_system_id: the database ID of the system
+    :type topic_map_system_id: integer
+    :param feature_name: the name of the feature to check
+    :type feature_name: string
+    :rtype: Boolean
+
+    """
+    features = load_features(topic_map_system_id)
+    if (feature_name, True) in features:
+        return True
+    if (feature_name, False) in features:
+        return False
+    raise FeatureNotRecognizedException
+
+def load_features (topic_map_system_id, reload=False):
+    """Returns the features of the topic map system with database ID
+    `topic_map_system_id`, loading them if they have not yet been
+    loaded or if `reload` is True.
+
+    :param topic_map_system_id: the database ID of the system
+    :type topic_map_system_id: integer
+    :param reload: whether to load the features even if they are
+      already loaded
+    :type reload: boolean
+    :rtype: frozenset of (feature string, Boolean) tuples
+
+    """
+    features = _features.get(topic_map_system_id)
+    if features is None or reload:
+        features = frozenset(TMAPIFeature.objects.filter(
+                topic_map_system=topic_map_system_id).values_list(
+                'feature_string', 'value'))
+        _features[topic_map_system_id] = features
+    return features
@@ -0,0 +1,210 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing the indices of the values of `Name`s,
+`Occurrence`s and `Variant`s.
+
+Each value is split into case-folded word tokens, which are stored
+in the `LiteralToken` table with the position of their first
+appearance in the value. `LiteralIndex` searches this table, so that
+full-text and prefix searches are answered from an indexed column
+rather than by scanning the values.
+
+The hash of each value is also stored in its construct's
+`value_hash` field, so that exact lookups of long values use an
+index.
+
+"""
+
+import hashlib
+import re
+
+from django.db import connection, models, transaction
+from django.utils.encoding import smart_unicode
+
+from tmapi.constants import BULK_BATCH_SIZE
+
+
+# Maximum length of a stored token; longer words are truncated.
+MAX_TOKEN_LENGTH = 64
+
+_TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+class Tokenized (models.Model):
+
+    """Indicates that the value of a Topic Maps construct is
+    tokenized and hashed for searching. `Name`s, `Occurrence`s and
+    `Variant`s are tokenized."""
+
+    # Hash of the value, kept up to date so that values can be looked
+    # up without scanning them.
+    value_hash = models.CharField(max_length=40, blank=True, db_index=True,
+                                  editable=False)
+
+    # Names of the fields derived from the value by
+    # `_set_value_fields`.
+    _value_fields = ('value_hash',)
+
+    class Meta:
+        abstract = True
+        app_label = 'tmapi'
+
+    def __init__ (self, *args, **kwargs):
+        super(Tokenized, self).__init__(*args, **kwargs)
+        # The value whose tokens are stored, if known. The instance
+        # dictionary is read so that a deferred value is not loaded.
+        self._tokenized_value = None
+        if self.pk is not None:
+            self._tokenized_value = self.__dict__.get('value')
+
+    def save (self, *args, **kwargs):
+        created = self.pk is None
+        self._set_value_fields()
+        super(Tokenized, self).save(*args, **kwargs)
+        if self.value != self._tokenized_value:
+            update_tokens(self.__class__, [self], not created)
+
+    def _set_value_fields (self):
+        """Sets the fields derived from the value."""
+        self.value_hash = generate_value_hash(self.value)
+
+
+class LiteralToken (models.Model):
+
+    """A word token of the value of a `Name`, `Occurrence` or
+    `Variant`.
+
+    Exactly one of the construct fields is set.
+
+    """
+
+    token = models.CharField(max_length=MAX_TOKEN_LENGTH, db_index=True)
+    # Position of the first appearance of the token in the value.
+    position = models.PositiveIntegerField()
+    name = models.ForeignKey('Name', null=True, related_name='tokens')
+    occurrence = models.ForeignKey('Occurrence', null=True,
+                                   related_name='tokens')
+    variant = models.ForeignKey('Variant', null=True, related_name='tokens')
+
+    class Meta:
+        app_label = 'tmapi'
+
+    def __unicode__ (self):
+        return self.token
+
+
+def generate_value_hash (value):
+    """Returns the hash of `value`.
+
+    :param value: the value of a `Tokenized` construct
+    :rtype: string
+
+    """
+    return hashlib.sha1(smart_unicode(value).encode('utf-8')).hexdigest()
+
+def tokenize (value):
+    """Returns the distinct case-folded word tokens of `value`, in
+    order of their first appearance.
+
+    :param value: the value to tokenize
+    :type value: string
+    :rtype: list of strings
+
+    """
+    tokens = []
+    seen = set()
+    for match in _TOKEN_PATTERN.finditer(smart_unicode(value)):
+        token = match.group().lower()[:MAX_TOKEN_LENGTH]
+        if token not in seen:
+            seen.add(token)
+            tokens.append(token)
+    return tokens
+
+def update_tokens (model, constructs, replace=True):
+    """Stores the tokens of the saved `constructs`.
+
+    :param model: the model class of the constructs
+    :type model: class
+    :param constructs: constructs of type `model`
+    :type constructs: iterable of `Tokenized`s
+    :param replace: whether the constructs may already have stored
+      tokens, which are deleted
+    :type replace: boolean
+    :rtype: integer, the number of tokens stored
+
+    """
+    column = model._meta.object_name.lower()
+    count = 0
+    batch = []
+    for construct in constructs:
+        batch.append(construct)
+        if len(batch) == BULK_BATCH_SIZE:
+            count += _update_tokens(column, batch, replace)
+            batch = []
+    if batch:
+        count += _update_tokens(column, batch, replace)
+    return count
+
+def update_value_fields (model, constructs):
+    """Recomputes the fields derived from the values of
+    `constructs`, storing those that have changed.
+
+    :param model: the model of `constructs`
+    :type model: class
+    :param constructs: the constructs to update
+    :type constructs: `QuerySet`
+    :rtype: integer, the number of constructs updated
+
+    """
+    fields = [model._meta.get_field(name) for name in model._value_fields]
+    changed = []
+    for construct in constructs.iterator():
+        old_values = [getattr(construct, field.attname) for field in fields]
+        construct._set_value_fields()
+        values = [getattr(construct, field.attname) for field in fields]
+        if values != old_values:
+            changed.append([field.get_db_prep_save(value, connection)
+                            for field, value in zip(fields, values)] +
+                           [construct.id])
+    if changed:
+        cursor = connection.cursor()
+        sql = 'UPDATE %s SET %s WHERE %s = %%s' % (
+            connection.ops.quote_name(model._meta.db_table),
+            ', '.join(['%s = %%s' % connection.ops.quote_name(field.column)
+                       for field in fields]),
+            connection.ops.quote_name(model._meta.pk.column))
+        for start in range(0, len(changed), BULK_BATCH_SIZE):
+            cursor.executemany(sql, changed[start:start+BULK_BATCH_SIZE])
+        transaction.commit_unless_managed()
+    return len(changed)
+
+def _update_tokens (column, constructs, replace):
+    """Stores the tokens of `constructs`, whose foreign key on
+    `LiteralToken` is `column`.
+
+    :rtype: integer, the number of tokens stored
+
+    """
+    if replace:
+        LiteralToken.objects.filter(**{column + '__in': [
+                    construct.id for construct in constructs]}).delete()
+    tokens = []
+    for construct in constructs:
+        for position, token in enumerate(tokenize(construct.value)):
+            tokens.append(LiteralToken(token=token, position=position,
+                                       **{column + '_id': construct.id}))
+        construct._tokenized_value = construct.value
+    LiteralToken.objects.bulk_create(tokens, batch_size=BULK_BATCH_SIZE)
+    return len(tokens)
@@ -16,22 +16,25 @@
 
 from django.db import models
 
-from tmapi.constants import AUTOMERGE_FEATURE_STRING, XSD_ANY_URI, XSD_FLOAT, XSD_INT, XSD_LONG, XSD_STRING
+from tmapi.constants import AUTOMERGE_FEATURE_STRING, BULK_BATCH_SIZE, XSD_ANY_URI, XSD_FLOAT, XSD_INT, XSD_LONG, XSD_STRING
 from tmapi.exceptions import IdentityConstraintException, \
     ModelConstraintException, TopicInUseException
 
+from bulk_utils import bulk_add_item_identifiers
 from construct import Construct
 from construct_fields import ConstructFields
+from events import IdentifierAdded, IdentifierRemoved, TopicTypeAdded, \
+    TopicTypeRemoved
+from identity_cache import ITEM_IDENTIFIER, SUBJECT_IDENTIFIER, \
+    SUBJECT_LOCATOR
 from item_identifier import ItemIdentifier
 from locator import Locator
 from name import Name
 from subject_identifier import SubjectIdentifier
 from subject_locator import SubjectLocator
+from tmapi_feature import get_feature
 from occurrence import Occurrence
-from merge_utils import handle_existing_construct, \
-    move_role_characteristics, move_variants
-from signature import generate_association_signature, \
-    generate_name_signature, generate_occurrence_signature
+from merge_utils import merge_topics
 
 
 class Topic (Construct, ConstructFields):
@@ -61,16 +64,16 @@ class Topic (Construct, ConstructFields):
                 self, 'The item identifier may not be None')
         address = item_identifier.to_external_form()
         try:
-            ii = ItemIdentifier.objects.get(address=address,
-                                            containing_topic_map=self.topic_map)
+            ii = ItemIdentifier.objects.select_related('identifier').get(
+                address=address, containing_topic_map=self.topic_map)
             construct = ii.get_construct()
             if construct == self:
                 return
             if not isinstance(construct, Topic):
                 raise IdentityConstraintException(
                     self, construct, item_identifier, 'This item identifier is already associated with another non-Topic construct')
-            if self.topic_map.topic_map_system.get_feature(
-                AUTOMERGE_FEATURE_STRING):
+            if get_feature(self.topic_map.topic_map_system_id,
+                           AUTOMERGE_FEATURE_STRING):
                 self.merge_in(construct)
             else:
                 raise IdentityConstraintException(
@@ -83,8 +86,8 @@ class Topic (Construct, ConstructFields):
                     subject_identifiers__address=address)
                 if topic == self:
                     self._add_item_identifier(address)
-                elif self.topic_map.topic_map_system.get_feature(
-                    AUTOMERGE_FEATURE_STRING):
+                elif get_feature(self.topic_map.topic_map_system_id,
+                                 AUTOMERGE_FEATURE_STRING):
                     self.merge_in(topic)
                 else:
                     raise IdentityConstraintException(
@@ -104,9 +107,59 @@ class Topic (Construct, ConstructFields):
 
         """
         ii = ItemIdentifier(address=address,
-                            containing_topic_map=self.topic_map)
+                            containing_topic_map=self.topic_map,
+                            identifier_id=self.identifier_id)
         ii.save()
         self.item_identifiers.add(ii)
+        self._discard_identity(ITEM_IDENTIFIER, address)
+        self._send_event(IdentifierAdded, ITEM_IDENTIFIER, address)
+
+    def add_item_identifiers (self, item_identifiers):
+        """Adds item identifiers to this topic.
+
+        This is equivalent to calling `add_item_identifier()` for each
+        locator in `item_identifiers`, but the existing identifiers
+        are looked up, and the new item identifiers created, with bulk
+        queries. Each topic that must be merged into this topic is
+        merged once. If any identity constraint would be violated, no
+        changes are made.
+
+        :param item_identifiers: the item identifiers to be added
+        :type item_identifiers: list of `Locator`s
+
+        """
+        locators = self._get_locators(item_identifiers,
+                                      'The item identifier may not be None')
+        by_subject_identifier, by_item_identifier = \
+            self._get_identifier_matches(locators.keys())
+        new_addresses = []
+        merge_ids = []
+        for address, locator in locators.items():
+            if address in by_item_identifier:
+                topic_id = by_item_identifier[address]
+                if topic_id is None:
+                    construct = ItemIdentifier.objects.get(
+                        address=address,
+                        containing_topic_map=self.topic_map).get_construct()
+                    raise IdentityConstraintException(
+                        self, construct, locator, 'This item identifier is already associated with another non-Topic construct')
+                if topic_id != self.id:
+                    merge_ids.append((topic_id, locator))
+            elif address in by_subject_identifier:
+                topic_id = by_subject_identifier[address]
+                if topic_id == self.id:
+                    new_addresses.append(address)
+                else:
+                    merge_ids.append((topic_id, locator))
+            else:
+                new_addresses.append(address)
+        self._check_automerge(merge_ids, 'Another topic has the same identifier and automerge is disabled')
+        bulk_add_item_identifiers(self.topic_map, Topic, [
+                (self.id, address) for address in new_addresses])
+        for address in new_addresses:
+            self._discard_identity(ITEM_IDENTIFIER, address)
+            self._send_event(IdentifierAdded, ITEM_IDENTIFIER, address)
+        self._merge_in_topics(merge_ids)
 
     def add_subject_identifier (self, subject_identifier):
         """Adds a subject identifier to this topic.
@@ -137,8 +190,8 @@ class Topic (Construct, ConstructFields):
                 if not SubjectIdentifier.objects.filter(topic=self,
                                                         address=address):
                     self._add_subject_identifier(address)
-            elif self.topic_map.topic_map_system.get_feature(
-                AUTOMERGE_FEATURE_STRING):
+            elif get_feature(self.topic_map.topic_map_system_id,
+                             AUTOMERGE_FEATURE_STRING):
                 self.merge_in(topic)
             else:
                 raise IdentityConstraintException(
@@ -161,6 +214,50 @@ class Topic (Construct, ConstructFields):
                                containing_topic_map=self.topic_map)
         si.save()
         self.subject_identifiers.add(si)
+        self._discard_identity(SUBJECT_IDENTIFIER, address)
+        self._send_event(IdentifierAdded, SUBJECT_IDENTIFIER, address)
+
+    def add_subject_identifiers (self, subject_identifiers):
+        """Adds subject identifiers to this topic.
+
+        This is equivalent to calling `add_subject_identifier()` for
+        each locator in `subject_identifiers`, but the existing
+        identifiers are looked up, and the new subject identifiers
+        created, with bulk queries. Each topic that must be merged
+        into this topic is merged once. If any identity constraint
+        would be violated, no changes are made.
+
+        :param subject_identifiers: the subject identifiers to be added
+        :type subject_identifiers: list of `Locator`s
+
+        """
+        locators = self._get_locators(
+            subject_identifiers, 'The subject identifier may not be None')
+        by_subject_identifier, by_item_identifier = \
+            self._get_identifier_matches(locators.keys())
+        new_addresses = []
+        merge_ids = []
+        for address, locator in locators.items():
+            topic_id = by_subject_identifier.get(address)
+            if topic_id is None:
+                # Item identifiers of other kinds of construct do not
+                # prevent the subject identifier being added.
+                topic_id = by_item_identifier.get(address)
+                if topic_id == self.id:
+                    topic_id = None
+            if topic_id is None:
+                new_addresses.append(address)
+            elif topic_id != self.id:
+                merge_ids.append((topic_id, locator))
+        self._check_automerge(merge_ids, 'Another topic has the same subject/item identifier and automerge is disabled')
+        SubjectIdentifier.objects.bulk_create(
+            [SubjectIdentifier(topic=self, address=address,
+                               containing_topic_map=self.topic_map)
+             for address in new_addresses], batch_size=BULK_BATCH_SIZE)
+        for address in new_addresses:
+            self._discard_identity(SUBJECT_IDENTIFIER, address)
+            self._send_event(IdentifierAdded, SUBJECT_IDENTIFIER, address)
+        self._merge_in_topics(merge_ids)
 
     def add_subject_locator (self, subject_locator):
         """Adds a subject locator to this topic.
@@ -183,8 +280,8 @@ class Topic (Construct, ConstructFields):
                 subject_locators__address=address)
             if topic == self:
                 return
-            elif self.topic_map.topic_map_system.get_feature(
-                AUTOMERGE_FEATURE_STRING):
+            elif get_feature(self.topic_map.topic_map_system_id,
+                             AUTOMERGE_FEATURE_STRING):
                 self.merge_in(topic)
             else:
                 raise IdentityConstraintException(
@@ -194,6 +291,8 @@ class Topic (Construct, ConstructFields):
                                 containing_topic_map=self.topic_map)
             sl.save()
             self.subject_locators.add(sl)
+            self._discard_identity(SUBJECT_LOCATOR, address)
+            self._send_event(IdentifierAdded, SUBJECT_LOCATOR, address)
 
     def add_type (self, type):
         """Adds a type to this topic.
@@ -208,6 +307,7 @@ class Topic (Construct, ConstructFields):
             raise ModelConstraintException(
                 self, 'The type is not from the same topic map')
         self.types.add(type)
+        self._send_event(TopicTypeAdded, type.id)
 
     def create_name (self, value, name_type=None, scope=None, proxy=Name):
         """Creates a `Name` for this topic with the specified `value`,
@@ -242,6 +342,7 @@ class Topic (Construct, ConstructFields):
         name = proxy(topic=self, value=value, topic_map=self.topic_map,
                     type=name_type)
         name.save()
+        theme_ids = []
         if scope is not None:
             if type(scope) not in (type([]), type(())):
                 scope = [scope]
@@ -250,6 +351,9 @@ class Topic (Construct, ConstructFields):
                     raise ModelConstraintException(
                         self, 'The theme is not from the same topic map')
                 name.scope.add(theme)
+            theme_ids = [theme.id for theme in scope]
+            name._update_signature(theme_ids)
+        name._send_created_events(theme_ids)
         return name
 
     def create_occurrence (self, type, value, scope=None, datatype=None,
@@ -295,12 +399,16 @@ class Topic (Construct, ConstructFields):
                            datatype=datatype.to_external_form(),
                            topic=self, topic_map=self.topic_map)
         occurrence.save()
+        theme_ids = []
         if scope is not None:
             for theme in scope:
                 if self.topic_map != theme.topic_map:
                     raise ModelConstraintException(
                         self, 'The theme is not from the same topic map')
                 occurrence.scope.add(theme)
+            theme_ids = [theme.id for theme in scope]
+            occurrence._update_signature(theme_ids)
+        occurrence._send_created_events(theme_ids)
         return occurrence
 
     @models.permalink
@@ -458,59 +566,12 @@ class Topic (Construct, ConstructFields):
                 self, 'Both topics are being used as reifiers')
         if other_reified is not None:
             other_reified.set_reifier(self)
-        for topic_type in other.get_types():
-            self.add_type(topic_type)
-        for subject_identifier in other.get_subject_identifiers():
-            subject_identifier.topic = self
-            subject_identifier.save()
-        for subject_locator in other.get_subject_locators():
-            subject_locator.topic = self
-            subject_locator.save()
-        for item_identifier in other.get_item_identifiers():
-            other.item_identifiers.remove(item_identifier)
-            self.item_identifiers.add(item_identifier)
-        signatures = {}
-        for name in self.get_names():
-            signature = generate_name_signature(name)
-            signatures[signature] = name
-        for name in other.get_names():
-            signature = generate_name_signature(name)
-            existing = signatures.get(signature)
-            if existing is not None:
-                handle_existing_construct(name, existing)
-                move_variants(name, existing)
-                name.remove()
-            else:
-                name.topic = self
-                name.save()
-        signatures = {}
-        for occurrence in self.get_occurrences():
-            signature = generate_occurrence_signature(occurrence)
-            signatures[signature] = occurrence
-        for occurrence in other.get_occurrences():
-            signature = generate_occurrence_signature(occurrence)
-            existing = signatures.get(signature)
-            if existing is not None:
-                handle_existing_construct(occurrence, existing)
-                occurrence.remove()
-            else:
-                occurrence.topic = self
-                occurrence.save()
-        signatures = {}
-        for role in self.get_roles_played():
-            parent = role.get_parent()
-            signature = generate_association_signature(parent)
-            signatures[signature] = parent
-        for role in other.get_roles_played():
-            role.set_player(self)
-            parent = role.get_parent()
-            signature = generate_association_signature(parent)
-            existing = signatures.get(signature)
-            if existing is not None:
-                handle_existing_construct(parent, existing)
-                move_role_characteristics(parent, existing)
-                parent.remove()
+        cache = self._get_identity_cache()
+        if cache is not None:
+            cache.discard_construct(other)
+        reifiers = merge_topics(other, self)
         other.remove()
+        merge_reifiers(reifiers)
 
     def remove (self):
         """Removes this topic from the containing `TopicMap` instance.
@@ -521,14 +582,9 @@ class Topic (Construct, ConstructFields):
         `Reifiable`.
 
         """
-        if self.roles.count():
-            raise TopicInUseException(self, 'This topic is used as a player')
-        if self.get_reified() is not None:
-            raise TopicInUseException(self, 'This topic is used as a reifier')
-        if self._has_scoped_constructs():
-            raise TopicInUseException(self, 'This topic is used as a theme')
-        if self._has_typed_constructs():
-            raise TopicInUseException(self, 'This topic is used as a type')
+        uses = get_topic_uses(Topic.objects.filter(pk=self.pk))
+        if uses:
+            raise TopicInUseException(self, uses[self.pk])
         super(Topic, self).remove()
 
     def remove_subject_identifier (self, subject_identifier):
@@ -539,12 +595,14 @@ class Topic (Construct, ConstructFields):
         :type subject_identifier: `Locator`
 
         """
+        address = subject_identifier.to_external_form()
         try:
-            si = SubjectIdentifier.objects.get(
-                topic=self, address=subject_identifier.to_external_form())
+            si = SubjectIdentifier.objects.get(topic=self, address=address)
             si.delete()
+            self._send_event(IdentifierRemoved, SUBJECT_IDENTIFIER, address)
         except SubjectIdentifier.DoesNotExist:
             pass
+        self._discard_identity(SUBJECT_IDENTIFIER, address)
 
     def remove_subject_locator (self, subject_locator):
         """Removes a subject locator from this topic.
@@ -554,12 +612,14 @@ class Topic (Construct, ConstructFields):
         :type subject_locator: `Locator`
 
         """
+        address = subject_locator.to_external_form()
         try:
-            sl = SubjectLocator.objects.get(
-                topic=self, address=subject_locator.to_external_form())
+            sl = SubjectLocator.objects.get(topic=self, address=address)
             sl.delete()
+            self._send_event(IdentifierRemoved, SUBJECT_LOCATOR, address)
         except SubjectLocator.DoesNotExist:
             pass
+        self._discard_identity(SUBJECT_LOCATOR, address)
 
     def remove_type (self, topic_type):
         """Removes a type from this topic.
@@ -569,32 +629,154 @@ class Topic (Construct, ConstructFields):
 
         """
         self.types.remove(topic_type)
+        self._send_event(TopicTypeRemoved, topic_type.id)
 
-    def _has_scoped_constructs (self):
-        """Returns True if there are constructs scoped by this topic.
+    def _check_automerge (self, merge_ids, message):
+        """Raises an `IdentityConstraintException` with `message` if
+        topics are to be merged into this topic and automerge is
+        disabled.
 
-        :rtype: Boolean
+        :param merge_ids: the database IDs of the topics to be merged
+          into this topic, and the locators that identify them
+        :type merge_ids: list of (integer, `Locator`) tuples
+        :param message: the detail message of the exception
+        :type message: string
 
         """
-        has_scoped_constructs = False
-        scopable_types = ('associations', 'names', 'occurrences', 'variants')
-        for scopable_type in scopable_types:
-            if getattr(self, 'scoped_' + scopable_type).count():
-                has_scoped_constructs = True
-                break
-        return has_scoped_constructs
+        if merge_ids and not get_feature(self.topic_map.topic_map_system_id,
+                                         AUTOMERGE_FEATURE_STRING):
+            topic_id, locator = merge_ids[0]
+            topic = self.topic_map.topic_constructs.get(pk=topic_id)
+            raise IdentityConstraintException(self, topic, locator, message)
+
+    def _get_identifier_matches (self, addresses):
+        """Returns the topics in this topic map that have a subject
+        identifier or item identifier with one of `addresses`.
+
+        :param addresses: external forms of locators
+        :type addresses: list of strings
+        :rtype: tuple of two dictionaries, mapping each matched
+          address to the database ID of the topic with that subject
+          identifier, and with that item identifier (None if the item
+          identifier is not a topic's)
 
-    def _has_typed_constructs (self):
-        """Returns True if there are constructs typed by this topic.
+        """
+        by_subject_identifier = {}
+        by_item_identifier = {}
+        for start in range(0, len(addresses), BULK_BATCH_SIZE):
+            batch = addresses[start:start+BULK_BATCH_SIZE]
+            by_subject_identifier.update(SubjectIdentifier.objects.filter(
+                    containing_topic_map=self.topic_map,
+                    address__in=batch).values_list('address', 'topic'))
+            by_item_identifier.update(ItemIdentifier.objects.filter(
+                    containing_topic_map=self.topic_map,
+                    address__in=batch).values_list('address', 'topic'))
+        return by_subject_identifier, by_item_identifier
+
+    def _get_locators (self, locators, message):
+        """Returns `locators` keyed by their external forms.
+
+        :param locators: the locators
+        :type locators: list of `Locator`s
+        :param message: the detail message of the exception raised if
+          one of `locators` is None
+        :type message: string
+        :rtype: dictionary
+
+        """
+        by_address = {}
+        for locator in locators:
+            if locator is None:
+                raise ModelConstraintException(self, message)
+            by_address[locator.to_external_form()] = locator
+        return by_address
 
-        :rtype: Boolean
+    def _merge_in_topics (self, merge_ids):
+        """Merges the topics with `merge_ids` into this topic, each
+        once.
+
+        :param merge_ids: the database IDs of the topics to be
+          merged, and the locators that identify them
+        :type merge_ids: list of (integer, `Locator`) tuples
 
         """
-        has_typed_constructs = False
-        typable_types = ('associations', 'names', 'occurrences', 'roles',
-                         'topics')
-        for typable_type in typable_types:
-            if getattr(self, 'typed_' + typable_type).count():
-                has_typed_constructs = True
-                break
-        return has_typed_constructs
+        topic_ids = set([topic_id for topic_id, locator in merge_ids])
+        for topic_id in sorted(topic_ids):
+            self.merge_in(self.topic_map.topic_constructs.get(pk=topic_id))
+
+
+# Reverse relations from a topic to the constructs that use it, grouped
+# by the kind of use, in the order in which the uses are reported.
+TOPIC_USES = (
+    ('This topic is used as a player', ('roles',)),
+    ('This topic is used as a reifier',
+     ('reified_association', 'reified_name', 'reified_occurrence',
+      'reified_role', 'reified_topicmap', 'reified_variant')),
+    ('This topic is used as a theme',
+     ('scoped_associations', 'scoped_names', 'scoped_occurrences',
+      'scoped_variants')),
+    ('This topic is used as a type',
+     ('typed_associations', 'typed_names', 'typed_occurrences',
+      'typed_roles', 'typed_topics')),
+    )
+
+
+def get_topic_uses (topics):
+    """Returns a dictionary mapping the database ID of each of
+    `topics` that is used as a player, reifier, theme or type to a
+    message describing that use.
+
+    A single query finds the topics that are in use; further queries
+    are made only if there are any, to determine how they are used.
+
+    :param topics: the topics to check
+    :type topics: `QuerySet` of `Topic`s
+    :rtype: dictionary
+
+    """
+    conditions = []
+    for message, relations in TOPIC_USES:
+        condition = models.Q()
+        for relation in relations:
+            field = getattr(Topic, relation).related.field
+            if isinstance(field, models.ManyToManyField):
+                # Select from the intermediary table alone, rather
+                # than joining it to the construct table.
+                uses = field.rel.through.objects.values(
+                    field.m2m_reverse_field_name())
+            else:
+                uses = field.model.objects.values(field.name)
+            condition |= models.Q(pk__in=uses)
+        conditions.append((message, condition))
+    used = topics.filter(reduce(lambda x, y: x | y, [
+                condition for message, condition in conditions]))
+    used_ids = set(used.values_list('id', flat=True))
+    uses = {}
+    for message, condition in conditions:
+        if len(uses) == len(used_ids):
+            break
+        for topic_id in topics.filter(condition).filter(
+            pk__in=used_ids).exclude(pk__in=uses.keys()).values_list(
+            'id', flat=True):
+            uses[topic_id] = message
+    return uses
+
+def merge_reifiers (reifiers):
+    """Merges each pair of topics in `reifiers`, the reifiers of
+    duplicate constructs, following the topics that have already been
+    merged away.
+
+    :param reifiers: (kept reifier ID, duplicate reifier ID) pairs
+    :type reifiers: list of tuples
+
+    """
+    merged = {}
+    for kept_id, duplicate_id in reifiers:
+        while kept_id in merged:
+            kept_id = merged[kept_id]
+        while duplicate_id in merged:
+            duplicate_id = merged[duplicate_id]
+        if kept_id != duplicate_id:
+            Topic.objects.get(pk=kept_id).merge_in(
+                Topic.objects.get(pk=duplicate_id))
+            merged[duplicate_id] = kept_id
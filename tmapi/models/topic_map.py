@@ -15,21 +15,26 @@
 from django.contrib.sites.models import Site
 from django.db import models
 
-from tmapi.exceptions import ModelConstraintException, \
-    UnsupportedOperationException
-from tmapi.indices.literal_index import LiteralIndex
-from tmapi.indices.scoped_index import ScopedIndex
-from tmapi.indices.type_instance_index import TypeInstanceIndex
+from tmapi.constants import BULK_BATCH_SIZE
+from tmapi.exceptions import ModelConstraintException, TopicInUseException
 
 from association import Association
+from bulk_utils import bulk_add_item_identifiers, bulk_create_constructs
 from construct_fields import BaseConstructFields
+from events import ConstructCreated, IdentifierAdded, TopicMapChanged
 from identifier import Identifier
+from identity_cache import ITEM_IDENTIFIER, SUBJECT_IDENTIFIER, \
+    SUBJECT_LOCATOR, get_identity_cache, remove_identity_cache, \
+    set_identity_cache_size
+from index_registry import get_index, notify_indices, remove_indices
 from item_identifier import ItemIdentifier
 from locator import Locator
+from merge_utils import remove_duplicates
 from reifiable import Reifiable
 from subject_identifier import SubjectIdentifier
 from subject_locator import SubjectLocator
-from topic import Topic
+from tmapi_feature import load_features
+from topic import Topic, get_topic_uses, merge_reifiers
 from copy_utils import copy
 
 
@@ -48,7 +53,11 @@ class TopicMap (BaseConstructFields, Reifiable):
 
     def __init__ (self, *args, **kwargs):
         super(TopicMap, self).__init__(*args, **kwargs)
-        self._indices = {}
+        # The features of the topic map system are needed whenever an
+        # identifier is added to a topic, so they are loaded with the
+        # topic map.
+        if self.topic_map_system_id is not None:
+            load_features(self.topic_map_system_id)
 
     def create_association (self, association_type, scope=None,
                             proxy=Association):
@@ -78,6 +87,10 @@ class TopicMap (BaseConstructFields, Reifiable):
                 raise ModelConstraintException(
                     self, 'The theme is not from this topic map')
             association.scope.add(topic)
+        theme_ids = [topic.id for topic in scope]
+        if theme_ids:
+            association._update_signature(theme_ids)
+        association._send_created_events(theme_ids)
         return association
 
     def create_empty_topic (self):
@@ -88,6 +101,7 @@ class TopicMap (BaseConstructFields, Reifiable):
         """
         topic = Topic(topic_map=self)
         topic.save()
+        topic._send_event(ConstructCreated, topic)
         return topic
     
     def create_locator (self, reference):
@@ -120,13 +134,45 @@ class TopicMap (BaseConstructFields, Reifiable):
         """
         topic = proxy(topic_map=self)
         topic.save()
-        address = 'http://%s/tmapi/iid/auto/%d' % \
-            (Site.objects.get_current().domain, topic.id)
-        ii = ItemIdentifier(address=address, containing_topic_map=self)
+        address = self._generate_item_identifier_address(
+            Site.objects.get_current().domain, topic.id)
+        ii = ItemIdentifier(address=address, containing_topic_map=self,
+                            identifier_id=topic.identifier_id)
         ii.save()
         topic.item_identifiers.add(ii)
+        topic._send_event(ConstructCreated, topic)
+        topic._send_event(IdentifierAdded, ITEM_IDENTIFIER, address)
         return topic
 
+    def create_topics (self, count, proxy=Topic):
+        """Returns a list of `count` new `Topic` instances, each with
+        an automatically generated item identifier.
+
+        This is equivalent to calling `create_topic()` `count` times,
+        but the topics, their identifiers and item identifiers are
+        created with bulk inserts, using a fixed number of queries
+        per `BULK_BATCH_SIZE` topics.
+
+        If another process creates constructs in this topic map at the
+        same time, a `TMAPIRuntimeException` is raised after some rows
+        have been inserted, and the caller must roll back its
+        transaction.
+
+        :param count: the number of topics to create
+        :type count: integer
+        :param proxy: Django proxy model class
+        :type proxy: class
+        :rtype: list of `Topic`s
+
+        """
+        domain = Site.objects.get_current().domain
+        topics = self._create_empty_topics(count, proxy)
+        bulk_add_item_identifiers(
+            self, Topic, [(topic.id, self._generate_item_identifier_address(
+                        domain, topic.id)) for topic in topics])
+        notify_indices(self.id, TopicMapChanged(self.id))
+        return topics
+
     def create_topic_by_item_identifier (self, item_identifier):
         """Returns a `Topic` instance with the specified item identifier.
 
@@ -151,6 +197,9 @@ class TopicMap (BaseConstructFields, Reifiable):
             raise ModelConstraintException(
                 self, 'The item identifier may not be None')
         reference = item_identifier.to_external_form()
+        topic = self._get_cached_construct(ITEM_IDENTIFIER, reference)
+        if isinstance(topic, Topic):
+            return topic
         try:
             topic = self.topic_constructs.get(
                 item_identifiers__address=reference)
@@ -161,10 +210,14 @@ class TopicMap (BaseConstructFields, Reifiable):
             except Topic.DoesNotExist:
                 topic = Topic(topic_map=self)
                 topic.save()
-            ii = ItemIdentifier(address=reference, containing_topic_map=self)
+                topic._send_event(ConstructCreated, topic)
+            ii = ItemIdentifier(address=reference, containing_topic_map=self,
+                                identifier_id=topic.identifier_id)
             ii.save()
             topic.item_identifiers.add(ii)
-        return topic            
+            topic._send_event(IdentifierAdded, ITEM_IDENTIFIER, reference)
+        self._cache_construct(ITEM_IDENTIFIER, reference, topic)
+        return topic
     
     def create_topic_by_subject_identifier (self, subject_identifier):
         """Returns a `Topic` instance with the specified subject identifier.
@@ -191,6 +244,9 @@ class TopicMap (BaseConstructFields, Reifiable):
             raise ModelConstraintException(
                 self, 'The subject identifier may not be None')
         reference = subject_identifier.to_external_form()
+        topic = self._get_cached_construct(SUBJECT_IDENTIFIER, reference)
+        if topic is not None:
+            return topic
         try:
             topic = self.topic_constructs.get(
                 subject_identifiers__address=reference)
@@ -201,10 +257,13 @@ class TopicMap (BaseConstructFields, Reifiable):
             except Topic.DoesNotExist:
                 topic = Topic(topic_map=self)
                 topic.save()
+                topic._send_event(ConstructCreated, topic)
             si = SubjectIdentifier(topic=topic, address=reference,
                                    containing_topic_map=self)
             si.save()
             topic.subject_identifiers.add(si)
+            topic._send_event(IdentifierAdded, SUBJECT_IDENTIFIER, reference)
+        self._cache_construct(SUBJECT_IDENTIFIER, reference, topic)
         return topic
 
     def create_topic_by_subject_locator (self, subject_locator):
@@ -223,18 +282,137 @@ class TopicMap (BaseConstructFields, Reifiable):
             raise ModelConstraintException(
                 self, 'The subject locator may not be None')
         reference = subject_locator.to_external_form()
+        topic = self._get_cached_construct(SUBJECT_LOCATOR, reference)
+        if topic is not None:
+            return topic
         try:
             topic = self.topic_constructs.get(
                 subject_locators__address=reference)
         except Topic.DoesNotExist:
             topic = Topic(topic_map=self)
             topic.save()
+            topic._send_event(ConstructCreated, topic)
             sl = SubjectLocator(topic=topic, address=reference,
                                 containing_topic_map=self)
             sl.save()
             topic.subject_locators.add(sl)
+            topic._send_event(IdentifierAdded, SUBJECT_LOCATOR, reference)
+        self._cache_construct(SUBJECT_LOCATOR, reference, topic)
         return topic
 
+    def create_topics_by_subject_identifier (self, subject_identifiers,
+                                             proxy=Topic):
+        """Returns a list of `Topic` instances, one for each of the
+        specified subject identifiers.
+
+        This is equivalent to calling
+        `create_topic_by_subject_identifier()` for each locator in
+        `subject_identifiers`, but the existing topics are looked up,
+        and the new topics and subject identifiers are created, with
+        bulk queries.
+
+        The returned list is in the same order as
+        `subject_identifiers`.
+
+        :param subject_identifiers: the subject identifiers the topics
+          should contain
+        :type subject_identifiers: list of `Locator`s
+        :param proxy: Django proxy model class
+        :type proxy: class
+        :rtype: list of `Topic`s
+
+        """
+        references = []
+        for subject_identifier in subject_identifiers:
+            if subject_identifier is None:
+                raise ModelConstraintException(
+                    self, 'The subject identifier may not be None')
+            references.append(subject_identifier.to_external_form())
+        # Map each reference to the id of the topic that has it as a
+        # subject identifier, then as an item identifier.
+        by_subject_identifier = {}
+        by_item_identifier = {}
+        unique_references = list(set(references))
+        for start in range(0, len(unique_references), BULK_BATCH_SIZE):
+            batch = unique_references[start:start+BULK_BATCH_SIZE]
+            by_subject_identifier.update(SubjectIdentifier.objects.filter(
+                    containing_topic_map=self, address__in=batch).values_list(
+                    'address', 'topic'))
+            by_item_identifier.update(self.topic_constructs.filter(
+                    item_identifiers__address__in=batch).values_list(
+                    'item_identifiers__address', 'id'))
+        missing = [reference for reference in unique_references
+                   if reference not in by_subject_identifier and
+                   reference not in by_item_identifier]
+        new_topics = self._create_empty_topics(len(missing), proxy)
+        new_subject_identifiers = {}
+        for reference, topic in zip(missing, new_topics):
+            new_subject_identifiers[reference] = topic.id
+        for reference, topic_id in by_item_identifier.items():
+            if reference not in by_subject_identifier:
+                new_subject_identifiers[reference] = topic_id
+        SubjectIdentifier.objects.bulk_create(
+            [SubjectIdentifier(topic_id=topic_id, address=reference,
+                               containing_topic_map=self)
+             for reference, topic_id in new_subject_identifiers.items()],
+            batch_size=BULK_BATCH_SIZE)
+        topic_ids = {}
+        topic_ids.update(new_subject_identifiers)
+        topic_ids.update(by_subject_identifier)
+        topics = dict([(topic.id, topic) for topic in new_topics])
+        existing_ids = list(set(topic_ids.values()) - set(topics.keys()))
+        for start in range(0, len(existing_ids), BULK_BATCH_SIZE):
+            batch = existing_ids[start:start+BULK_BATCH_SIZE]
+            topics.update(proxy.objects.in_bulk(batch))
+        if new_subject_identifiers:
+            notify_indices(self.id, TopicMapChanged(self.id))
+        return [topics[topic_ids[reference]] for reference in references]
+
+    def _cache_construct (self, kind, reference, construct):
+        """Caches `construct` as the construct identified by the
+        identifier of `kind` with `reference`, if the identity cache
+        is enabled and `construct` is not None.
+
+        :param kind: the kind of identifier
+        :type kind: string
+        :param reference: external form of a locator
+        :type reference: string
+        :param construct: the identified construct
+        :type construct: `Construct` or None
+
+        """
+        cache = self.get_identity_cache()
+        if cache is not None and construct is not None:
+            cache.set(kind, reference, construct)
+
+    def _create_empty_topics (self, count, proxy=Topic):
+        """Returns a list of `count` new `Topic` instances with no
+        other information, created with bulk inserts.
+
+        :param count: the number of topics to create
+        :type count: integer
+        :param proxy: Django proxy model class
+        :type proxy: class
+        :rtype: list of `Topic`s
+
+        """
+        topics = [proxy(topic_map=self) for i in range(count)]
+        bulk_create_constructs(self, topics)
+        return topics
+
+    def _generate_item_identifier_address (self, domain, topic_id):
+        """Returns the address of the automatically generated item
+        identifier for the topic with database ID `topic_id`.
+
+        :param domain: the domain of the current `Site`
+        :type domain: string
+        :param topic_id: the database ID of the topic
+        :type topic_id: integer
+        :rtype: string
+
+        """
+        return 'http://%s/tmapi/iid/auto/%d' % (domain, topic_id)
+
     def get_associations (self):
         """Returns all `Association`s contained in this topic map.
 
@@ -273,29 +451,72 @@ class TopicMap (BaseConstructFields, Reifiable):
 
         """
         address = item_identifier.to_external_form()
+        construct = self._get_cached_construct(ITEM_IDENTIFIER, address)
+        if construct is not None:
+            return construct
         try:
-            ii = ItemIdentifier.objects.get(address=address,
-                                            containing_topic_map=self)
+            ii = ItemIdentifier.objects.select_related('identifier').get(
+                address=address, containing_topic_map=self)
             construct = ii.get_construct()
         except ItemIdentifier.DoesNotExist:
             construct = None
+        self._cache_construct(ITEM_IDENTIFIER, address, construct)
         return construct
 
+    def _get_cached_construct (self, kind, reference):
+        """Returns the construct cached as identified by the
+        identifier of `kind` with `reference`, or None if it is not
+        cached or the identity cache is disabled.
+
+        :param kind: the kind of identifier
+        :type kind: string
+        :param reference: external form of a locator
+        :type reference: string
+        :rtype: `Construct` or None
+
+        """
+        cache = self.get_identity_cache()
+        if cache is None:
+            return None
+        return cache.get_construct(kind, reference)
+
+    def get_identity_cache (self):
+        """Returns the identity cache of this topic map, or None if
+        it is disabled.
+
+        The cache maps item identifiers, subject identifiers and
+        subject locators to the constructs they identify, and keeps
+        count of its `hits` and `misses`. Its size is set by
+        `set_identity_cache_size()`, or for all topic maps by the
+        TMAPI_IDENTITY_CACHE_SIZE setting, and it is disabled by
+        default.
+
+        :rtype: `IdentityCache` or None
+
+        """
+        return get_identity_cache(self.id)
+
+    def _get_identity_cache (self):
+        return self.get_identity_cache()
+
     def get_index (self, index_interface):
         """Returns the specified index.
 
+        `index_interface` may be one of the index interfaces, an
+        alternative implementation of one, such as
+        `MaterializedScopedIndex` or `MaterializedTypeInstanceIndex`,
+        or any other index class registered with
+        `tmapi.indices.register_index()`.
+
+        The index is created when it is first requested, and is
+        shared by all instances of this topic map in the process.
+
         :param index_interface: the index to return
         :type index_interface: class
         :rtype: `Index`
 
         """
-        if index_interface not in (LiteralIndex, ScopedIndex,
-                                   TypeInstanceIndex):
-            raise UnsupportedOperationException(
-                'This TMAPI implementation does not support that index')
-        if index_interface not in self._indices:
-            self._indices[index_interface] = index_interface(self)
-        return self._indices[index_interface]
+        return get_index(self, index_interface)
     
     def get_locator (self):
         """Returns the `Locator` that was used to create the topic map.
@@ -337,11 +558,15 @@ class TopicMap (BaseConstructFields, Reifiable):
 
         """
         reference = subject_identifier.to_external_form()
+        topic = self._get_cached_construct(SUBJECT_IDENTIFIER, reference)
+        if topic is not None:
+            return topic
         try:
             topic = self.topic_constructs.get(
                 subject_identifiers__address=reference)
         except Topic.DoesNotExist:
             topic = None
+        self._cache_construct(SUBJECT_IDENTIFIER, reference, topic)
         return topic
 
     def get_topic_by_subject_locator (self, subject_locator):
@@ -357,11 +582,15 @@ class TopicMap (BaseConstructFields, Reifiable):
 
         """
         reference = subject_locator.to_external_form()
+        topic = self._get_cached_construct(SUBJECT_LOCATOR, reference)
+        if topic is not None:
+            return topic
         try:
             topic = self.topic_constructs.get(
                 subject_locators__address=reference)
         except Topic.DoesNotExist:
             topic = None
+        self._cache_construct(SUBJECT_LOCATOR, reference, topic)
         return topic
     
     def get_topic_map (self):
@@ -398,8 +627,86 @@ class TopicMap (BaseConstructFields, Reifiable):
         copy(other, self)
 
     def remove (self):
+        remove_identity_cache(self.id)
+        remove_indices(self.id)
         self.delete()
 
+    def remove_duplicates (self):
+        """Removes the duplicate associations, roles, names, variants
+        and occurrences in this topic map, as defined by the Topic Maps
+        - Data Model (TMDM) merging rules.
+
+        This is useful after constructs have been created without
+        duplicate suppression. The topic map is processed in batches
+        of `BULK_BATCH_SIZE` topics.
+
+        Returns a dictionary mapping 'association', 'name',
+        'occurrence', 'role' and 'variant' to the number of duplicates
+        of that kind that were merged into another construct and
+        removed.
+
+        :rtype: dictionary
+
+        """
+        counts, reifiers = remove_duplicates(self)
+        merge_reifiers(reifiers)
+        return counts
+
+    def remove_topics (self, topics):
+        """Removes `topics` from this topic map.
+
+        This is equivalent to calling `Topic.remove()` on each of
+        `topics`, but the topics are checked and deleted with a fixed
+        number of queries per `BULK_BATCH_SIZE` topics.
+
+        If any of `topics` plays a `Role`, is used as the type of a
+        `Typed` construct or as a theme for a `Scoped` construct, or
+        reifies a `Reifiable`, a `TopicInUseException` is raised and
+        no topic is removed. This includes uses by constructs of the
+        other topics being removed.
+
+        :param topics: the topics to remove
+        :type topics: list of `Topic`s
+
+        """
+        topic_ids = []
+        for topic in topics:
+            if topic.topic_map_id != self.id:
+                raise ModelConstraintException(
+                    self, 'The topic is not from this topic map')
+            topic_ids.append(topic.id)
+        batches = [topic_ids[start:start+BULK_BATCH_SIZE] for start in
+                   range(0, len(topic_ids), BULK_BATCH_SIZE)]
+        uses = {}
+        for batch in batches:
+            uses.update(get_topic_uses(self.topic_constructs.filter(
+                        id__in=batch)))
+        for topic in topics:
+            if topic.id in uses:
+                raise TopicInUseException(topic, uses[topic.id])
+        cache = self.get_identity_cache()
+        if cache is not None:
+            cache.discard_constructs(topics)
+        for batch in batches:
+            # Item identifiers are joined to topics in a many to many
+            # relationship, so they need to be explicitly deleted.
+            ItemIdentifier.objects.filter(topic__in=batch).delete()
+            self.topic_constructs.filter(id__in=batch).delete()
+
+    def set_identity_cache_size (self, size):
+        """Sets the maximum number of entries in the identity cache
+        of this topic map.
+
+        The size applies to this topic map in the current process
+        only.
+
+        :param size: the maximum number of entries, 0 to disable the
+          cache, or None to use the TMAPI_IDENTITY_CACHE_SIZE setting
+        :type size: integer or None
+
+        """
+        set_identity_cache_size(self.id, size)
+
     def __eq__ (self, other):
         if isinstance(other, TopicMap) and self.id == other.id:
             return True
@@ -14,10 +14,9 @@
 
 from django.db import models
 
-from tmapi.exceptions import TopicMapExistsException, \
-    FeatureNotRecognizedException
+from tmapi.exceptions import TopicMapExistsException
 from locator import Locator
-from tmapi_feature import TMAPIFeature
+from tmapi_feature import get_feature
 from topic_map import TopicMap
 
 
@@ -73,11 +72,7 @@ class TopicMapSystem (models.Model):
         :rtype: Boolean
 
         """
-        try:
-            feature = self.features.get(feature_string=feature_name)
-        except TMAPIFeature.DoesNotExist:
-            raise FeatureNotRecognizedException
-        return feature.value
+        return get_feature(self.id, feature_name)
 
     def get_locators (self):
         """Returns all storage addresses of `TopicMap` instances known
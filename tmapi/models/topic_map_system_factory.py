@@ -19,7 +19,7 @@ from tmapi.constants import AUTOMERGE_FEATURE_STRING, \
 from tmapi.exceptions import FeatureNotRecognizedException, \
     FeatureNotSupportedException
 
-from tmapi_feature import TMAPIFeature
+from tmapi_feature import TMAPIFeature, load_features
 from topic_map_system import TopicMapSystem
 
 
@@ -127,6 +127,9 @@ class TopicMapSystemFactory (object):
             feature = TMAPIFeature(feature_string=feature_string,
                                    topic_map_system=tms, value=values[0])
             feature.save()
+        # Replace any features cached under the same ID by a system
+        # whose creation was rolled back.
+        load_features(tms.id, True)
         return tms
 
     def set_feature (self, feature_name, enable):
@@ -17,6 +17,7 @@ from django.db import models
 from tmapi.exceptions import ModelConstraintException
 
 from construct import Construct
+from events import TypeChanged
 
 
 class Typed (Construct, models.Model):
@@ -56,5 +57,7 @@ class Typed (Construct, models.Model):
         if self.topic_map != construct_type.topic_map:
             raise ModelConstraintException(
                 self, 'The type is not from the same topic map')
+        old_type_id = self.type_id
         self.type = construct_type
         self.save()
+        self._send_event(TypeChanged, old_type_id, construct_type.id)
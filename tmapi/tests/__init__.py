@@ -14,4 +14,5 @@
 
 from models import *
 from indices import *
+from io import *
 
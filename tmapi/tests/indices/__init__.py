@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from test_association_index import *
+from test_index_registry import *
 from test_literal_index import *
 from test_scoped_index import *
 from test_type_instance_index import *
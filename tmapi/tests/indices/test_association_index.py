@@ -0,0 +1,212 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing tests against the `AssociationIndex`."""
+
+from tmapi.exceptions import IllegalArgumentException
+from tmapi.indices.association_index import AssociationIndex
+from tmapi.indices.materialized_association_index import \
+    MaterializedAssociationIndex
+from tmapi.tests.models.tmapi_test_case import TMAPITestCase
+
+
+class AssociationIndexTest (TMAPITestCase):
+
+    index_class = AssociationIndex
+
+    def setUp (self):
+        super(AssociationIndexTest, self).setUp()
+        self._index = self.tm.get_index(self.index_class)
+        self._index.open()
+        # A small family: parent has two children, one of whom has a
+        # child of their own.
+        self.parenthood = self.create_topic()
+        self.parent_type = self.create_topic()
+        self.child_type = self.create_topic()
+        self.friendship = self.create_topic()
+        self.friend_type = self.create_topic()
+        self.parent = self.create_topic()
+        self.child1 = self.create_topic()
+        self.child2 = self.create_topic()
+        self.grandchild = self.create_topic()
+        self.parent_roles = {}
+        for parent, child in ((self.parent, self.child1),
+                              (self.parent, self.child2),
+                              (self.child1, self.grandchild)):
+            association = self.tm.create_association(self.parenthood)
+            self.parent_roles[child] = association.create_role(
+                self.parent_type, parent)
+            association.create_role(self.child_type, child)
+        self.friends = self.tm.create_association(self.friendship)
+        self.friend_role = self.friends.create_role(self.friend_type,
+                                                    self.child2)
+        self.friends.create_role(self.friend_type, self.grandchild)
+
+    def tearDown (self):
+        super(AssociationIndexTest, self).tearDown()
+        self._index.close()
+
+    def _update_index (self):
+        if not self._index.is_auto_updated():
+            self._index.reindex()
+
+    def test_counterparts (self):
+        self._update_index()
+        counterparts = self._index.get_counterparts(self.child1)
+        self.assertEqual(2, counterparts.count())
+        self.assertTrue(self.parent_roles[self.child1] in counterparts)
+        counterparts = self._index.get_counterparts(
+            self.child1, role_type=self.child_type)
+        self.assertEqual([self.parent_roles[self.child1]], list(counterparts))
+        self.assertEqual(0, self._index.get_counterparts(
+                self.child1, self.friendship).count())
+        self.assertEqual([self.friend_role], list(
+                self._index.get_counterparts(self.grandchild,
+                                             self.friendship)))
+        self.assertEqual(0, self._index.get_counterparts(
+                self.create_topic()).count())
+
+    def test_neighbours (self):
+        self._update_index()
+        neighbours = self._index.get_neighbours(self.parent)
+        self.assertEqual(2, neighbours.count())
+        self.assertTrue(self.child1 in neighbours)
+        self.assertTrue(self.child2 in neighbours)
+        neighbours = self._index.get_neighbours(
+            self.child1, self.parenthood, self.child_type, self.parent_type)
+        self.assertEqual([self.parent], list(neighbours))
+        neighbours = self._index.get_neighbours(
+            self.child1, self.parenthood, self.parent_type, self.child_type)
+        self.assertEqual([self.grandchild], list(neighbours))
+        neighbours = self._index.get_neighbours(
+            self.grandchild, other_role_type=self.friend_type)
+        self.assertEqual([self.child2], list(neighbours))
+        self.assertEqual(0, self._index.get_neighbours(
+                self.parent, role_type=self.child_type).count())
+
+    def test_path_topics (self):
+        self._update_index()
+        grandchildren = [(self.parenthood, self.parent_type, self.child_type),
+                         (self.parenthood, self.parent_type, self.child_type)]
+        self.assertEqual([self.grandchild], list(
+                self._index.get_path_topics(self.parent, grandchildren)))
+        self.assertEqual(0, self._index.get_path_topics(
+                self.child2, grandchildren).count())
+        friends_of_children = [(self.parenthood, self.parent_type, None),
+                               (self.friendship, None, None)]
+        self.assertEqual([self.grandchild], list(
+                self._index.get_path_topics(self.parent,
+                                            friends_of_children)))
+        self.assertRaises(IllegalArgumentException,
+                          self._index.get_path_topics, self.parent, [])
+        self.assertRaises(IllegalArgumentException,
+                          self._index.get_path_topics, self.parent,
+                          [(self.parenthood, None)])
+
+    def test_path_topics_adjacent_frontier (self):
+        x = self.create_topic()
+        a = self.create_topic()
+        b = self.create_topic()
+        for player, other in ((x, a), (x, b), (a, b)):
+            association = self.tm.create_association(self.friendship)
+            association.create_role(self.friend_type, player)
+            association.create_role(self.friend_type, other)
+        self._update_index()
+        step = (self.friendship, None, None)
+        self.assertEqual(set([x, a, b]), set(
+                self._index.get_path_topics(x, [step, step])))
+        self.assertEqual(set([x, b]), set(self._index.get_neighbours(a)))
+
+    def test_shortest_path (self):
+        self._update_index()
+        # Ties are broken in favour of the topic created first.
+        self.assertEqual([self.parent, self.child1, self.grandchild],
+                         self._index.get_shortest_path(self.parent,
+                                                       self.grandchild))
+        self.assertEqual(
+            [self.grandchild, self.child2],
+            self._index.get_shortest_path(self.grandchild, self.child2,
+                                          association_type=self.friendship))
+        self.assertEqual(None, self._index.get_shortest_path(
+                self.parent, self.grandchild,
+                association_type=self.friendship))
+        self.assertEqual([self.parent], self._index.get_shortest_path(
+                self.parent, self.parent))
+        self.assertEqual(None, self._index.get_shortest_path(
+                self.parent, self.grandchild, 1))
+        self.assertEqual(None, self._index.get_shortest_path(
+                self.parent, self.create_topic()))
+
+    def test_traverse (self):
+        self._update_index()
+        traversal = self._index.traverse(self.parent)
+        self.assertEqual([(self.child1, 1), (self.child2, 1)],
+                         [traversal.next(), traversal.next()])
+        self.assertEqual([(self.grandchild, 2)], list(traversal))
+        self.assertEqual([(self.child1, 1), (self.child2, 1)], list(
+                self._index.traverse(self.parent, 1)))
+        self.assertEqual([], list(self._index.traverse(self.parent, 0)))
+        self.assertEqual([(self.child2, 1)], list(self._index.traverse(
+                    self.grandchild, association_type=self.friendship)))
+        self.assertEqual([(self.child1, 1), (self.parent, 2)], list(
+                self._index.traverse(self.grandchild,
+                                     role_type=self.child_type,
+                                     other_role_type=self.parent_type)))
+
+    def test_update (self):
+        self._update_index()
+        topic = self.create_topic()
+        role = self.friends.create_role(self.friend_type, topic)
+        self._update_index()
+        self.assertEqual(2, self._index.get_neighbours(topic).count())
+        role.set_player(self.parent)
+        self._update_index()
+        self.assertEqual(0, self._index.get_neighbours(topic).count())
+        self.assertTrue(self.child2 in self._index.get_neighbours(
+                self.parent, self.friendship))
+        role.set_type(self.child_type)
+        self._update_index()
+        self.assertEqual([self.grandchild], list(self._index.get_neighbours(
+                    self.child2, other_role_type=self.friend_type)))
+        self.friends.set_type(self.parenthood)
+        self._update_index()
+        self.assertEqual(0, self._index.get_neighbours(
+                self.child2, self.friendship).count())
+        self.friends.remove()
+        self._update_index()
+        self.assertEqual([self.parent], list(self._index.get_neighbours(
+                    self.child2)))
+
+
+class MaterializedAssociationIndexTest (AssociationIndexTest):
+
+    index_class = MaterializedAssociationIndex
+
+    def test_incremental_update (self):
+        self.assertFalse(self._index.is_auto_updated())
+        with self.assertNumQueries(0):
+            self.assertEqual(2, self._index.get_neighbours(
+                    self.parent).count())
+            self.assertEqual(2, self._index.get_path_topics(
+                    self.parent, [(None, None, None)] * 2).count())
+        # The topics at each distance are fetched with one query.
+        with self.assertNumQueries(2):
+            self.assertEqual(3, len(list(self._index.traverse(self.parent))))
+        # Bulk changes cause the index to be reloaded.
+        topic, other = self.tm.create_topics(2)
+        self.friends.create_role(self.friend_type, other)
+        topic.merge_in(other)
+        self.assertTrue(topic in self._index.get_neighbours(self.child2))
+        self._index.close()
+        self.assertTrue(topic in self._index.get_neighbours(self.child2))
@@ -0,0 +1,128 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing tests of the registration, sharing and change
+notification of indices."""
+
+from tmapi.exceptions import UnsupportedOperationException
+from tmapi.indices import register_index, unregister_index
+from tmapi.indices.index import Index
+from tmapi.models import Name, Topic, TopicMap
+from tmapi.models.events import ConstructCreated, ConstructRemoved, \
+    IdentifierAdded, ThemeAdded, TopicMapChanged, TopicsMerged, TypeChanged, \
+    ValueChanged
+from tmapi.tests.models.tmapi_test_case import TMAPITestCase
+
+
+class IndexRegistryTest (TMAPITestCase):
+
+    def setUp (self):
+        super(IndexRegistryTest, self).setUp()
+        register_index(RecordingIndex)
+
+    def tearDown (self):
+        super(IndexRegistryTest, self).tearDown()
+        unregister_index(RecordingIndex)
+
+    def _get_events (self, index):
+        events = [(event.__class__, getattr(event, 'model', None),
+                   getattr(event, 'construct_id', None))
+                  for event in index.events]
+        index.events = []
+        return events
+
+    def test_registration (self):
+        index = self.tm.get_index(RecordingIndex)
+        self.assertTrue(isinstance(index, RecordingIndex))
+        self.assertTrue(isinstance(self.tm.get_index(RecordingSubindex),
+                                   RecordingSubindex))
+        unregister_index(RecordingIndex)
+        self.assertRaises(UnsupportedOperationException, self.tm.get_index,
+                          RecordingIndex)
+        self.assertRaises(UnsupportedOperationException, self.tm.get_index,
+                          RecordingSubindex)
+        register_index(RecordingIndex)
+        self.assertFalse(index is self.tm.get_index(RecordingIndex))
+
+    def test_sharing (self):
+        index = self.tm.get_index(RecordingIndex)
+        self.assertTrue(index is self.tm.get_index(RecordingIndex))
+        tm = TopicMap.objects.get(pk=self.tm.id)
+        self.assertTrue(index is tm.get_index(RecordingIndex))
+        other_tm = self.tms.create_topic_map(
+            self.create_locator('http://www.example.org/other/'))
+        self.assertFalse(index is other_tm.get_index(RecordingIndex))
+        self.tm.remove()
+        self.assertFalse(index is tm.get_index(RecordingIndex))
+
+    def test_notification (self):
+        index = self.tm.get_index(RecordingIndex)
+        topic = self.create_topic()
+        self.assertEqual([(ConstructCreated, Topic, topic.id),
+                          (IdentifierAdded, Topic, topic.id)],
+                         self._get_events(index))
+        theme = self.create_topic()
+        name = topic.create_name('Name')
+        self._get_events(index)
+        name.add_theme(theme)
+        event = index.events[0]
+        self.assertEqual([(ThemeAdded, Name, name.id)],
+                         self._get_events(index))
+        self.assertEqual(theme.id, event.theme_id)
+        name.set_value('Value')
+        event = index.events[0]
+        self.assertEqual([(ValueChanged, Name, name.id)],
+                         self._get_events(index))
+        self.assertEqual(('Name', 'Value'), (event.old_value, event.new_value))
+        old_type_id = name.type_id
+        name.set_type(theme)
+        event = index.events[0]
+        self.assertEqual([(TypeChanged, Name, name.id)],
+                         self._get_events(index))
+        self.assertEqual((old_type_id, theme.id),
+                         (event.old_value, event.new_value))
+        name_id = name.id
+        name.remove()
+        self.assertEqual([(ConstructRemoved, Name, name_id)],
+                         self._get_events(index))
+        topics = self.tm.create_topics(2)
+        self.assertEqual([(TopicMapChanged, None, None)],
+                         self._get_events(index))
+        source_id = topics[1].id
+        topics[0].merge_in(topics[1])
+        events = index.events
+        self.assertTrue((TopicsMerged, None, None) in self._get_events(index))
+        event = [event for event in events
+                 if isinstance(event, TopicsMerged)][0]
+        self.assertEqual((source_id, topics[0].id),
+                         (event.source_id, event.target_id))
+        other_tm = self.tms.create_topic_map(
+            self.create_locator('http://www.example.org/other/'))
+        other_tm.create_topic()
+        self.assertEqual([], self._get_events(index))
+
+
+class RecordingIndex (Index):
+
+    def __init__ (self, topic_map):
+        super(RecordingIndex, self).__init__(topic_map)
+        self.events = []
+
+    def notify (self, event):
+        self.events.append(event)
+
+
+class RecordingSubindex (RecordingIndex):
+
+    pass
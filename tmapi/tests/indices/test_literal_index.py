@@ -19,9 +19,17 @@ that come with the TMAPI 2.0 distribution (http://www.tmapi.org/2.0/).
 
 """
 
-from tmapi.constants import XSD_ANY_URI, XSD_STRING
+import datetime
+from decimal import Decimal
+from StringIO import StringIO
+
+from django.core.management import call_command
+
+from tmapi.constants import XSD_ANY_URI, XSD_DATE, XSD_DATE_TIME, \
+    XSD_DECIMAL, XSD_LONG, XSD_STRING
 from tmapi.exceptions import IllegalArgumentException
 from tmapi.indices.literal_index import LiteralIndex
+from tmapi.models import LiteralToken, Name, Occurrence
 from tmapi.tests.models.tmapi_test_case import TMAPITestCase
 
 
@@ -291,3 +299,201 @@ class LiteralIndexTest (TMAPITestCase):
     def test_variant_illegal_datatype (self):
         # This test is not applicable to this implementation.
         pass
+
+    def test_search_names (self):
+        topic = self.create_topic()
+        name = topic.create_name('Jamie Norrish')
+        name2 = topic.create_name('Norrish, Jamie')
+        name3 = topic.create_name('James Smith')
+        self._update_index()
+        self.assertEqual([name, name2],
+                         list(self._index.search_names('jamie')))
+        self.assertEqual([name2, name],
+                         list(self._index.search_names('NORRISH jamie')))
+        self.assertEqual([name2, name],
+                         list(self._index.search_names('norrish')))
+        self.assertEqual(0, self._index.search_names('jamie smith').count())
+        self.assertEqual(0, self._index.search_names('jam').count())
+        self.assertEqual([name3, name, name2], list(
+                self._index.search_names('jam', prefix=True)))
+        self.assertEqual([name, name2], list(
+                self._index.search_names('jamie n', prefix=True)))
+        self.assertEqual([name, name2], list(
+                self._index.search_names('jam', prefix=True, offset=1)))
+        self.assertEqual([name], list(self._index.search_names(
+                    'jam', prefix=True, offset=1, limit=1)))
+        self.assertEqual(0, self._index.search_names(' ,').count())
+        name3.set_value('Jamie Smith')
+        self._update_index()
+        self.assertEqual([name3], list(
+                self._index.search_names('jamie smith')))
+        self.assertEqual(0, self._index.search_names('james').count())
+        name.remove()
+        self._update_index()
+        self.assertEqual([name3, name2],
+                         list(self._index.search_names('jamie')))
+        self.assertRaises(IllegalArgumentException, self._index.search_names,
+                          None)
+
+    def test_search_occurrences (self):
+        topic = self.create_topic()
+        type = self.create_topic()
+        occurrence = topic.create_occurrence(type, 'A topic map engine')
+        uri = topic.create_occurrence(type, self.create_locator(
+                'http://www.example.org/topic/map'))
+        self._update_index()
+        self.assertEqual([occurrence], list(
+                self._index.search_occurrences('topic map')))
+        self.assertEqual([uri], list(self._index.search_occurrences(
+                    'topic map', self._XSD_ANY_URI)))
+        self.assertEqual([occurrence], list(
+                self._index.search_occurrences('eng', prefix=True)))
+        occurrence.set_value('A topic map store')
+        self._update_index()
+        self.assertEqual(0, self._index.search_occurrences('engine').count())
+        self.assertEqual([occurrence], list(
+                self._index.search_occurrences('store')))
+
+    def test_search_variants (self):
+        theme = self.create_topic()
+        variant = self.create_name().create_variant('Norrish, Jamie', theme)
+        self._update_index()
+        self.assertEqual([variant], list(
+                self._index.search_variants('jamie norrish')))
+        self.assertEqual(0, self._index.search_variants(
+                'jamie', self._XSD_ANY_URI).count())
+        variant.remove()
+        self._update_index()
+        self.assertEqual(0, self._index.search_variants('jamie').count())
+
+    def test_in_range_illegal (self):
+        self.assertRaises(IllegalArgumentException,
+                          self._index.get_occurrences_in_range)
+        self.assertRaises(IllegalArgumentException,
+                          self._index.get_occurrences_in_range, 1,
+                          datetime.date(2011, 1, 1))
+        self.assertRaises(IllegalArgumentException,
+                          self._index.get_variants_in_range, '1')
+
+    def test_occurrences_in_range (self):
+        population = self.create_topic()
+        area = self.create_topic()
+        topic = self.create_topic()
+        small = topic.create_occurrence(population, 1000)
+        large = topic.create_occurrence(population, 4000000)
+        decimal = topic.create_occurrence(
+            population, '1000000.5', datatype=self.create_locator(XSD_DECIMAL))
+        string = topic.create_occurrence(population, '5000000')
+        area_occurrence = topic.create_occurrence(area, 268021.0)
+        self._update_index()
+        self.assertEqual([decimal, large], list(
+                self._index.get_occurrences_in_range(
+                    1e6, occurrence_type=population, include_lower=False)))
+        self.assertEqual([small], list(self._index.get_occurrences_in_range(
+                    upper=1e6, occurrence_type=population)))
+        self.assertEqual([small, area_occurrence], list(
+                self._index.get_occurrences_in_range(upper=1e6)))
+        self.assertEqual([small], list(self._index.get_occurrences_in_range(
+                    1000, 1000)))
+        self.assertEqual(0, self._index.get_occurrences_in_range(
+                1000, 1000, include_upper=False).count())
+        large.set_value(10)
+        string.set_value(20)
+        self._update_index()
+        self.assertEqual([large, string, small], list(
+                self._index.get_occurrences_in_range(
+                    upper=1e6, occurrence_type=population)))
+
+    def test_occurrences_in_range_exact (self):
+        topic = self.create_topic()
+        long_type = self.create_topic()
+        long_datatype = self.create_locator(XSD_LONG)
+        lower = topic.create_occurrence(long_type, str(2**53),
+                                        datatype=long_datatype)
+        upper = topic.create_occurrence(long_type, str(2**53 + 1),
+                                        datatype=long_datatype)
+        fraction = topic.create_occurrence(
+            self.create_topic(), '0.10000000000000000001',
+            datatype=self.create_locator(XSD_DECIMAL))
+        self._update_index()
+        self.assertEqual([upper], list(self._index.get_occurrences_in_range(
+                    2**53 + 1)))
+        self.assertEqual([lower], list(self._index.get_occurrences_in_range(
+                    2**53, upper=2**53)))
+        self.assertEqual([lower], list(self._index.get_occurrences_in_range(
+                    2**53, 2**53 + 1, include_upper=False)))
+        self.assertEqual([upper], list(self._index.get_occurrences_in_range(
+                    2**53, include_lower=False)))
+        self.assertEqual([fraction], list(
+                self._index.get_occurrences_in_range(
+                    Decimal('0.1'), 1, include_lower=False)))
+        self.assertEqual(0, self._index.get_occurrences_in_range(
+                upper=Decimal('0.1')).count())
+
+    def test_occurrences_in_range_dates (self):
+        type = self.create_topic()
+        topic = self.create_topic()
+        date = topic.create_occurrence(type, '2011-03-01',
+                                       datatype=self.create_locator(XSD_DATE))
+        date_time = topic.create_occurrence(
+            type, '2011-03-01T10:30:00+12:00',
+            datatype=self.create_locator(XSD_DATE_TIME))
+        invalid = topic.create_occurrence(type, '2011-02-30',
+                                          datatype=self.create_locator(XSD_DATE))
+        self._update_index()
+        self.assertEqual([date_time, date], list(
+                self._index.get_occurrences_in_range(
+                    datetime.date(2011, 2, 28), datetime.date(2011, 3, 1))))
+        self.assertEqual([date], list(self._index.get_occurrences_in_range(
+                    datetime.date(2011, 3, 1))))
+        self.assertEqual([date_time], list(
+                self._index.get_occurrences_in_range(
+                    upper=datetime.datetime(2011, 2, 28, 22, 30),
+                    include_upper=True)))
+        self.assertEqual(0, self._index.get_occurrences_in_range(
+                upper=datetime.datetime(2011, 2, 28, 22, 30),
+                include_upper=False).count())
+        self.assertTrue(invalid not in self._index.get_occurrences_in_range(
+                datetime.date(1, 1, 1)))
+
+    def test_variants_in_range (self):
+        theme = self.create_topic()
+        variant = self.create_name().create_variant(
+            '2.5', theme, self.create_locator(XSD_DECIMAL))
+        self.create_name().create_variant('2.5', theme)
+        self._update_index()
+        self.assertEqual([variant], list(self._index.get_variants_in_range(
+                    2, 3)))
+        self.assertEqual(0, self._index.get_variants_in_range(3).count())
+
+    def test_long_value (self):
+        value = 'Value ' * 2000
+        type = self.create_topic()
+        topic = self.create_topic()
+        name = topic.create_name(value)
+        occurrence = topic.create_occurrence(type, value)
+        topic.create_occurrence(type, value + '2')
+        self._update_index()
+        self.assertEqual([name], list(self._index.get_names(value)))
+        self.assertEqual([occurrence], list(
+                self._index.get_occurrences(value)))
+        self.assertEqual(0, self._index.get_occurrences(
+                value, self._XSD_ANY_URI).count())
+
+    def test_update_command (self):
+        name = self.create_topic().create_name('Jamie Norrish')
+        LiteralToken.objects.all().delete()
+        Name.objects.update(value_hash='')
+        occurrence = self.create_occurrence()
+        occurrence.set_value(5)
+        Occurrence.objects.update(numeric_value=None)
+        self._update_index()
+        self.assertEqual(0, self._index.search_names('jamie').count())
+        self.assertEqual(0, self._index.get_names('Jamie Norrish').count())
+        call_command('tmapi_update_tokens', stdout=StringIO())
+        self._update_index()
+        self.assertEqual([name], list(self._index.search_names('jamie')))
+        self.assertEqual([name], list(
+                self._index.get_names('Jamie Norrish')))
+        self.assertEqual([occurrence], list(
+                self._index.get_occurrences_in_range(5, 5)))
@@ -20,15 +20,18 @@ that come with the TMAPI 2.0 distribution (http://www.tmapi.org/2.0/).
 """
 
 from tmapi.exceptions import IllegalArgumentException
+from tmapi.indices.materialized_scoped_index import MaterializedScopedIndex
 from tmapi.indices.scoped_index import ScopedIndex
 from tmapi.tests.models.tmapi_test_case import TMAPITestCase
 
 
 class ScopedIndexTest (TMAPITestCase):
 
+    index_class = ScopedIndex
+
     def setUp (self):
         super(ScopedIndexTest, self).setUp()
-        self._index = self.tm.get_index(ScopedIndex)
+        self._index = self.tm.get_index(self.index_class)
         self._index.open()
 
     def tearDown (self):
@@ -328,6 +331,7 @@ class ScopedIndexTest (TMAPITestCase):
         self.assertTrue(scoped in self._index.get_variants(theme2))
         self.assertTrue(theme2 in self._index.get_variant_themes())
         scoped.remove_theme(theme2)
+        self._update_index()
         self.assertNotEqual(0, self._index.get_variant_themes().count())
         self.assertEqual(1, self._index.get_variant_themes().count())
         self.assertTrue(scoped in self._index.get_variants(theme))
@@ -461,3 +465,43 @@ class ScopedIndexTest (TMAPITestCase):
                 [theme, theme2, unused_theme], False))
         self.assertFalse(scoped in self._index.get_variants(
                 [theme, theme2, unused_theme], True))
+
+
+class MaterializedScopedIndexTest (ScopedIndexTest):
+
+    index_class = MaterializedScopedIndex
+
+    def test_incremental_update (self):
+        themes = [self.create_topic() for i in range(6)]
+        name = self.create_name()
+        for theme in themes[:5]:
+            name.add_theme(theme)
+        variant = name.create_variant('Variant', [themes[5]])
+        self.assertFalse(self._index.is_auto_updated())
+        with self.assertNumQueries(0):
+            self.assertTrue(name in self._index.get_names(themes[:5], True))
+            self.assertFalse(name in self._index.get_names(themes, True))
+            self.assertTrue(variant in self._index.get_variants(themes, True))
+            self.assertEqual(6, self._index.get_variant_themes().count())
+        self.assertEqual([name], list(self._index.get_names(themes[:5], True)))
+        name.remove_theme(themes[0])
+        with self.assertNumQueries(0):
+            self.assertFalse(name in self._index.get_names(themes[0]))
+            self.assertFalse(variant in self._index.get_variants(themes[0]))
+            self.assertTrue(variant in self._index.get_variants(themes[1]))
+        name.remove()
+        with self.assertNumQueries(0):
+            self.assertEqual(0, self._index.get_names(themes).count())
+            self.assertEqual(0, self._index.get_variants(themes).count())
+            self.assertEqual(0, self._index.get_variant_themes().count())
+        # Bulk changes cause the index to be reloaded.
+        topic, other = self.tm.create_topics(2)
+        occurrence = other.create_occurrence(self.create_topic(), 'Value',
+                                             [themes[0]])
+        self.assertTrue(occurrence in self._index.get_occurrences(themes[0]))
+        association = self.create_association()
+        association.add_theme(topic)
+        topic.merge_in(other)
+        self.assertEqual(0, self._index.get_associations(other).count())
+        self.assertTrue(association in self._index.get_associations(topic))
+        self.assertTrue(occurrence in self._index.get_occurrences(themes[0]))
@@ -19,25 +19,86 @@ that come with the TMAPI 2.0 distribution (http://www.tmapi.org/2.0/).
 
 """
 
-from tmapi.constants import TYPE_INSTANCE_ASSOCIATIONS_FEATURE_STRING
+from tmapi.constants import SUBTYPE, SUPERTYPE, SUPERTYPE_SUBTYPE, \
+    TYPE_INSTANCE_ASSOCIATIONS_FEATURE_STRING
+from tmapi.indices.materialized_type_instance_index import \
+    MaterializedTypeInstanceIndex
 from tmapi.indices.type_instance_index import TypeInstanceIndex
 from tmapi.tests.models.tmapi_test_case import TMAPITestCase
 
 
 class TypeInstanceIndexTest (TMAPITestCase):
 
+    index_class = TypeInstanceIndex
+
     def setUp (self):
         super(TypeInstanceIndexTest, self).setUp()
-        self._index = self.tm.get_index(TypeInstanceIndex)
+        self._index = self.tm.get_index(self.index_class)
         self._index.open()
 
     def tearDown (self):
         super(TypeInstanceIndexTest, self).tearDown()
         self._index.close()
 
+    def _add_subtype (self, supertype, subtype):
+        association_type, supertype_role, subtype_role = [
+            self.tm.create_topic_by_subject_identifier(
+                self.create_locator(psi))
+            for psi in (SUPERTYPE_SUBTYPE, SUPERTYPE, SUBTYPE)]
+        association = self.tm.create_association(association_type)
+        association.create_role(supertype_role, supertype)
+        association.create_role(subtype_role, subtype)
+
     def _update_index (self):
         if not self._index.is_auto_updated():
             self._index.reindex()
+
+    def test_hierarchy (self):
+        agent, person, author = [self.create_topic() for i in range(3)]
+        self._add_subtype(agent, person)
+        self._add_subtype(person, author)
+        self._update_index()
+        self.assertEqual(set([person, author]),
+                         set(self._index.get_subtypes(agent)))
+        self.assertEqual([author], list(self._index.get_subtypes(person)))
+        self.assertEqual(0, self._index.get_subtypes(author).count())
+        self.assertEqual(set([agent, person]),
+                         set(self._index.get_supertypes(author)))
+        self.assertEqual(0, self._index.get_supertypes(agent).count())
+        # Cycles do not prevent the query from completing.
+        self._add_subtype(author, agent)
+        self.assertEqual(set([person, author]),
+                         set(self._index.get_subtypes(agent)))
+        # Other associations between the types are not followed.
+        other = self.create_topic()
+        association = self.tm.create_association(self.create_topic())
+        association.create_role(self.create_topic(), other)
+        association.create_role(self.create_topic(), person)
+        self.assertFalse(other in self._index.get_supertypes(person))
+        self.assertFalse(other in self._index.get_subtypes(person))
+
+    def test_transitive_topics (self):
+        agent, person, author, place = [self.create_topic()
+                                        for i in range(4)]
+        self._add_subtype(agent, person)
+        self._add_subtype(person, author)
+        jamie = self.create_topic()
+        jamie.add_type(author)
+        company = self.create_topic()
+        company.add_type(agent)
+        company.add_type(place)
+        self._update_index()
+        self.assertEqual(0, self._index.get_topics(person).count())
+        self.assertEqual([jamie], list(self._index.get_topics(
+                    person, transitive=True)))
+        self.assertEqual(set([jamie, company]), set(self._index.get_topics(
+                    agent, transitive=True)))
+        self.assertEqual(set([jamie, company]), set(self._index.get_topics(
+                    [person, place], transitive=True)))
+        self.assertEqual([company], list(self._index.get_topics(
+                    [agent, place], True, True)))
+        self.assertEqual(0, self._index.get_topics(
+                [person, place], True, True).count())
         
     def test_topic (self):
         self._update_index()
@@ -237,3 +298,38 @@ class TypeInstanceIndexTest (TMAPITestCase):
         self._update_index()
         self.assertEqual(0, self._index.get_names(type).count())
         self.assertEqual(0, self._index.get_name_types().count())
+
+
+class MaterializedTypeInstanceIndexTest (TypeInstanceIndexTest):
+
+    index_class = MaterializedTypeInstanceIndex
+
+    def test_incremental_update (self):
+        topic_type = self.tm.create_topic()
+        topic = self.tm.create_topic()
+        topic.add_type(topic_type)
+        self.assertFalse(self._index.is_auto_updated())
+        with self.assertNumQueries(0):
+            self.assertTrue(topic in self._index.get_topics(topic_type))
+            self.assertEqual(1, self._index.get_topic_types().count())
+        self.assertEqual([topic], list(self._index.get_topics(topic_type)))
+        name = topic.create_name('Name', topic_type)
+        with self.assertNumQueries(0):
+            self.assertTrue(name in self._index.get_names(topic_type))
+        name.set_type(topic)
+        with self.assertNumQueries(0):
+            self.assertFalse(name in self._index.get_names(topic_type))
+            self.assertTrue(name in self._index.get_names(topic))
+        name.remove()
+        topic.remove_type(topic_type)
+        with self.assertNumQueries(0):
+            self.assertEqual(0, self._index.get_topics(topic_type).count())
+            self.assertEqual(0, self._index.get_topic_types().count())
+            self.assertEqual(0, self._index.get_name_types().count())
+        # Bulk changes cause the index to be reloaded.
+        instance, other = self.tm.create_topics(2)
+        other.add_type(topic_type)
+        instance.merge_in(other)
+        self.assertEqual([instance], list(self._index.get_topics(topic_type)))
+        self._index.close()
+        self.assertEqual(1, self._index.get_topics(topic_type).count())
@@ -0,0 +1,75 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing tests for the JTM 1.1 writer."""
+
+import json
+from StringIO import StringIO
+
+from tmapi.constants import XSD_INT
+from tmapi.io import JTMWriter
+from tmapi.tests.models.tmapi_test_case import TMAPITestCase
+
+
+class JTMWriterTest (TMAPITestCase):
+
+    def _write (self, chunk_size=1000):
+        out = StringIO()
+        JTMWriter(self.tm, chunk_size=chunk_size).write(out)
+        return json.loads(out.getvalue())
+
+    def _ref (self, topic):
+        return 'ii:%s#id%d' % (self.DEFAULT_ADDRESS, topic.id)
+
+    def test_empty (self):
+        jtm = self._write()
+        self.assertEqual('1.1', jtm['version'])
+        self.assertEqual('topicmap', jtm['item_type'])
+        self.assertEqual([], jtm['topics'])
+        self.assertEqual([], jtm['associations'])
+
+    def test_write (self):
+        topic = self.create_topic()
+        topic.add_subject_identifier(
+            self.create_locator('http://www.example.org/topic'))
+        topic_type = self.create_topic()
+        topic.add_type(topic_type)
+        theme = self.create_topic()
+        name = topic.create_name('Name', scope=[theme])
+        name.create_variant('Variant', [self.create_topic()])
+        occurrence = topic.create_occurrence(self.create_topic(), 5)
+        reifier = self.create_topic()
+        occurrence.set_reifier(reifier)
+        association = self.create_association()
+        association.create_role(self.create_topic(), topic)
+        self.tm.set_reifier(self.create_topic())
+        jtm = self._write(chunk_size=2)
+        self.assertEqual(self.tm.get_topics().count(), len(jtm['topics']))
+        self.assertEqual(self._ref(self.tm.get_reifier()), jtm['reifier'])
+        topic_jtm = [t for t in jtm['topics'] if self._ref(topic)[3:] in
+                     t['item_identifiers']][0]
+        self.assertEqual(['http://www.example.org/topic'],
+                         topic_jtm['subject_identifiers'])
+        self.assertEqual([self._ref(topic_type)], topic_jtm['instance_of'])
+        name_jtm = topic_jtm['names'][0]
+        self.assertEqual('Name', name_jtm['value'])
+        self.assertEqual([self._ref(theme)], name_jtm['scope'])
+        self.assertEqual('Variant', name_jtm['variants'][0]['value'])
+        occurrence_jtm = topic_jtm['occurrences'][0]
+        self.assertEqual('5', occurrence_jtm['value'])
+        self.assertEqual(XSD_INT, occurrence_jtm['datatype'])
+        self.assertEqual(self._ref(reifier), occurrence_jtm['reifier'])
+        self.assertEqual(1, len(jtm['associations']))
+        role_jtm = jtm['associations'][0]['roles'][0]
+        self.assertEqual(self._ref(topic), role_jtm['player'])
@@ -0,0 +1,238 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing tests for the XTM 2.0 reader and writer."""
+
+from StringIO import StringIO
+
+from tmapi.constants import XSD_ANY_URI, XSD_INT
+from tmapi.exceptions import DeserializationException
+from tmapi.indices.literal_index import LiteralIndex
+from tmapi.io import XTMReader, XTMWriter
+from tmapi.models import Association, Name, Occurrence, Role, Variant
+from tmapi.models.signature import update_signature_hashes
+from tmapi.tests.models.tmapi_test_case import TMAPITestCase
+
+
+XTM = '''<topicMap xmlns="http://www.topicmaps.org/xtm/" version="2.0"
+  reifier="#map-reifier">
+  <itemIdentity href="http://www.example.org/map"/>
+  <topic id="person">
+    <subjectIdentifier href="http://www.example.org/person"/>
+  </topic>
+  <topic id="jamie">
+    <subjectIdentifier href="http://www.example.org/jamie"/>
+    <instanceOf><topicRef href="#person"/></instanceOf>
+    <name>
+      <scope><topicRef href="#formal"/></scope>
+      <value>Jamie</value>
+      <variant reifier="#variant-reifier">
+        <scope><topicRef href="#sort"/></scope>
+        <resourceData>norrish jamie</resourceData>
+      </variant>
+    </name>
+    <name><value>Jamie</value></name>
+    <occurrence>
+      <itemIdentity href="#age"/>
+      <type><topicRef href="#age-type"/></type>
+      <resourceData datatype="http://www.w3.org/2001/XMLSchema#int">40</resourceData>
+    </occurrence>
+    <occurrence>
+      <type><topicRef href="#homepage"/></type>
+      <resourceRef href="http://www.artefact.org.nz/"/>
+    </occurrence>
+  </topic>
+  <topic>
+    <subjectIdentifier href="http://www.example.org/jamie"/>
+    <name><value>Jamie</value></name>
+    <name><value>J. Norrish</value></name>
+  </topic>
+  <association reifier="#association-reifier">
+    <type><topicRef href="#employment"/></type>
+    <role>
+      <type><topicRef href="#employee"/></type>
+      <topicRef href="#jamie"/>
+    </role>
+    <role>
+      <type><topicRef href="#employer"/></type>
+      <subjectIdentifierRef href="http://www.example.org/artefact"/>
+    </role>
+  </association>
+  <association>
+    <type><topicRef href="#employment"/></type>
+    <role>
+      <type><topicRef href="#employer"/></type>
+      <topicRef href="#artefact"/>
+    </role>
+    <role>
+      <type><topicRef href="#employee"/></type>
+      <subjectIdentifierRef href="http://www.example.org/jamie"/>
+    </role>
+  </association>
+  <topic id="artefact">
+    <subjectIdentifier href="http://www.example.org/artefact"/>
+  </topic>
+</topicMap>'''
+
+
+class XTMReaderTest (TMAPITestCase):
+
+    BASE = 'http://www.example.org/map.xtm'
+
+    def _read (self, xtm=XTM, batch_size=1000):
+        XTMReader(self.tm, StringIO(xtm), self.BASE, batch_size).read()
+
+    def _get_topic (self, address):
+        return self.tm.get_topic_by_subject_identifier(
+            self.create_locator(address))
+
+    def _check_topic_map (self, iid_count=1):
+        # person, jamie, formal, sort, variant-reifier, age-type,
+        # homepage, default name type, association-reifier,
+        # employment, employee, employer, artefact, map-reifier
+        self.assertEqual(14, self.tm.get_topics().count())
+        jamie = self._get_topic('http://www.example.org/jamie')
+        person = self._get_topic('http://www.example.org/person')
+        self.assertEqual([person], list(jamie.get_types()))
+        self.assertEqual(iid_count, jamie.get_item_identifiers().count())
+        self.assertEqual(3, jamie.get_names().count())
+        self.assertEqual(2, jamie.get_names().filter(value='Jamie').count())
+        name = jamie.get_names().get(value='Jamie', scope=None)
+        self.assertEqual('Jamie', name.get_value())
+        scoped_name = jamie.get_names().exclude(scope=None).get()
+        self.assertEqual(1, scoped_name.get_variants().count())
+        variant = scoped_name.get_variants()[0]
+        self.assertEqual('norrish jamie', variant.get_value())
+        self.assertEqual(2, variant.get_scope().count())
+        self.assertNotEqual(None, variant.get_reifier())
+        self.assertEqual(2, jamie.get_occurrences().count())
+        age = self.tm.get_construct_by_item_identifier(
+            self.create_locator(self.BASE + '#age'))
+        self.assertEqual(40, age.get_value())
+        self.assertEqual(XSD_INT, age.datatype)
+        homepage = jamie.get_occurrences().get(datatype=XSD_ANY_URI)
+        self.assertEqual('http://www.artefact.org.nz/', homepage.get_value())
+        self.assertEqual(1, self.tm.get_associations().count())
+        association = self.tm.get_associations()[0]
+        self.assertEqual(2, association.get_roles().count())
+        self.assertNotEqual(None, association.get_reifier())
+        self.assertEqual(1, jamie.get_roles_played().count())
+        self.assertNotEqual(None, self.tm.get_reifier())
+        self.assertEqual(self.tm, self.tm.get_construct_by_item_identifier(
+                self.create_locator('http://www.example.org/map')))
+
+    def test_read (self):
+        self._read()
+        self._check_topic_map()
+        for model in (Association, Name, Occurrence, Variant):
+            self.assertEqual(0, update_signature_hashes(
+                    model, model.objects.filter(topic_map=self.tm)))
+        self.assertEqual(1, self.tm.get_index(LiteralIndex).search_variants(
+                'Norrish').count())
+
+    def test_read_batches (self):
+        self._read(batch_size=1)
+        self._check_topic_map()
+
+    def test_read_twice (self):
+        self._read()
+        self._read(batch_size=2)
+        self._check_topic_map()
+        self.assertEqual(6, Name.objects.filter(topic_map=self.tm).count() +
+                         Variant.objects.filter(topic_map=self.tm).count() +
+                         Occurrence.objects.filter(topic_map=self.tm).count())
+        self.assertEqual(2, Role.objects.filter(topic_map=self.tm).count())
+
+    def test_read_existing_topics (self):
+        jamie = self.tm.create_topic_by_subject_identifier(
+            self.create_locator('http://www.example.org/jamie'))
+        jamie.create_name('J. Norrish')
+        other = self.tm.create_topic_by_item_identifier(
+            self.create_locator(self.BASE + '#person'))
+        other.create_name('Person')
+        self._read()
+        self._check_topic_map()
+        self.assertEqual(other, self._get_topic('http://www.example.org/person'))
+        self.assertEqual(1, other.get_names().count())
+
+    def test_read_existing_association (self):
+        employment = self.tm.create_topic_by_item_identifier(
+            self.create_locator(self.BASE + '#employment'))
+        association = self.tm.create_association(employment)
+        association.create_role(
+            self.tm.create_topic_by_item_identifier(
+                self.create_locator(self.BASE + '#employee')),
+            self.tm.create_topic_by_subject_identifier(
+                self.create_locator('http://www.example.org/jamie')))
+        association.create_role(
+            self.tm.create_topic_by_item_identifier(
+                self.create_locator(self.BASE + '#employer')),
+            self.tm.create_topic_by_subject_identifier(
+                self.create_locator('http://www.example.org/artefact')))
+        self._read()
+        self._check_topic_map()
+        self.assertEqual([association], list(self.tm.get_associations()))
+
+    def test_read_duplicate_item_identifiers (self):
+        occurrence = '''<occurrence>
+      <itemIdentity href="#homepage-occurrence"/>
+      <type><topicRef href="#homepage"/></type>
+      <resourceRef href="http://www.artefact.org.nz/"/>
+    </occurrence>'''
+        self._read('<topicMap xmlns="http://www.topicmaps.org/xtm/" '
+                   'version="2.0"><topic id="jamie">%s%s</topic></topicMap>'
+                   % (occurrence, occurrence))
+        occurrences = Occurrence.objects.filter(topic_map=self.tm)
+        self.assertEqual(1, occurrences.count())
+        self.assertEqual(occurrences[0],
+                         self.tm.get_construct_by_item_identifier(
+                self.create_locator(self.BASE + '#homepage-occurrence')))
+
+    def test_read_markup (self):
+        self._read('''<topicMap xmlns="http://www.topicmaps.org/xtm/"
+  xmlns:x="http://www.w3.org/1999/xhtml" version="2.0">
+  <topic id="jamie">
+    <occurrence>
+      <type><topicRef href="#note"/></type>
+      <resourceData datatype="http://www.w3.org/2001/XMLSchema#anyType">A &amp; <h:b xmlns:h="http://www.w3.org/1999/xhtml">bold</h:b> and <x:i>italic<x:br/></x:i> note</resourceData>
+    </occurrence>
+  </topic>
+</topicMap>''')
+        occurrence = Occurrence.objects.get(topic_map=self.tm)
+        self.assertEqual(
+            u'A &amp; <h:b xmlns:h="http://www.w3.org/1999/xhtml">bold</h:b>'
+            u' and <x:i>italic<x:br/></x:i> note',
+            occurrence.get_value())
+
+    def test_write (self):
+        self._read()
+        self.tm.get_topics()[0].add_subject_locator(
+            self.create_locator('http://www.example.org/<&>'))
+        out = StringIO()
+        XTMWriter(self.tm, chunk_size=3).write(out)
+        self.tm = self.create_topic_map('http://www.example.org/copy')
+        self._read(out.getvalue())
+        # The writer adds an item identifier based on the topic's ID.
+        self._check_topic_map(2)
+        self.assertEqual(1, self.tm.get_topics().exclude(
+                subject_locators=None).count())
+
+    def test_read_illegal (self):
+        self.assertRaises(DeserializationException, self._read,
+                          '<topicMap version="2.0"/>')
+        self.assertRaises(
+            DeserializationException, self._read,
+            '<topicMap xmlns="http://www.topicmaps.org/xtm/" version="2.0">'
+            '<association><role><type><topicRef href="#t"/></type>'
+            '<topicRef href="#p"/></role></association></topicMap>')
@@ -15,6 +15,8 @@
 from test_association import *
 from test_construct import *
 from test_feature_strings import *
+from test_identifier import *
+from test_identity_cache import *
 from test_item_identifier_constraint import *
 from test_locator import *
 from test_name import *
@@ -24,6 +26,7 @@ from test_rfc3986 import *
 from test_role import *
 from test_same_topic_map import *
 from test_scoped import *
+from test_signature import *
 from test_topic_map_merge import *
 from test_topic_map_system import *
 from test_topic_map import *
@@ -21,9 +21,10 @@ that come with the TMAPI 2.0 distribution (http://www.tmapi.org/2.0/).
 
 from django.test import TestCase
 
-from tmapi.exceptions import TMAPIException, TMAPIRuntimeException, \
-    FeatureNotSupportedException
-from tmapi.models import TopicMapSystemFactory
+from tmapi.exceptions import FeatureNotRecognizedException, \
+    FeatureNotSupportedException, TMAPIException, TMAPIRuntimeException
+from tmapi.models import TopicMap, TopicMapSystem, TopicMapSystemFactory
+from tmapi.models.tmapi_feature import _features
 
 
 class FeatureStringsTest (TestCase):
@@ -78,3 +79,18 @@ class FeatureStringsTest (TestCase):
     def test_read_only (self):
         """Tests the feature string "readOnly"."""
         self._test_feature(self.READ_ONLY)
+
+    def test_cached_features (self):
+        """Tests that features are loaded once per system."""
+        tms = self.make_topic_map_system()
+        with self.assertNumQueries(0):
+            self.assertTrue(tms.get_feature(self.AUTOMERGE))
+            self.assertRaises(FeatureNotRecognizedException,
+                              tms.get_feature, self.FEATURE_BASE + 'unknown')
+        self.assertTrue(isinstance(_features[tms.id], frozenset))
+        tm = tms.create_topic_map('http://www.example.org/map/')
+        del _features[tms.id]
+        tm = TopicMap.objects.get(pk=tm.id)
+        tms = TopicMapSystem.objects.get(pk=tms.id)
+        with self.assertNumQueries(0):
+            self.assertTrue(tms.get_feature(self.AUTOMERGE))
@@ -0,0 +1,73 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing tests of construct identifiers."""
+
+from StringIO import StringIO
+
+from django.core.management import call_command
+
+from tmapi.models import Identifier, ItemIdentifier
+
+from tmapi_test_case import TMAPITestCase
+
+
+class IdentifierTest (TMAPITestCase):
+
+    def _create_constructs (self):
+        variant = self.create_variant()
+        constructs = [self.tm, self.create_role(), self.create_occurrence(),
+                      variant, variant.get_parent()]
+        constructs.append(constructs[1].get_parent())
+        constructs.append(constructs[1].get_player())
+        for index, construct in enumerate(constructs):
+            construct.add_item_identifier(self.create_locator(
+                    'http://www.example.org/%d' % index))
+        return constructs
+
+    def _check_constructs (self, constructs):
+        for index, construct in enumerate(constructs):
+            self.assertEqual(construct, self.tm.get_construct_by_id(
+                    construct.get_id()))
+            self.assertEqual(construct,
+                             self.tm.get_construct_by_item_identifier(
+                    self.create_locator('http://www.example.org/%d' % index)))
+
+    def test_construct_type (self):
+        constructs = self._create_constructs()
+        self._check_constructs(constructs)
+        self.assertEqual(0, Identifier.objects.filter(
+                construct_type='').count())
+        self.assertEqual(0, ItemIdentifier.objects.filter(
+                identifier=None).count())
+
+    def test_merge (self):
+        topic1 = self.create_topic()
+        topic2 = self.create_topic()
+        iid = self.create_locator('http://www.example.org/1')
+        topic2.add_item_identifier(iid)
+        topic1.merge_in(topic2)
+        self.assertEqual(topic1, self.tm.get_construct_by_item_identifier(iid))
+
+    def test_backfill (self):
+        constructs = self._create_constructs()
+        Identifier.objects.update(construct_type='')
+        ItemIdentifier.objects.update(identifier=None)
+        self._check_constructs(constructs)
+        call_command('tmapi_backfill_identifiers', stdout=StringIO())
+        self.assertEqual(0, Identifier.objects.filter(
+                construct_type='').count())
+        self.assertEqual(0, ItemIdentifier.objects.filter(
+                identifier=None).count())
+        self._check_constructs(constructs)
@@ -0,0 +1,129 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing tests of the identity resolution cache."""
+
+from tmapi_test_case import TMAPITestCase
+
+
+class IdentityCacheTest (TMAPITestCase):
+
+    def setUp (self):
+        super(IdentityCacheTest, self).setUp()
+        self.tm.set_identity_cache_size(2)
+        self.cache = self.tm.get_identity_cache()
+
+    def tearDown (self):
+        self.tm.remove()
+        super(IdentityCacheTest, self).tearDown()
+
+    def test_disabled (self):
+        self.tm.set_identity_cache_size(0)
+        self.assertEqual(None, self.tm.get_identity_cache())
+        sid = self.create_locator('http://www.example.org/1')
+        topic = self.tm.create_topic_by_subject_identifier(sid)
+        self.assertEqual(topic, self.tm.get_topic_by_subject_identifier(sid))
+
+    def test_hits (self):
+        sid = self.create_locator('http://www.example.org/1')
+        slo = self.create_locator('http://www.example.org/2')
+        topic = self.tm.create_topic_by_subject_identifier(sid)
+        topic.add_subject_locator(slo)
+        self.assertEqual((0, 1), (self.cache.hits, self.cache.misses))
+        self.assertEqual(topic, self.tm.get_topic_by_subject_identifier(sid))
+        self.assertEqual(topic, self.tm.create_topic_by_subject_identifier(
+                sid))
+        self.assertEqual((2, 1), (self.cache.hits, self.cache.misses))
+        self.assertEqual(topic, self.tm.get_topic_by_subject_locator(slo))
+        self.assertEqual(topic, self.tm.get_topic_by_subject_locator(slo))
+        self.assertEqual((3, 2), (self.cache.hits, self.cache.misses))
+        self.assertEqual(None, self.tm.get_topic_by_subject_identifier(
+                self.create_locator('http://www.example.org/3')))
+        self.assertEqual((3, 3), (self.cache.hits, self.cache.misses))
+
+    def test_least_recently_used (self):
+        topics = []
+        for i in range(3):
+            topics.append(self.tm.create_topic_by_subject_identifier(
+                    self.create_locator('http://www.example.org/%d' % i)))
+        self.assertEqual(2, len(self.cache))
+        self.tm.get_topic_by_subject_identifier(
+            self.create_locator('http://www.example.org/0'))
+        self.assertEqual(0, self.cache.hits)
+        self.tm.get_topic_by_subject_identifier(
+            self.create_locator('http://www.example.org/2'))
+        self.assertEqual(1, self.cache.hits)
+
+    def test_construct_by_item_identifier (self):
+        iid = self.create_locator('http://www.example.org/1')
+        name = self.create_name()
+        name.add_item_identifier(iid)
+        self.assertEqual(name, self.tm.get_construct_by_item_identifier(iid))
+        self.assertEqual(name, self.tm.get_construct_by_item_identifier(iid))
+        self.assertEqual(1, self.cache.hits)
+        name.remove_item_identifier(iid)
+        self.assertEqual(None, self.tm.get_construct_by_item_identifier(iid))
+        self.assertEqual(1, self.cache.hits)
+
+    def test_remove_identifiers (self):
+        sid = self.create_locator('http://www.example.org/1')
+        slo = self.create_locator('http://www.example.org/2')
+        topic = self.tm.create_topic_by_subject_identifier(sid)
+        topic.add_subject_locator(slo)
+        self.tm.get_topic_by_subject_locator(slo)
+        topic.remove_subject_identifier(sid)
+        topic.remove_subject_locator(slo)
+        self.assertEqual(0, len(self.cache))
+        self.assertEqual(None, self.tm.get_topic_by_subject_identifier(sid))
+        self.assertEqual(None, self.tm.get_topic_by_subject_locator(slo))
+
+    def test_merge (self):
+        sid1 = self.create_locator('http://www.example.org/1')
+        sid2 = self.create_locator('http://www.example.org/2')
+        topic1 = self.tm.create_topic_by_subject_identifier(sid1)
+        topic2 = self.tm.create_topic_by_subject_identifier(sid2)
+        topic1.merge_in(topic2)
+        self.assertEqual(topic1, self.tm.get_topic_by_subject_identifier(sid2))
+        self.assertEqual(topic1, self.tm.get_topic_by_subject_identifier(sid1))
+        self.assertEqual(1, self.cache.hits)
+
+    def test_remove (self):
+        sid = self.create_locator('http://www.example.org/1')
+        topic = self.tm.create_topic_by_subject_identifier(sid)
+        topic.remove()
+        self.assertEqual(0, len(self.cache))
+        self.assertEqual(None, self.tm.get_topic_by_subject_identifier(sid))
+
+    def test_discard_constructs (self):
+        self.tm.set_identity_cache_size(3)
+        self.cache = self.tm.get_identity_cache()
+        sid1 = self.create_locator('http://www.example.org/1')
+        sid2 = self.create_locator('http://www.example.org/2')
+        sid3 = self.create_locator('http://www.example.org/3')
+        topic1 = self.tm.create_topic_by_subject_identifier(sid1)
+        topic1.add_subject_identifier(sid2)
+        self.tm.get_topic_by_subject_identifier(sid2)
+        topic2 = self.tm.create_topic_by_subject_identifier(sid3)
+        self.assertEqual(3, len(self.cache))
+        self.cache.discard_construct(topic1)
+        self.assertEqual(1, len(self.cache))
+        self.assertEqual(topic2, self.tm.get_topic_by_subject_identifier(sid3))
+        self.assertEqual(1, self.cache.hits)
+        # Entries evicted as least recently used are no longer
+        # discarded with their construct.
+        for i in range(4, 7):
+            self.tm.create_topic_by_subject_identifier(
+                self.create_locator('http://www.example.org/%d' % i))
+        self.cache.discard_construct(topic2)
+        self.assertEqual(3, len(self.cache))
@@ -20,6 +20,8 @@ that come with the TMAPI 2.0 distribution (http://www.tmapi.org/2.0/).
 """
 
 from tmapi.exceptions import MalformedIRIException
+from tmapi.models import ItemIdentifier, Locator
+from tmapi.models import locator as locator_module
 
 from tmapi_test_case import TMAPITestCase
 
@@ -44,6 +46,68 @@ class LocatorTest (TMAPITestCase):
                          locator3.to_external_form())
         self.assertEqual(locator, locator3)
 
+    def test_immutable (self):
+        locator = Locator('http://www.example.org/')
+        self.assertRaises(AttributeError, setattr, locator, '_external',
+                          'http://www.example.org/other')
+        self.assertRaises(AttributeError, setattr, locator, 'other', None)
+        self.assertRaises(AttributeError, delattr, locator, '_reference')
+        self.assertFalse(hasattr(locator, '__dict__'))
+
+    def test_hashing (self):
+        locator = Locator('http://www.example.org/test%20me/')
+        other = Locator('http://www.example.org/test me/')
+        self.assertEqual(hash(locator), hash(other))
+        self.assertEqual(1, len(set([locator, other])))
+        mapping = {locator: 1}
+        self.assertEqual(1, mapping[other])
+        self.assertFalse(Locator('http://www.example.org/other') in mapping)
+
+    def test_forms_cache_bounded (self):
+        size = locator_module.LOCATOR_CACHE_SIZE
+        locator_module.LOCATOR_CACHE_SIZE = 2
+        try:
+            for i in range(5):
+                reference = 'http://www.example.org/bounded/%d' % i
+                self.assertEqual(reference,
+                                 Locator(reference).to_external_form())
+                self.assertTrue(len(locator_module._forms) <= 2)
+        finally:
+            locator_module.LOCATOR_CACHE_SIZE = size
+
+    def test_interning (self):
+        reference = 'http://www.example.org/test%20me/'
+        locator = self.tm.create_locator(reference)
+        self.assertTrue(locator is self.tms.create_locator(reference))
+        self.assertTrue(locator is Locator(reference))
+        other = Locator('http://www.example.org/test me/')
+        self.assertFalse(locator is other)
+        self.assertEqual(locator, other)
+        self.assertEqual(reference, locator.to_external_form())
+
+    def test_stored_forms (self):
+        reference = 'http://www.example.org/test%20me/'
+        topic = self.tm.create_topic_by_item_identifier(
+            self.tm.create_locator(reference))
+        identifier = ItemIdentifier.objects.get(pk=topic.item_identifiers.get(
+                address=reference).pk)
+        self.assertEqual(reference, identifier.to_external_form())
+        self.assertEqual('http://www.example.org/test me/',
+                         identifier.get_reference())
+        self.assertEqual(Locator(reference), identifier)
+
+    def test_lazy_forms (self):
+        reference = 'http://www.example.org/test%20me/'
+        topic = self.tm.create_topic_by_item_identifier(
+            self.tm.create_locator(reference))
+        identifier = ItemIdentifier.objects.get(pk=topic.item_identifiers.get(
+                address=reference).pk)
+        self.assertEqual(None, identifier._address)
+        self.assertEqual(reference, identifier.to_external_form())
+        identifier.address = 'http://www.example.org/other'
+        self.assertEqual('http://www.example.org/other',
+                         identifier.get_reference())
+
     def test_illegal_locator_addresses (self):
         illegal = ('', '#fragment')
         for address in illegal:
@@ -0,0 +1,158 @@
+# Copyright 2011 Jamie Norrish (jamie@artefact.org.nz)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing tests of the stored signature hashes."""
+
+from StringIO import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+
+from tmapi.models import Association, Name, Occurrence, Role, Variant
+from tmapi.models.signature import update_signature_hashes
+
+from tmapi_test_case import TMAPITestCase
+
+
+class SignatureTest (TMAPITestCase):
+
+    def _assert_current (self):
+        """Asserts that every stored signature hash is up to date."""
+        for model in (Association, Name, Occurrence, Variant):
+            self.assertEqual(0, update_signature_hashes(
+                    model, model.objects.all()))
+
+    def _capture_queries (self, function, *args):
+        """Calls `function` with `args`, returning the SQL of the
+        queries it made."""
+        connection.use_debug_cursor = True
+        start = len(connection.queries)
+        try:
+            function(*args)
+        finally:
+            connection.use_debug_cursor = None
+        return [query['sql'] for query in connection.queries[start:]]
+
+    def _get_signature (self, construct):
+        return construct._meta.concrete_model.objects.get(
+            pk=construct.pk).signature
+
+    def test_creation (self):
+        theme = self.create_topic()
+        topic = self.create_topic()
+        name = topic.create_name(u'Caf\xe9', scope=[theme])
+        name.create_variant('Variant', [self.create_topic()])
+        topic.create_occurrence(self.create_topic(), 1.5, [theme])
+        topic.create_occurrence(self.create_topic(), self.create_locator(
+                'http://www.example.org/'))
+        association = self.tm.create_association(self.create_topic(),
+                                                 [theme])
+        association.create_role(self.create_topic(), topic)
+        self._assert_current()
+
+    def test_changes (self):
+        theme = self.create_topic()
+        name = self.create_name()
+        association = self.create_association()
+        role = association.create_role(self.create_topic(), self.create_topic())
+        signatures = set([self._get_signature(name)])
+        name.add_theme(theme)
+        signatures.add(self._get_signature(name))
+        name.set_value('Other')
+        signatures.add(self._get_signature(name))
+        name.set_type(self.create_topic())
+        signatures.add(self._get_signature(name))
+        name.remove_theme(theme)
+        signatures.add(self._get_signature(name))
+        self.assertEqual(5, len(signatures))
+        signatures = set([self._get_signature(association)])
+        role.set_player(self.create_topic())
+        signatures.add(self._get_signature(association))
+        role.set_type(self.create_topic())
+        signatures.add(self._get_signature(association))
+        role.remove()
+        signatures.add(self._get_signature(association))
+        self.assertEqual(4, len(signatures))
+        self._assert_current()
+
+    def test_incremental (self):
+        association = self.create_association()
+        topics = [self.create_topic() for i in range(5)]
+        role_table = Role._meta.db_table
+        for topic in topics:
+            # The roles of the association are read once per role.
+            queries = [query for query in self._capture_queries(
+                    association.create_role, topic, topic)
+                       if query.startswith('SELECT') and role_table in query]
+            self.assertEqual(1, len(queries))
+        self._assert_current()
+        name = Name.objects.get(pk=self.create_name().pk)
+        name.add_theme(self.create_topic())
+        reifier = self.create_topic()
+        scope_table = Name.scope.through._meta.db_table
+        for query in self._capture_queries(name.set_reifier, reifier):
+            self.assertFalse(scope_table in query)
+        self._assert_current()
+
+    def test_other_instance (self):
+        """Tests that changes made through another instance of the
+        same construct are reflected in the stored hash."""
+        association = self.create_association()
+        role_type1 = self.create_topic()
+        role_type2 = self.create_topic()
+        player = self.create_topic()
+        association.create_role(role_type1, self.create_topic())
+        association.get_roles()[0].set_player(player)
+        association.create_role(role_type2, self.create_topic())
+        self._assert_current()
+        name = self.create_name()
+        Name.objects.get(pk=name.pk).add_theme(self.create_topic())
+        name.set_reifier(self.create_topic())
+        self._assert_current()
+        role = association.get_roles()[0]
+        Role.objects.get(pk=role.pk).set_player(self.create_topic())
+        role.set_reifier(self.create_topic())
+        self._assert_current()
+
+    def test_duplicates (self):
+        theme = self.create_topic()
+        name_type = self.create_topic()
+        topic = self.create_topic()
+        name1 = topic.create_name('Name', name_type, [theme])
+        name2 = topic.create_name('Name', name_type)
+        self.assertNotEqual(self._get_signature(name1),
+                            self._get_signature(name2))
+        name2.add_theme(theme)
+        self.assertEqual(self._get_signature(name1),
+                         self._get_signature(name2))
+
+    def test_merge (self):
+        topic1 = self.create_topic()
+        topic2 = self.create_topic()
+        name = self.create_topic().create_name('Name', scope=[topic2])
+        association = self.create_association()
+        association.create_role(self.create_topic(), topic2)
+        topic1.merge_in(topic2)
+        self.assertEqual([topic1], list(name.get_scope()))
+        self._assert_current()
+        name.add_theme(self.create_topic())
+        association.create_role(self.create_topic(), self.create_topic())
+        self._assert_current()
+
+    def test_update_command (self):
+        name = self.create_name()
+        Name.objects.filter(pk=name.pk).update(signature='')
+        call_command('tmapi_update_signatures', stdout=StringIO())
+        self.assertNotEqual('', self._get_signature(name))
+        self._assert_current()
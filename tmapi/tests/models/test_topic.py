@@ -19,7 +19,10 @@ that come with the TMAPI 2.0 distribution (http://www.tmapi.org/2.0/).
 
 """
 
-from tmapi.exceptions import ModelConstraintException
+from tmapi.constants import AUTOMERGE_FEATURE_STRING
+from tmapi.exceptions import IdentityConstraintException, \
+    ModelConstraintException
+from tmapi.models import TopicMapSystemFactory
 
 from tmapi_test_case import TMAPITestCase
 
@@ -65,6 +68,70 @@ class TopicTest (TMAPITestCase):
         self.assertEqual(1, topic.get_subject_identifiers().count())
         self.assertTrue(locator2 in topic.get_subject_identifiers())
 
+    def test_add_subject_identifiers (self):
+        locators = [self.create_locator('http://www.example.org/%d' % i)
+                    for i in range(4)]
+        topic = self.tm.create_topic_by_subject_identifier(locators[0])
+        topic.add_item_identifier(locators[1])
+        other = self.tm.create_topic_by_subject_identifier(locators[2])
+        name = self.create_name()
+        name.add_item_identifier(locators[3])
+        topic.add_subject_identifiers(locators)
+        self.assertEqual(4, topic.get_subject_identifiers().count())
+        for locator in locators:
+            self.assertTrue(locator in topic.get_subject_identifiers())
+        self.assertFalse(other in self.tm.get_topics())
+        self.assertRaises(ModelConstraintException,
+                          topic.add_subject_identifiers, [None])
+
+    def test_add_item_identifiers (self):
+        locators = [self.create_locator('http://www.example.org/%d' % i)
+                    for i in range(3)]
+        topic = self.create_topic()
+        other = self.create_topic()
+        other.add_item_identifier(locators[0])
+        name = self.create_name()
+        name.add_item_identifier(self.create_locator(
+                'http://www.example.org/name'))
+        topic.add_item_identifiers(locators[1:])
+        self.assertTrue(locators[1] in topic.get_item_identifiers())
+        self.assertTrue(locators[2] in topic.get_item_identifiers())
+        self.assertEqual(topic, self.tm.get_construct_by_item_identifier(
+                locators[2]))
+        topic.add_item_identifiers(locators)
+        # Each topic was created with an item identifier.
+        self.assertEqual(5, topic.get_item_identifiers().count())
+        self.assertTrue(locators[0] in topic.get_item_identifiers())
+        self.assertFalse(other in self.tm.get_topics())
+        self.assertRaises(
+            IdentityConstraintException, topic.add_item_identifiers,
+            [self.create_locator('http://www.example.org/new'),
+             self.create_locator('http://www.example.org/name')])
+        self.assertFalse(self.create_locator('http://www.example.org/new')
+                         in topic.get_item_identifiers())
+
+    def test_add_identifiers_without_automerge (self):
+        factory = TopicMapSystemFactory.new_instance()
+        factory.set_feature(AUTOMERGE_FEATURE_STRING, False)
+        try:
+            tm = factory.new_topic_map_system().create_topic_map(
+                'http://www.example.org/map/')
+        finally:
+            # Factory features are shared by all factories.
+            factory.set_feature(AUTOMERGE_FEATURE_STRING, True)
+        locators = [self.create_locator('http://www.example.org/%d' % i)
+                    for i in range(2)]
+        topic = tm.create_topic()
+        other = tm.create_topic_by_subject_identifier(locators[1])
+        self.assertRaises(IdentityConstraintException,
+                          topic.add_subject_identifiers, locators)
+        self.assertRaises(IdentityConstraintException,
+                          topic.add_item_identifiers, locators)
+        self.assertEqual(0, topic.get_subject_identifiers().count())
+        self.assertEqual(1, topic.get_item_identifiers().count())
+        self.assertEqual([locators[1]],
+                         list(other.get_subject_identifiers()))
+
     def test_subject_locators (self):
         locator1 = self.create_locator('http://www.example.org/1')
         locator2 = self.create_locator('http://www.example.org/2')
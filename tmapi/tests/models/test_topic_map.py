@@ -20,7 +20,9 @@ that come with the TMAPI 2.0 distribution (http://www.tmapi.org/2.0/).
 """
 
 from tmapi.exceptions import ModelConstraintException, \
-    UnsupportedOperationException
+    TopicInUseException, UnsupportedOperationException
+from tmapi.models import Identifier, ItemIdentifier, Name, Occurrence, \
+    Role, Topic, merge_utils
 
 from tmapi_test_case import TMAPITestCase
 
@@ -202,6 +204,194 @@ class TopicMapTest (TMAPITestCase):
         self.assertEqual(0, topic.get_subject_locators().count())
         self.assertEqual(topic, t)
 
+    def test_topics_creation_automagic_item_identifier (self):
+        self.assertEqual(0, self.tm.get_topics().count())
+        topics = self.tm.create_topics(3)
+        self.assertEqual(3, len(topics))
+        self.assertEqual(3, self.tm.get_topics().count())
+        for topic in topics:
+            self.assertTrue(topic in self.tm.get_topics())
+            self.assertEqual(1, topic.get_item_identifiers().count())
+            self.assertEqual(0, topic.get_subject_identifiers().count())
+            self.assertEqual(0, topic.get_subject_locators().count())
+            self.assertEqual(topic, self.tm.get_construct_by_id(
+                    topic.get_id()))
+            iid = topic.get_item_identifiers()[0]
+            self.assertEqual(topic,
+                             self.tm.get_construct_by_item_identifier(iid))
+        single_topic = self.tm.create_topic()
+        self.assertEqual(
+            single_topic.get_item_identifiers()[0].address.rsplit('/', 1)[0],
+            topics[0].get_item_identifiers()[0].address.rsplit('/', 1)[0])
+
+    def test_topics_creation_interleaved (self):
+        """Tests that topics created in another topic map during a
+        bulk creation are not mistaken for the new topics."""
+        other = self.create_topic_map('http://www.example.org/map')
+        manager = Identifier.objects
+        def bulk_create (identifiers):
+            for identifier in identifiers:
+                other.create_topic()
+                identifier.save()
+        manager.bulk_create = bulk_create
+        try:
+            topics = self.tm.create_topics(3)
+        finally:
+            del manager.bulk_create
+        self.assertEqual(3, self.tm.get_topics().count())
+        for topic in topics:
+            self.assertEqual(self.tm, Topic.objects.get(
+                    identifier=topic.identifier_id).topic_map)
+            self.assertEqual(topic, self.tm.get_construct_by_id(
+                    topic.get_id()))
+
+    def test_topics_creation_subject_identifier (self):
+        locator = self.create_locator('http://www.example.org/')
+        locator2 = self.create_locator('http://www.example.org/2')
+        locator3 = self.create_locator('http://www.example.org/3')
+        existing = self.tm.create_topic_by_subject_identifier(locator)
+        existing2 = self.tm.create_topic_by_item_identifier(locator2)
+        self.assertEqual(2, self.tm.get_topics().count())
+        topics = self.tm.create_topics_by_subject_identifier(
+            [locator, locator2, locator3, locator3])
+        self.assertEqual(4, len(topics))
+        self.assertEqual(3, self.tm.get_topics().count())
+        self.assertEqual(existing, topics[0])
+        self.assertEqual(existing2, topics[1])
+        self.assertEqual(topics[2], topics[3])
+        self.assertEqual(1, existing.get_subject_identifiers().count())
+        self.assertEqual(1, existing2.get_subject_identifiers().count())
+        self.assertEqual(locator2, existing2.get_subject_identifiers()[0])
+        self.assertEqual(1, existing2.get_item_identifiers().count())
+        topic = topics[2]
+        self.assertEqual(1, topic.get_subject_identifiers().count())
+        self.assertEqual(0, topic.get_item_identifiers().count())
+        self.assertEqual(topic,
+                         self.tm.get_topic_by_subject_identifier(locator3))
+
+    def test_topics_creation_subject_identifier_illegal (self):
+        self.assertRaises(ModelConstraintException,
+                          self.tm.create_topics_by_subject_identifier, [None])
+
+    def test_topics_removal (self):
+        topics = self.tm.create_topics(3)
+        topics[0].create_name('Name')
+        topics[1].add_subject_identifier(
+            self.create_locator('http://www.example.org/'))
+        used = self.create_topic()
+        used.add_type(self.create_topic())
+        self.assertEqual(6, self.tm.get_topics().count())
+        self.tm.remove_topics(topics)
+        # used, its type and the default name type remain.
+        self.assertEqual(3, self.tm.get_topics().count())
+        self.assertEqual(None, self.tm.get_topic_by_subject_identifier(
+                self.create_locator('http://www.example.org/')))
+        self.assertEqual(2, ItemIdentifier.objects.filter(
+                containing_topic_map=self.tm).count())
+
+    def test_topics_removal_illegal (self):
+        topic = self.create_topic()
+        player = self.create_topic()
+        self.create_association().create_role(self.create_topic(), player)
+        self.assertRaises(TopicInUseException, self.tm.remove_topics,
+                          [topic, player])
+        self.assertTrue(topic in self.tm.get_topics())
+        other = self.create_topic_map('http://www.example.org/map')
+        self.assertRaises(ModelConstraintException, self.tm.remove_topics,
+                          [other.create_topic()])
+
+    def test_duplicates_removal (self):
+        topic = self.create_topic()
+        theme = self.create_topic()
+        name_type = self.create_topic()
+        name1 = topic.create_name('Name', name_type, [theme])
+        name2 = topic.create_name('Name', name_type, [theme])
+        variant1 = name1.create_variant('Variant', [self.create_topic()])
+        name2.create_variant('Variant', variant1.get_scope().exclude(
+                id=theme.id)[0])
+        name2.create_variant('Other', [self.create_topic()])
+        iid = self.create_locator('http://www.example.org/1')
+        name2.add_item_identifier(iid)
+        reifier1 = self.create_topic()
+        reifier2 = self.create_topic()
+        name1.set_reifier(reifier1)
+        name2.set_reifier(reifier2)
+        occurrence_type = self.create_topic()
+        for i in range(3):
+            topic.create_occurrence(occurrence_type, 'Value')
+        association_type = self.create_topic()
+        role_type = self.create_topic()
+        for i in range(2):
+            association = self.tm.create_association(association_type)
+            association.create_role(role_type, topic)
+        association.create_role(role_type, topic)
+        self.assertEqual({'association': 1, 'name': 1, 'occurrence': 2,
+                          'role': 2, 'variant': 1},
+                         self.tm.remove_duplicates())
+        self.assertEqual(1, topic.get_names().count())
+        name = topic.get_names()[0]
+        self.assertEqual(2, name.get_variants().count())
+        self.assertEqual(name, self.tm.get_construct_by_item_identifier(iid))
+        self.assertEqual(1, topic.get_occurrences().count())
+        self.assertEqual(1, self.tm.get_associations().count())
+        self.assertEqual(1, topic.get_roles_played().count())
+        # The reifiers of the duplicate names have been merged.
+        self.assertEqual(1, self.tm.get_topics().filter(
+                id__in=[reifier1.id, reifier2.id]).count())
+        self.assertNotEqual(None, name.get_reifier())
+        self.assertEqual({'association': 0, 'name': 0, 'occurrence': 0,
+                          'role': 0, 'variant': 0},
+                         self.tm.remove_duplicates())
+
+    def test_duplicates_removal_batches (self):
+        batch_size = merge_utils.BULK_BATCH_SIZE
+        merge_utils.BULK_BATCH_SIZE = 1
+        try:
+            name_type = self.create_topic()
+            topics = [self.create_topic() for i in range(3)]
+            for topic in topics:
+                for i in range(2):
+                    topic.create_name('Name', name_type)
+            counts = self.tm.remove_duplicates()
+        finally:
+            merge_utils.BULK_BATCH_SIZE = batch_size
+        self.assertEqual(3, counts['name'])
+        for topic in topics:
+            self.assertEqual(1, topic.get_names().count())
+
+    def test_duplicates_removal_changed (self):
+        """Tests that duplicates are removed after their scope or
+        roles were changed through another instance or a merge, or
+        their stored hashes were left out of date."""
+        topic = self.create_topic()
+        theme1 = self.create_topic()
+        theme2 = self.create_topic()
+        theme3 = self.create_topic()
+        topic.create_name('Name', scope=[theme1])
+        name = topic.create_name('Name', scope=[theme2, theme3])
+        theme2.merge_in(theme1)
+        Name.objects.get(pk=name.pk).remove_theme(theme3)
+        name.set_value('Name')
+        association_type = self.create_topic()
+        role_type = self.create_topic()
+        player = self.create_topic()
+        association1 = self.tm.create_association(association_type)
+        association1.create_role(role_type, self.create_topic())
+        association2 = self.tm.create_association(association_type)
+        association2.create_role(role_type, player)
+        Role.objects.get(pk=association1.get_roles()[0].pk).set_player(
+            player)
+        occurrence_type = self.create_topic()
+        occurrence = topic.create_occurrence(occurrence_type, 'Value')
+        topic.create_occurrence(occurrence_type, 'Value')
+        Occurrence.objects.filter(pk=occurrence.pk).update(signature='')
+        self.assertEqual({'association': 1, 'name': 1, 'occurrence': 1,
+                          'role': 1, 'variant': 0},
+                         self.tm.remove_duplicates())
+        self.assertEqual(1, topic.get_names().count())
+        self.assertEqual(1, topic.get_occurrences().count())
+        self.assertEqual(1, self.tm.get_associations().count())
+
     def test_get_index (self):
         self.assertRaises(UnsupportedOperationException, self.tm.get_index,
                           BogusIndex)
@@ -19,6 +19,13 @@ that come with the TMAPI 2.0 distribution (http://www.tmapi.org/2.0/).
 
 """
 
+from django.db import transaction
+from django.test import TransactionTestCase
+
+from tmapi.io.loader import BatchLoader
+from tmapi.models import TopicMapSystemFactory
+from tmapi.models.copy_utils import copy
+
 from tmapi_test_case import TMAPITestCase
 
 
@@ -221,3 +228,76 @@ class TopicMapMergeTest (TMAPITestCase):
         self.assertEqual(locB, new_topic.get_item_identifiers()[0])
         self.assertEqual(0, new_topic.get_subject_identifiers().count())
         self.assertEqual(0, new_topic.get_subject_locators().count())
+
+    def test_copy_chunks (self):
+        """Tests copying a topic map in chunks, with references between
+        chunks and to topics that have no identities."""
+        sid = self.tm.create_locator('http://www.example.org/sid')
+        existing = self.tm.create_topic_by_subject_identifier(sid)
+        name_type = self.tm.create_topic_by_subject_identifier(
+            self.tm.create_locator('http://www.example.org/name-type'))
+        existing.create_name('Name', name_type)
+        topic = self.tm2.create_topic_by_subject_identifier(sid)
+        other_name_type = self.tm2.create_topic_by_subject_identifier(
+            self.tm.create_locator('http://www.example.org/name-type'))
+        topic.create_name('Name', other_name_type)
+        empty = self.tm2.create_empty_topic()
+        topic.create_name('Other', empty)
+        for i in range(3):
+            other = self.tm2.create_topic()
+            association = self.tm2.create_association(empty)
+            association.create_role(other_name_type, other)
+            association.create_role(empty, topic)
+        copy(self.tm2, self.tm, 2)
+        self.assertEqual(6, self.tm2.get_topics().count())
+        self.assertEqual(6, self.tm.get_topics().count())
+        self.assertEqual(2, existing.get_names().count())
+        self.assertEqual(3, self.tm.get_associations().count())
+        self.assertEqual(3, existing.get_roles_played().count())
+        new_type = existing.get_names().get(value='Other').get_type()
+        self.assertEqual(3, self.tm.get_associations().filter(
+                type=new_type).count())
+        # Copying again adds nothing.
+        copy(self.tm2, self.tm, 2)
+        self.assertEqual(6, self.tm.get_topics().count())
+        self.assertEqual(2, existing.get_names().count())
+        self.assertEqual(3, self.tm.get_associations().count())
+
+
+class TopicMapMergeTransactionTest (TransactionTestCase):
+
+    def setUp (self):
+        factory = TopicMapSystemFactory.new_instance()
+        self.tms = factory.new_topic_map_system()
+        self.tm = self.tms.create_topic_map(self.tms.create_locator(
+                'http://www.tmapi.org/tmapi2.0'))
+        self.tm2 = self.tms.create_topic_map(self.tms.create_locator(
+                'http://www.sf.net/projects/tinytim/tm-2'))
+
+    def test_failed_merge_rolled_back (self):
+        """Tests that a merge that fails within the caller's
+        transaction leaves the target topic map unchanged."""
+        self.tm.create_topic()
+        association = self.tm2.create_association(self.tm2.create_topic())
+        association.create_role(self.tm2.create_topic(),
+                                self.tm2.create_topic())
+        topic_count = self.tm.get_topics().count()
+        load = BatchLoader.load
+        calls = []
+        def failing_load (loader, topics, associations):
+            # Fail on the second chunk, once the topics are loaded.
+            calls.append(1)
+            if len(calls) > 1:
+                raise RuntimeError('Failed to load chunk')
+            load(loader, topics, associations)
+        BatchLoader.load = failing_load
+        try:
+            def merge ():
+                with transaction.commit_on_success():
+                    self.tm.merge_in(self.tm2)
+            self.assertRaises(RuntimeError, merge)
+        finally:
+            BatchLoader.load = load
+        self.assertEqual(2, len(calls))
+        self.assertEqual(topic_count, self.tm.get_topics().count())
+        self.assertEqual(0, self.tm.get_associations().count())
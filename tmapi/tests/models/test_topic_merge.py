@@ -327,3 +327,51 @@ class TopicMergeTest (TMAPITestCase):
                 reifier = topic
                 break
         self.assertEqual(reifier, occ.get_reifier())
+
+    def test_type_and_theme_replaced (self):
+        """Tests if a topic replaces the other topic wherever it is
+        used as a type or theme, and if the constructs that thereby
+        become duplicates are merged."""
+        topic1 = self.create_topic()
+        topic2 = self.create_topic()
+        instance = self.create_topic()
+        instance.add_type(topic1)
+        instance.add_type(topic2)
+        name1 = instance.create_name('TMAPI', topic1)
+        instance.create_name('TMAPI', topic2)
+        occurrence = instance.create_occurrence(self.create_topic(), 'TMAPI',
+                                                [topic2])
+        association = self.tm.create_association(topic2, [topic2])
+        topic1.merge_in(topic2)
+        self.assertEqual([topic1], list(instance.get_types()))
+        self.assertEqual([name1], list(instance.get_names()))
+        self.assertEqual([topic1], list(occurrence.get_scope()))
+        association = self.tm.get_associations()[0]
+        self.assertEqual(topic1, association.get_type())
+        self.assertEqual([topic1], list(association.get_scope()))
+
+    def test_duplicate_suppression_role (self):
+        """Tests if merging detects duplicate roles within an
+        association."""
+        topic1 = self.create_topic()
+        topic2 = self.create_topic()
+        role_type = self.create_topic()
+        association = self.create_association()
+        role1 = association.create_role(role_type, topic1)
+        role2 = association.create_role(role_type, topic2)
+        iid = self.tm.create_locator('http://example.org/iid-1')
+        role2.add_item_identifier(iid)
+        topic1.merge_in(topic2)
+        self.assertEqual([role1], list(association.get_roles()))
+        self.assertEqual(role1, self.tm.get_construct_by_item_identifier(iid))
+
+    def test_duplicate_suppression_variant (self):
+        """Tests if merging detects variants that become duplicates
+        because of a change of scope."""
+        topic1 = self.create_topic()
+        topic2 = self.create_topic()
+        name = self.create_name()
+        name.create_variant('tiny', [topic1])
+        name.create_variant('tiny', [topic2])
+        topic1.merge_in(topic2)
+        self.assertEqual(1, name.get_variants().count())